@@ -0,0 +1,211 @@
+# backend/auth_tokens.py
+import asyncio
+import base64
+import binascii
+import hashlib
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+import jwt
+from cryptography import x509
+from firebase_admin import auth
+
+from backend.metrics import record_cache_lookup
+
+# Google's public certificates for Firebase ID tokens, keyed by "kid"
+ID_TOKEN_CERT_URL = "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
+ID_TOKEN_ISSUER_PREFIX = "https://securetoken.google.com/"
+
+# Verified tokens kept per process; each entry expires with its token's exp claim
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "10000"))
+# Certificates are re-fetched this many seconds before their Cache-Control max-age runs out
+AUTH_CERT_REFRESH_MARGIN = float(os.getenv("AUTH_CERT_REFRESH_MARGIN", "300"))
+# Used when the certificate response carries no max-age, and as the retry delay after a failed fetch
+AUTH_CERT_DEFAULT_MAX_AGE = 3600
+AUTH_CERT_RETRY_SECONDS = 30
+# An unknown "kid" forces a re-fetch (key rotation), at most this often
+AUTH_CERT_MIN_REFETCH_SECONDS = 60
+
+_MAX_AGE_RE = re.compile(r"max-age=(\d+)")
+
+
+def unverified_header(token: str) -> Dict[str, Any]:
+    """Decode only the JOSE header; the full token is parsed once, by jwt.decode"""
+    segment = token.split(".", 1)[0]
+    try:
+        header = json.loads(base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4)))
+    except (ValueError, binascii.Error) as e:
+        raise auth.InvalidIdTokenError(f"Malformed Firebase ID token: {e}", cause=e)
+    if not isinstance(header, dict):
+        raise auth.InvalidIdTokenError("Malformed Firebase ID token: header is not a JSON object")
+    return header
+
+
+def parse_max_age(cache_control: Optional[str]) -> Optional[int]:
+    match = _MAX_AGE_RE.search(cache_control or "")
+    return int(match.group(1)) if match else None
+
+
+class PublicKeyCache:
+    """
+    Google's signing keys, parsed once per fetch and kept for the lifetime
+    the response's Cache-Control allows. A background task re-fetches them
+    shortly before they expire, so verification never waits on the network
+    except for the very first request or a key it has not seen yet.
+    """
+
+    def __init__(self, url: str = ID_TOKEN_CERT_URL, client: Optional[httpx.AsyncClient] = None):
+        self.url = url
+        self._client = client
+        self._keys: Dict[str, Any] = {}
+        self._expires_at = 0.0
+        self._fetched_at = 0.0
+        self._lock = asyncio.Lock()
+        self._refresher: Optional[asyncio.Task] = None
+
+    async def _fetch(self):
+        client = self._client or httpx.AsyncClient(timeout=10)
+        try:
+            response = await client.get(self.url)
+            response.raise_for_status()
+            certs = response.json()
+        finally:
+            if client is not self._client:
+                await client.aclose()
+        self._keys = {
+            kid: x509.load_pem_x509_certificate(pem.encode("utf-8")).public_key()
+            for kid, pem in certs.items()
+        }
+        max_age = parse_max_age(response.headers.get("Cache-Control"))
+        self._fetched_at = time.monotonic()
+        self._expires_at = self._fetched_at + (max_age if max_age is not None else AUTH_CERT_DEFAULT_MAX_AGE)
+
+    async def refresh(self, force: bool = False):
+        async with self._lock:
+            # Another caller may have refreshed while this one waited for the lock
+            if force or time.monotonic() >= self._expires_at:
+                await self._fetch()
+
+    async def get_key(self, kid: str):
+        if time.monotonic() >= self._expires_at:
+            await self.refresh()
+        key = self._keys.get(kid)
+        if key is None and time.monotonic() - self._fetched_at > AUTH_CERT_MIN_REFETCH_SECONDS:
+            await self.refresh(force=True)
+            key = self._keys.get(kid)
+        return key
+
+    def start(self):
+        """Keep the keys fresh in the background (idempotent)"""
+        if self._refresher is None or self._refresher.done():
+            self._refresher = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._refresher is not None:
+            self._refresher.cancel()
+            await asyncio.gather(self._refresher, return_exceptions=True)
+            self._refresher = None
+
+    async def _refresh_loop(self):
+        while True:
+            delay = self._expires_at - AUTH_CERT_REFRESH_MARGIN - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            try:
+                await self.refresh(force=True)
+            except Exception as e:
+                print(f"⚠️  Firebase certificate refresh failed: {e}")
+                await asyncio.sleep(AUTH_CERT_RETRY_SECONDS)
+
+
+class VerifiedTokenCache:
+    """LRU of decoded claims keyed by the token's SHA-256; an entry is dropped once its exp has passed"""
+
+    def __init__(self, max_entries: int = AUTH_TOKEN_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[bytes, Tuple[Dict[str, Any], float]]" = OrderedDict()
+
+    def get(self, key: bytes) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        claims, expires_at = entry
+        if time.time() >= expires_at:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return claims
+
+    def set(self, key: bytes, claims: Dict[str, Any]):
+        self._entries[key] = (claims, float(claims["exp"]))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class FirebaseTokenVerifier:
+    """
+    Verifies Firebase ID tokens with the same checks as
+    firebase_admin.auth.verify_id_token (RS256 signature by a current Google
+    key, aud/iss of this project, exp/iat, non-empty sub), but with the keys
+    and already-verified tokens cached, and without blocking the event loop.
+    Raises auth.InvalidIdTokenError / auth.ExpiredIdTokenError.
+    """
+
+    def __init__(self, project_id: str, keys: Optional[PublicKeyCache] = None, cache: Optional[VerifiedTokenCache] = None):
+        self.project_id = project_id
+        self.issuer = ID_TOKEN_ISSUER_PREFIX + project_id
+        self.keys = keys or PublicKeyCache()
+        self.cache = cache or VerifiedTokenCache()
+
+    async def verify(self, token: str) -> Dict[str, Any]:
+        cache_key = hashlib.sha256(token.encode("utf-8")).digest()
+        claims = self.cache.get(cache_key)
+        record_cache_lookup("auth_token", claims is not None)
+        if claims is not None:
+            return claims
+
+        self.keys.start()
+        header = unverified_header(token)
+        if header.get("alg") != "RS256":
+            raise auth.InvalidIdTokenError(f'Firebase ID token has incorrect algorithm. Expected "RS256" but got "{header.get("alg")}".')
+        if not header.get("kid"):
+            raise auth.InvalidIdTokenError('Firebase ID token has no "kid" claim.')
+        try:
+            key = await self.keys.get_key(header["kid"])
+        except Exception as e:
+            raise auth.CertificateFetchError(f"Could not fetch Firebase public keys: {e}", cause=e)
+        if key is None:
+            raise auth.InvalidIdTokenError("Firebase ID token has an unknown signing key.")
+
+        try:
+            claims = jwt.decode(
+                token,
+                key=key,
+                algorithms=["RS256"],
+                audience=self.project_id,
+                issuer=self.issuer,
+                options={"require": ["exp", "iat", "sub"]},
+            )
+        except jwt.ExpiredSignatureError as e:
+            raise auth.ExpiredIdTokenError("Token expired", cause=e)
+        except jwt.InvalidTokenError as e:
+            raise auth.InvalidIdTokenError(str(e), cause=e)
+        subject = claims["sub"]
+        if not isinstance(subject, str) or not subject or len(subject) > 128:
+            raise auth.InvalidIdTokenError('Firebase ID token has an invalid "sub" (subject) claim.')
+
+        claims["uid"] = subject
+        self.cache.set(cache_key, claims)
+        return claims
+
+    async def aclose(self):
+        await self.keys.stop()
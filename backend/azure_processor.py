@@ -1,17 +1,67 @@
 # backend/azure_processor.py
 import asyncio
-import io
 import re
 import json
 import os
-from typing import Dict, List, Any, Optional
+import time
+from typing import AsyncIterator, Callable, Dict, List, Any, Optional
 from fastapi import UploadFile
-import PyPDF2
 import uuid
 import httpx
-from dotenv import load_dotenv
 
-load_dotenv()
+from backend.json_extractor import IncrementalJSONParser, JSONExtractionError, Schema, strip_code_fence
+from backend.llm_cache import LLM_CACHE_ENABLED, LLMCache, make_cache_key
+from backend.metrics import LLM_RATE_LIMITED, LLM_REQUESTS, LLM_RETRIES, STAGE_SECONDS, time_stage
+from backend.models.generation import course_schema, flashcards_schema, outline_schema, quiz_schema
+from backend.pdf_extractor import PdfSource, ProgressCallback, iter_pdf_pages
+from backend.stream_parser import parse_course_preview
+from backend.text_chunker import split_sections
+from backend.tracing import span
+from backend.token_budget import (
+    PromptBudget,
+    chars_for_tokens,
+    count_message_tokens,
+    count_tokens,
+    course_max_tokens,
+    flashcards_max_tokens,
+    get_token_usage,
+    load_tokenizer,
+    quiz_max_tokens,
+)
+from backend.rate_limiter import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, get_rate_limiter, parse_retry_after
+
+# Connection pool for the inference endpoint
+LLM_HTTP_MAX_CONNECTIONS = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "20"))
+LLM_HTTP_MAX_KEEPALIVE = int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", "10"))
+LLM_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY", "60"))
+LLM_HTTP_TIMEOUT = float(os.getenv("LLM_HTTP_TIMEOUT", "180"))
+LLM_HTTP2 = os.getenv("LLM_HTTP2", "false").lower() == "true"
+
+# Stream course generation token by token and publish previews at most this often
+LLM_STREAMING = os.getenv("LLM_STREAMING", "true").lower() == "true"
+LLM_STREAM_PREVIEW_INTERVAL = float(os.getenv("LLM_STREAM_PREVIEW_INTERVAL", "0.25"))
+# Follow-up requests for the rest of a JSON reply cut off at max_tokens
+LLM_JSON_MAX_CONTINUATIONS = int(os.getenv("LLM_JSON_MAX_CONTINUATIONS", "2"))
+JSON_CONTINUE_PROMPT = (
+    "Your reply was cut off. Continue exactly where it stopped, without repeating anything "
+    "and without code fences, so that appending your reply completes the JSON."
+)
+
+# Map-reduce course generation
+COURSE_CHUNK_TOKENS = int(os.getenv("COURSE_CHUNK_TOKENS", "2000"))
+COURSE_MAP_CONCURRENCY = int(os.getenv("COURSE_MAP_CONCURRENCY", "4"))
+COURSE_REDUCE_MAX_TOKENS = int(os.getenv("COURSE_REDUCE_MAX_TOKENS", "6000"))
+COURSE_MERGE_GROUP_SIZE = 4
+OUTLINE_MAX_TOKENS = 800
+# The course prompt asks for at most this many modules of this many words; max_tokens follows from it
+COURSE_MAX_MODULES = 5
+COURSE_MODULE_WORDS = 500
+
+# Tokens of module content plus source passages packed into a quiz/flashcard prompt
+LLM_STUDY_PROMPT_TOKENS = int(os.getenv("LLM_STUDY_PROMPT_TOKENS", "2000"))
+
+# Call sites whose LLM responses may be served from the cache
+LLM_CACHE_SITES = {s.strip() for s in os.getenv("LLM_CACHE_SITES", "course,quiz,flashcards").split(",") if s.strip()}
 
 class AzureWhitepaperProcessor:
     """Processor for analyzing whitepapers using Azure-hosted Llama model"""
@@ -23,26 +73,75 @@ class AzureWhitepaperProcessor:
         
         if not self.azure_token or not self.azure_endpoint:
             raise ValueError("Azure AI credentials not configured. Please set AZURE_AI_TOKEN and AZURE_AI_ENDPOINT")
+
+        self.llm_cache = LLMCache() if LLM_CACHE_ENABLED else None
+        self.llm_cache_sites = set(LLM_CACHE_SITES)
+        self._http_client: Optional[httpx.AsyncClient] = None
+        self.rate_limiter = get_rate_limiter()
+        self.token_usage = get_token_usage()
+
+    async def start(self):
+        """Open the shared HTTP connection pool and load the tokenizer (called on app startup)"""
+        if self._http_client is not None:
+            return
+        await asyncio.to_thread(load_tokenizer)
+        http2 = LLM_HTTP2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                print("⚠️  LLM_HTTP2=true but the 'h2' package is not installed; using HTTP/1.1")
+                http2 = False
+        self._http_client = httpx.AsyncClient(
+            timeout=LLM_HTTP_TIMEOUT,
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=LLM_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=LLM_HTTP_KEEPALIVE_EXPIRY,
+            ),
+        )
+
+    async def aclose(self):
+        """Close pooled connections (called on app shutdown)"""
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+        if self.llm_cache is not None:
+            self.llm_cache.close()
+
+    async def _get_http_client(self) -> httpx.AsyncClient:
+        if self._http_client is None:
+            await self.start()
+        return self._http_client
     
-    async def extract_pdf_content(self, file: UploadFile) -> str:
+    def iter_pdf_pages(self, source: PdfSource, on_progress: Optional[ProgressCallback] = None) -> AsyncIterator[str]:
+        """Stream page texts from a PDF, parsed off the event loop in a process pool"""
+        return iter_pdf_pages(source, on_progress=on_progress)
+
+    async def extract_pdf_content(self, file: UploadFile, on_progress: Optional[ProgressCallback] = None) -> str:
         """Extract text content from PDF file"""
+        print(f"Processing file: {file.filename}")
+        file_content = await file.read()
+        if not file_content:
+            raise ValueError("Failed to process PDF: File is empty")
+        return await self.extract_pdf_text(file_content, on_progress)
+
+    async def extract_pdf_text(self, source: PdfSource, on_progress: Optional[ProgressCallback] = None) -> str:
+        """Extract text from PDF bytes or a local PDF path (memory-mapped, not copied)"""
         try:
-            print(f"Processing file: {file.filename}")
-            file_content = await file.read()
-            if not file_content:
-                raise ValueError("File is empty")
-            
-            pdf_reader = PyPDF2.PdfReader(io.BytesIO(file_content))
-            text = ""
-            for page in pdf_reader.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n"
+            pages = []
+            with time_stage("extract"):
+                async for page_text in self.iter_pdf_pages(source, on_progress):
+                    if page_text:
+                        pages.append(page_text)
+            text = "\n".join(pages)
             
             if not text.strip():
                 raise ValueError("No extractable text found. Image-based PDF?")
             
-            return self._clean_text(text)
+            with time_stage("clean"):
+                return self._clean_text(text)
             
         except Exception as e:
             raise ValueError(f"Failed to process PDF: {str(e)}")
@@ -54,70 +153,338 @@ class AzureWhitepaperProcessor:
         text = re.sub(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+', '', text)
         return text.strip()
 
-    async def _call_azure_openai(self, messages: List[Dict[str, str]], max_tokens: int = 4000) -> str:
-        headers = {
-            "Authorization": f"Bearer {self.azure_token}",
-            "Content-Type": "application/json"
-        }
+    async def _call_azure_openai(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: int = 4000,
+        priority: int = PRIORITY_INTERACTIVE,
+        on_text: Optional[Callable[[str], None]] = None,
+        label: Optional[str] = None,
+    ) -> str:
+        """
+        Chat completion. With on_text (and LLM_STREAMING on), the response is
+        streamed and on_text receives the accumulated text as tokens arrive.
+        Token usage is recorded under `label`. Raw replies are not cached:
+        _call_json caches them once they have parsed and validated.
+        """
         payload = {
             "model": self.model_name,
             "messages": messages,
             "max_tokens": max_tokens,
             "temperature": 0.3
         }
-        async with httpx.AsyncClient(timeout=180.0) as client:
-            for attempt in range(5):
-                try:
-                    if attempt > 0:
-                        await asyncio.sleep(2 ** attempt)
-                    response = await client.post(f"{self.azure_endpoint}/chat/completions", headers=headers, json=payload)
-                    if response.status_code == 401:
-                        raise ValueError("401 Unauthorized: Invalid Azure AI token. Use 'github_pat_' token with AI access.")
-                    if response.status_code in [429, 503]:
-                        await asyncio.sleep(min(60, (2 ** attempt) * 10))
-                        continue
-                    response.raise_for_status()
-                    result = response.json()
-                    if not result.get("choices"):
-                        raise ValueError("Empty response from AI model.")
-                    return result["choices"][0]["message"]["content"]
-                except Exception as e:
+        site = label or "llm"
+        streamed = bool(on_text and LLM_STREAMING)
+        with span("llm.call", site=site, max_tokens=max_tokens, streamed=streamed) as call_span:
+            if streamed:
+                content = await self._stream_chat_completion(payload, priority, on_text, site)
+            else:
+                content = await self._post_chat_completion(payload, priority, site)
+            call_span.set(response_chars=len(content))
+            return content
+
+    async def _post_chat_completion(self, payload: Dict[str, Any], priority: int = PRIORITY_INTERACTIVE, site: str = "llm") -> str:
+        headers = {
+            "Authorization": f"Bearer {self.azure_token}",
+            "Content-Type": "application/json"
+        }
+        # Budget for the TPM bucket: counted prompt tokens plus the completion cap
+        prompt_tokens = count_message_tokens(payload["messages"])
+        estimated_tokens = prompt_tokens + payload["max_tokens"]
+        client = await self._get_http_client()
+        backoff = 0
+        for attempt in range(5):
+            try:
+                if backoff:
+                    await asyncio.sleep(backoff)
+                backoff = 2 ** (attempt + 1)
+                with span("llm.attempt", site=site, attempt=attempt + 1, priority=priority) as attempt_span:
+                    queued_at = time.perf_counter()
+                    async with self.rate_limiter.slot(priority, estimated_tokens):
+                        attempt_span.set(queued_ms=round((time.perf_counter() - queued_at) * 1000, 1))
+                        with time_stage("llm_call"):
+                            response = await client.post(f"{self.azure_endpoint}/chat/completions", headers=headers, json=payload)
+                    attempt_span.set(
+                        status_code=response.status_code,
+                        request_bytes=len(response.request.content),
+                        response_bytes=len(response.content),
+                    )
+                if response.status_code == 401:
+                    raise ValueError("401 Unauthorized: Invalid Azure AI token. Use 'github_pat_' token with AI access.")
+                if response.status_code in [429, 503]:
+                    # Back off globally; the limiter holds every queued call until the pause ends
+                    retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                    self.rate_limiter.on_rate_limited(retry_after if retry_after is not None else min(30, 2 ** (attempt + 1)))
+                    LLM_RATE_LIMITED.labels(str(response.status_code)).inc()
+                    if attempt == 4:
+                        raise ValueError(f"Rate limited by Azure AI (HTTP {response.status_code})")
+                    LLM_RETRIES.labels(site, "rate_limited").inc()
+                    backoff = 0
+                    continue
+                response.raise_for_status()
+                result = response.json()
+                if not result.get("choices"):
+                    raise ValueError("Empty response from AI model.")
+                usage = result.get("usage") or {}
+                self.rate_limiter.on_success(estimated_tokens, usage.get("total_tokens"))
+                self.token_usage.record(
+                    site, prompt_tokens, payload["max_tokens"], usage.get("prompt_tokens"), usage.get("completion_tokens")
+                )
+                LLM_REQUESTS.labels(site, "success").inc()
+                return result["choices"][0]["message"]["content"]
+            except Exception as e:
+                if attempt == 4:
+                    LLM_REQUESTS.labels(site, "failure").inc()
+                    raise ValueError(f"Failed to call Azure AI: {str(e)}")
+                LLM_RETRIES.labels(site, "error").inc()
+        raise ValueError("Max retries exceeded")
+
+    async def _stream_chat_completion(
+        self, payload: Dict[str, Any], priority: int, on_text: Callable[[str], None], site: str = "llm"
+    ) -> str:
+        """Consume a stream=true SSE response, reporting the accumulated text after every delta"""
+        headers = {
+            "Authorization": f"Bearer {self.azure_token}",
+            "Content-Type": "application/json",
+            "Accept": "text/event-stream",
+        }
+        prompt_tokens = count_message_tokens(payload["messages"])
+        estimated_tokens = prompt_tokens + payload["max_tokens"]
+        client = await self._get_http_client()
+        backoff = 0
+        for attempt in range(5):
+            try:
+                if backoff:
+                    await asyncio.sleep(backoff)
+                backoff = 2 ** (attempt + 1)
+                text = ""
+                rate_limited = None
+                with span("llm.attempt", site=site, attempt=attempt + 1, priority=priority, streamed=True) as attempt_span:
+                    queued_at = time.perf_counter()
+                    async with self.rate_limiter.slot(priority, estimated_tokens):
+                        attempt_span.set(queued_ms=round((time.perf_counter() - queued_at) * 1000, 1))
+                        with time_stage("llm_call"):
+                            async with client.stream(
+                                "POST", f"{self.azure_endpoint}/chat/completions", headers=headers, json={**payload, "stream": True}
+                            ) as response:
+                                attempt_span.set(status_code=response.status_code, request_bytes=len(response.request.content))
+                                if response.status_code == 401:
+                                    raise ValueError("401 Unauthorized: Invalid Azure AI token. Use 'github_pat_' token with AI access.")
+                                if response.status_code in [429, 503]:
+                                    rate_limited = (response.status_code, parse_retry_after(response.headers.get("Retry-After")))
+                                else:
+                                    response.raise_for_status()
+                                    async for line in response.aiter_lines():
+                                        if not line.startswith("data:"):
+                                            continue
+                                        data = line[5:].strip()
+                                        if data == "[DONE]":
+                                            break
+                                        choices = json.loads(data).get("choices") or []
+                                        delta = choices[0].get("delta", {}).get("content") if choices else None
+                                        if delta:
+                                            # A running string: re-joining every part per token made a reply O(n²)
+                                            text += delta
+                                            on_text(text)
+                                attempt_span.set(response_bytes=response.num_bytes_downloaded)
+                if rate_limited:
+                    status_code, retry_after = rate_limited
+                    self.rate_limiter.on_rate_limited(retry_after if retry_after is not None else min(30, 2 ** (attempt + 1)))
+                    LLM_RATE_LIMITED.labels(str(status_code)).inc()
                     if attempt == 4:
-                        raise ValueError(f"Failed to call Azure AI: {str(e)}")
-            raise ValueError("Max retries exceeded")
-
-    def _extract_json(self, text: str) -> Any:
-        """Extract the first valid JSON array or object from text."""
-        stack = []
-        start = None
-        in_string = False
-        escape = False
-        for i, char in enumerate(text):
-            if escape:
-                escape = False
-                continue
-            if char == '\\':
-                escape = True
-                continue
-            if char == '"' and not escape:
-                in_string = not in_string
-            if in_string:
-                continue
-            if char in ['{', '[']:
-                if not stack:
-                    start = i
-                stack.append(char)
-            elif char in ['}', ']'] and stack:
-                opening = stack.pop()
-                if not stack and start is not None:
-                    try:
-                        return json.loads(text[start:i+1])
-                    except json.JSONDecodeError:
-                        pass
-        raise ValueError("No valid JSON object or array found in response")
-
-    async def _generate_complete_course(self, text: str, title: Optional[str] = None) -> Dict[str, Any]:
-        analysis_text = text[:12000] if len(text) > 12000 else text
+                        raise ValueError(f"Rate limited by Azure AI (HTTP {status_code})")
+                    LLM_RETRIES.labels(site, "rate_limited").inc()
+                    backoff = 0
+                    continue
+                if not text:
+                    raise ValueError("Empty response from AI model.")
+                content = text
+                # Streamed responses carry no usage block; the completion is counted locally
+                completion_tokens = count_tokens(content)
+                self.rate_limiter.on_success(estimated_tokens, prompt_tokens + completion_tokens)
+                self.token_usage.record(site, prompt_tokens, payload["max_tokens"], None, completion_tokens)
+                LLM_REQUESTS.labels(site, "success").inc()
+                return content
+            except Exception as e:
+                if attempt == 4:
+                    LLM_REQUESTS.labels(site, "failure").inc()
+                    raise ValueError(f"Failed to call Azure AI: {str(e)}")
+                LLM_RETRIES.labels(site, "error").inc()
+        raise ValueError("Max retries exceeded")
+
+    async def _call_json(
+        self,
+        messages: List[Dict[str, str]],
+        schema: Schema,
+        max_tokens: int,
+        cache_site: Optional[str] = None,
+        priority: int = PRIORITY_INTERACTIVE,
+        on_text: Optional[Callable[[str], None]] = None,
+        label: Optional[str] = None,
+        refresh: bool = False,
+    ) -> Any:
+        """
+        Chat completion decoded into JSON that satisfies `schema`. Streamed
+        output is parsed as it arrives. A reply cut off at max_tokens is
+        finished with follow-up requests for only the missing tail, and
+        closed by repair as a last resort. Raises JSONExtractionError.
+
+        For cache sites, only a complete, valid result is cached (a repaired
+        or failed reply is retried next time); refresh=True skips the lookup
+        for forced regeneration and stores the new result.
+        """
+        label = label or cache_site
+        use_cache = self.llm_cache is not None and cache_site in self.llm_cache_sites
+        cache_key = make_cache_key({"stage": cache_site, "model": self.model_name, "messages": messages, "max_tokens": max_tokens})
+        if use_cache and not refresh:
+            cached = await self.llm_cache.get(cache_key)
+            if cached is not None:
+                if on_text:
+                    on_text(cached)
+                return json.loads(cached)
+
+        parser = IncrementalJSONParser(schema)
+        fed = 0
+        parse_seconds = 0.0
+
+        def parse(text: str):
+            # Parsing time is summed across chunks and observed once per call
+            nonlocal parse_seconds
+            started = time.perf_counter()
+            parser.feed(text)
+            parse_seconds += time.perf_counter() - started
+
+        def feed(text: str):
+            nonlocal fed
+            parse(text[fed:])
+            fed = len(text)
+            on_text(text)
+
+        response = await self._call_azure_openai(
+            messages,
+            max_tokens=max_tokens,
+            priority=priority,
+            on_text=feed if on_text else None,
+            label=label,
+        )
+        if parser.text != response:
+            # Not streamed, or the stream was restarted by a retry
+            parser = IncrementalJSONParser(schema)
+            parse(response)
+
+        try:
+            continuations = 0
+            while parser.truncated and continuations < LLM_JSON_MAX_CONTINUATIONS:
+                continuations += 1
+                print(f"✂️  JSON reply cut off after {len(parser.text)} chars, requesting continuation {continuations}")
+                follow_up = messages + [
+                    {"role": "assistant", "content": parser.text},
+                    {"role": "user", "content": JSON_CONTINUE_PROMPT},
+                ]
+                tail = await self._call_azure_openai(follow_up, max_tokens=max_tokens, priority=priority, label=label)
+                parse(strip_code_fence(tail))
+
+            if parser.done:
+                if use_cache:
+                    await self.llm_cache.set(cache_key, json.dumps(parser.result, ensure_ascii=False))
+                return parser.result
+            if parser.truncated:
+                started = time.perf_counter()
+                result = parser.repair()
+                parse_seconds += time.perf_counter() - started
+                print(f"🩹 Repaired truncated JSON reply ({len(parser.text)} chars)")
+                return result
+            raise JSONExtractionError(parser.describe_failure())
+        finally:
+            STAGE_SECONDS.labels("json_parse").observe(parse_seconds)
+
+    async def _cached_json_call(self, stage: str, messages: List[Dict[str, str]], max_tokens: int, semaphore: asyncio.Semaphore) -> Any:
+        """LLM call whose *parsed* result is cached, so a failed job only redoes the calls that failed"""
+        use_cache = self.llm_cache is not None and "course" in self.llm_cache_sites
+        cache_key = make_cache_key({"stage": stage, "model": self.model_name, "messages": messages, "max_tokens": max_tokens})
+        if use_cache:
+            cached = await self.llm_cache.get(cache_key)
+            if cached is not None:
+                return json.loads(cached)
+        async with semaphore:
+            result = await self._call_json(
+                messages, outline_schema, max_tokens=max_tokens, priority=PRIORITY_BACKGROUND, label=stage
+            )
+        if use_cache:
+            await self.llm_cache.set(cache_key, json.dumps(result))
+        return result
+
+    async def _outline_section(self, index: int, chunk: str, semaphore: asyncio.Semaphore) -> Dict[str, Any]:
+        prompt = f"""
+        Outline section {index} of a whitepaper for course design. Return valid JSON only.
+        {{"topics": ["..."], "key_points": ["..."], "summary": "2-4 sentences"}}
+        Section text:
+        {chunk}
+        """
+        messages = [
+            {"role": "system", "content": "Respond with valid JSON only."},
+            {"role": "user", "content": prompt}
+        ]
+        outline = await self._cached_json_call("outline", messages, OUTLINE_MAX_TOKENS, semaphore)
+        outline["sections"] = [index]
+        return outline
+
+    async def _merge_outlines(self, group: List[Dict[str, Any]], semaphore: asyncio.Semaphore) -> Dict[str, Any]:
+        prompt = f"""
+        Merge these consecutive whitepaper section outlines into one outline. Return valid JSON only.
+        {{"topics": ["..."], "key_points": ["..."], "summary": "3-5 sentences"}}
+        Outlines:
+        {json.dumps([{k: o.get(k) for k in ("topics", "key_points", "summary")} for o in group], ensure_ascii=False)}
+        """
+        messages = [
+            {"role": "system", "content": "Respond with valid JSON only."},
+            {"role": "user", "content": prompt}
+        ]
+        merged = await self._cached_json_call("merge", messages, OUTLINE_MAX_TOKENS, semaphore)
+        merged["sections"] = [i for o in group for i in o.get("sections", [])]
+        return merged
+
+    async def _map_sections(self, chunks: List[str]) -> List[Dict[str, Any]]:
+        """Map stage: outline every section concurrently, then merge until the outlines fit the reduce prompt"""
+        semaphore = asyncio.Semaphore(COURSE_MAP_CONCURRENCY)
+        results = await asyncio.gather(
+            *(self._outline_section(i, chunk, semaphore) for i, chunk in enumerate(chunks)),
+            return_exceptions=True,
+        )
+        failed = [r for r in results if isinstance(r, Exception)]
+        if failed:
+            # Outlines that did succeed are cached; a retry only redoes the failed sections
+            raise ValueError(f"Outlining failed for {len(failed)}/{len(chunks)} sections: {failed[0]}")
+        print(f"🗺️  Outlined {len(chunks)} sections")
+
+        outlines = list(results)
+        while count_tokens(json.dumps(outlines, ensure_ascii=False)) > COURSE_REDUCE_MAX_TOKENS and len(outlines) > 1:
+            groups = [outlines[i:i + COURSE_MERGE_GROUP_SIZE] for i in range(0, len(outlines), COURSE_MERGE_GROUP_SIZE)]
+            outlines = await asyncio.gather(*(self._merge_outlines(g, semaphore) for g in groups))
+            print(f"🗺️  Merged outlines down to {len(outlines)}")
+        return outlines
+
+    async def _generate_complete_course(
+        self,
+        text: str,
+        title: Optional[str] = None,
+        on_preview: Optional[Callable[[Dict[str, Any]], None]] = None,
+        refresh: bool = False,
+    ) -> Dict[str, Any]:
+        # Sections are cut at character offsets, sized from this document's own chars-per-token
+        spans = split_sections(text, chars_for_tokens(text, COURSE_CHUNK_TOKENS))
+        chunks = [text[start:end].strip() for start, end in spans]
+        print(f"📚 Split document into {len(chunks)} sections")
+        if len(chunks) > 1:
+            with span("course.map", sections=len(chunks)) as map_span:
+                outlines = await self._map_sections(chunks)
+                map_span.set(outlines=len(outlines))
+            source_label = "Section outlines of the whitepaper (\"sections\" are section numbers)"
+            source_material = json.dumps(outlines, ensure_ascii=False)
+        else:
+            source_label = "Whitepaper text (section 0)"
+            source_material = chunks[0] if chunks else text
+
         prompt = f"""
         Create a comprehensive educational course from this whitepaper. Return valid JSON only.
         {{
@@ -130,33 +497,82 @@ class AzureWhitepaperProcessor:
                     "id": "unique-id",
                     "title": "Module 1: Topic",
                     "content": "# Markdown\\n\\n## Key Points\\n...",
-                    "estimatedTime": 900
+                    "estimatedTime": 900,
+                    "sections": [0, 1]
                 }}
             ]
         }}
-        Requirements: 3-5 modules, 300-500 words each, markdown formatting, action verbs in objectives.
+        Requirements: 3-{COURSE_MAX_MODULES} modules, 300-{COURSE_MODULE_WORDS} words each, markdown formatting, action verbs in objectives.
+        Modules follow the order of the document, together cover every section, and list the section numbers they draw on.
+        {source_label}:
+        {source_material}
         """
         messages = [
             {"role": "system", "content": "Respond with valid JSON only."},
             {"role": "user", "content": prompt}
         ]
-        response = await self._call_azure_openai(messages, max_tokens=6000)
+        last_preview = 0.0
+
+        def publish_preview(partial_text: str):
+            nonlocal last_preview
+            now = time.monotonic()
+            if now - last_preview < LLM_STREAM_PREVIEW_INTERVAL:
+                return
+            last_preview = now
+            preview = parse_course_preview(partial_text)
+            if preview:
+                on_preview(preview)
+
         try:
-            course_data = self._extract_json(response)
-            for module in course_data.get("modules", []):
-                module["id"] = str(uuid.uuid4())
-                module["source_text"] = analysis_text
-                module["flashcard"] = None
-                module["quiz"] = None
-                module.setdefault("completed", False)
-                module.setdefault("timeSpent", 0)
-            return course_data
-        except Exception as e:
+            course_data = await self._call_json(
+                messages,
+                course_schema,
+                max_tokens=course_max_tokens(COURSE_MAX_MODULES, COURSE_MODULE_WORDS),
+                cache_site="course",
+                priority=PRIORITY_BACKGROUND,
+                on_text=publish_preview if on_preview else None,
+                refresh=refresh,
+            )
+        except JSONExtractionError as e:
             print(f"JSON parse failed: {e}")
-            return self._fallback_course(title, analysis_text)
+            return self._fallback_course(title, [list(spans[0])] if spans else [[0, len(text)]])
+
+        modules = course_data["modules"]
+        for index, module in enumerate(modules):
+            module["id"] = str(uuid.uuid4())
+            module["source_ranges"] = self._module_source_ranges(
+                [spans[i] for i in self._module_sections(module, index, len(modules), len(spans))]
+            )
+            module.pop("sections", None)
+            module["flashcard"] = None
+            module["quiz"] = None
+            module.setdefault("completed", False)
+            module.setdefault("timeSpent", 0)
+        return course_data
 
-    def _fallback_course(self, title: Optional[str], text: str) -> Dict[str, Any]:
+    def _module_sections(self, module: Dict[str, Any], index: int, num_modules: int, num_chunks: int) -> List[int]:
+        """Sections the model attributed to a module, or an even share of the document if it did not say"""
+        sections = [i for i in module.get("sections") or [] if isinstance(i, int) and 0 <= i < num_chunks]
+        if sections:
+            return sorted(set(sections))
+        start = index * num_chunks // max(num_modules, 1)
+        stop = max(start + 1, (index + 1) * num_chunks // max(num_modules, 1))
+        return list(range(start, min(stop, num_chunks)))
+
+    def _module_source_ranges(self, spans: List[tuple]) -> List[List[int]]:
+        """Offsets of a module's sections in the document text, adjacent sections merged"""
+        ranges: List[List[int]] = []
+        for start, end in spans:
+            if ranges and ranges[-1][1] == start:
+                ranges[-1][1] = end
+            else:
+                ranges.append([start, end])
+        return ranges
+
+    def _fallback_course(self, title: Optional[str], source_ranges: List[List[int]]) -> Dict[str, Any]:
         return {
+            # Placeholder: the course is saved but never indexed for reuse by later uploads
+            "fallback": True,
             "title": title or "Whitepaper Course",
             "description": "Learn key concepts from this whitepaper.",
             "difficulty": "Intermediate",
@@ -166,7 +582,7 @@ class AzureWhitepaperProcessor:
                     "id": str(uuid.uuid4()),
                     "title": "Introduction",
                     "content": "# Introduction\n\nOverview of the whitepaper.",
-                    "source_text": text,
+                    "source_ranges": source_ranges,
                     "flashcards": [],
                     "quiz": {
                         "id": str(uuid.uuid4()),
@@ -180,28 +596,56 @@ class AzureWhitepaperProcessor:
             ]
         }
 
-    async def process_document(self, text: str, title: Optional[str] = None) -> Dict[str, Any]:
+    async def process_document(
+        self,
+        text: str,
+        title: Optional[str] = None,
+        on_preview: Optional[Callable[[Dict[str, Any]], None]] = None,
+        refresh: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        Generate a course; on_preview receives the partially streamed skeleton
+        and module markdown. Modules point into `text` through source_ranges,
+        which is returned once as source_text. refresh=True regenerates
+        instead of reusing a cached course reply.
+        """
         print("Starting Azure AI analysis...")
-        course_data = await self._generate_complete_course(text, title)
+        course_data = await self._generate_complete_course(text, title, on_preview, refresh)
         return {
             "title": course_data.get("title", title or "Whitepaper Course"),
             "description": course_data.get("description", "Learn from this whitepaper"),
             "objectives": course_data.get("objectives", []),
             "modules": course_data.get("modules", []),
+            "source_text": text,
             "estimatedTime": sum(m.get("estimatedTime", 0) for m in course_data.get("modules", [])),
             "difficulty": course_data.get("difficulty", "Intermediate"),
             "createdAt": f"{asyncio.get_event_loop().time()}",
-            "progress": 0
+            "progress": 0,
+            "fallback": course_data.get("fallback", False),
         }
 
-    async def generate_module_quiz(self, module_title: str, module_content: str, source_text: str) -> Dict[str, Any]:
-        await asyncio.sleep(3)
+    async def generate_module_quiz(
+        self, module_title: str, module_content: str, source_text: str, priority: int = PRIORITY_INTERACTIVE, refresh: bool = False
+    ) -> Dict[str, Any]:
         num_questions = min(max(2, len(module_content.split()) // 300), 5)
-        prompt = f"Create {num_questions} MCQs for: {module_title}. Content: {module_content[:1500]}. Respond with JSON."
-        messages = [{"role": "system", "content": "Return JSON only."}, {"role": "user", "content": prompt}]
+        system = "Return JSON only."
+        shape = (
+            'Respond with JSON: {"questions": [{"question": "...", "options": ["...", "...", "...", "..."], '
+            '"correctAnswer": "<the correct option, verbatim>", "explanation": "..."}]}'
+        )
+        budget = PromptBudget(LLM_STUDY_PROMPT_TOKENS, system, shape, module_title)
+        content = budget.fit(module_content, share=0.5)
+        passages = budget.fit(source_text)
+        prompt = (
+            f"Create {num_questions} MCQs for: {module_title}. Content: {content}. "
+            + (f"Source passages from the whitepaper:\n{passages}\n" if passages else "")
+            + shape
+        )
+        messages = [{"role": "system", "content": system}, {"role": "user", "content": prompt}]
         try:
-            response = await self._call_azure_openai(messages, max_tokens=1500)
-            quiz_data = self._extract_json(response)
+            quiz_data = await self._call_json(
+                messages, quiz_schema, max_tokens=quiz_max_tokens(num_questions), cache_site="quiz", priority=priority, refresh=refresh
+            )
             for q in quiz_data.get("questions", []):
                 q["id"] = str(uuid.uuid4())
             return {
@@ -212,7 +656,9 @@ class AzureWhitepaperProcessor:
             }
         except Exception as e:
             print(f"Quiz gen failed: {e}")
+            # Placeholder, marked so it is shown but never saved (see study_materials.is_fallback)
             return {
+                "fallback": True,
                 "id": str(uuid.uuid4()),
                 "questions": [{
                     "id": str(uuid.uuid4()),
@@ -225,23 +671,36 @@ class AzureWhitepaperProcessor:
                 "generated_at": f"{asyncio.get_event_loop().time()}"
             }
 
-    async def generate_module_flashcards(self, module_title: str, module_content: str, source_text: str) -> List[Dict[str, Any]]:
-        await asyncio.sleep(3)
+    async def generate_module_flashcards(
+        self, module_title: str, module_content: str, source_text: str, priority: int = PRIORITY_INTERACTIVE, refresh: bool = False
+    ) -> List[Dict[str, Any]]:
         num_flashcards = min(max(3, len(module_content.split()) // 200), 6)
+        system = "Respond ONLY with a JSON array of objects. No commentary, no markdown."
+        instructions = (
+            f"Generate exactly {num_flashcards} flashcards from the following text.\n"
+            f"Each flashcard must be a JSON object with the keys: 'question' and 'answer'.\n"
+            f"Return a single JSON array, like:\n"
+            f"[{{\"question\": \"...\", \"answer\": \"...\"}}, ...]\n\n"
+        )
+        budget = PromptBudget(LLM_STUDY_PROMPT_TOKENS, system, instructions)
+        content = budget.fit(module_content, share=0.5)
+        passages = budget.fit(source_text)
         messages = [
-            {"role": "system", "content": "Respond ONLY with a JSON array of objects. No commentary, no markdown."},
+            {"role": "system", "content": system},
             {"role": "user", "content": (
-                f"Generate exactly {num_flashcards} flashcards from the following text.\n"
-                f"Each flashcard must be a JSON object with the keys: 'question' and 'answer'.\n"
-                f"Return a single JSON array, like:\n"
-                f"[{{\"question\": \"...\", \"answer\": \"...\"}}, ...]\n\n"
-                f"Content:\n{module_content[:1200]}"
+                f"{instructions}Content:\n{content}"
+                + (f"\n\nSource passages from the whitepaper:\n{passages}" if passages else "")
             )}
         ]
         try:
-            response = await self._call_azure_openai(messages, max_tokens=1000)
-            cards = self._extract_json(response)
-            print(f"\n\n{type(cards)}\n{cards}\n\n")
+            cards = await self._call_json(
+                messages,
+                flashcards_schema,
+                max_tokens=flashcards_max_tokens(num_flashcards),
+                cache_site="flashcards",
+                priority=priority,
+                refresh=refresh,
+            )
             for card in cards:
                 card["id"] = str(uuid.uuid4())
                 card["generated_at"] = f"{asyncio.get_event_loop().time()}"
@@ -249,6 +708,7 @@ class AzureWhitepaperProcessor:
         except Exception as e:
             print(f"Flashcard gen failed: {e}")
             return [{
+                "fallback": True,
                 "id": str(uuid.uuid4()),
                 "front": f"Key concept from {module_title}",
                 "back": "Important information",
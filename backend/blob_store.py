@@ -0,0 +1,137 @@
+# backend/blob_store.py
+import asyncio
+import hashlib
+import mmap
+import os
+import tempfile
+from contextlib import contextmanager
+from typing import Iterator, Optional, Tuple
+
+from fastapi import UploadFile
+
+BLOB_STORE_BACKEND = os.getenv("BLOB_STORE", "local")
+BLOB_STORE_DIR = os.getenv("BLOB_STORE_DIR", "./data/blobs")
+# Read size used when hashing/writing uploads as they stream in
+BLOB_STREAM_CHUNK_BYTES = 1024 * 1024
+
+
+class BlobStore:
+    """
+    Content-addressed storage for uploaded files. Blobs are keyed by the
+    SHA-256 of their bytes, so storing the same file twice is a no-op.
+    """
+
+    async def put(self, data: bytes) -> str:
+        raise NotImplementedError
+
+    async def put_stream(self, file: UploadFile) -> Tuple[str, int]:
+        """Store an upload chunk by chunk, hashing as it streams. Returns (key, size)."""
+        raise NotImplementedError
+
+    def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def local_path(self, key: str) -> str:
+        """Return a local filesystem path holding the blob (backends may download to a cache)"""
+        raise NotImplementedError
+
+    async def delete(self, key: str):
+        raise NotImplementedError
+
+    @contextmanager
+    def open_mmap(self, key: str) -> Iterator[mmap.mmap]:
+        """Read-only memory map of a blob; pages are loaded lazily by the OS"""
+        with open(self.local_path(key), "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                yield mapped
+            finally:
+                mapped.close()
+
+
+class LocalBlobStore(BlobStore):
+    """Blobs on local disk under <root>/<sha[:2]>/<sha[2:4]>/<sha>"""
+
+    def __init__(self, root: str = BLOB_STORE_DIR):
+        self.root = root
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        if len(key) != 64 or not all(c in "0123456789abcdef" for c in key):
+            raise ValueError(f"Invalid blob key: {key}")
+        return os.path.join(self.root, key[:2], key[2:4], key)
+
+    def _write(self, data: bytes) -> str:
+        key = hashlib.sha256(data).hexdigest()
+        path = self._path(key)
+        if os.path.exists(path):
+            return key
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temp file and rename so readers never see partial blobs
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return key
+
+    async def put(self, data: bytes) -> str:
+        return await asyncio.to_thread(self._write, data)
+
+    async def put_stream(self, file: UploadFile) -> Tuple[str, int]:
+        hasher = hashlib.sha256()
+        size = 0
+        tmp_dir = os.path.join(self.root, "tmp")
+        os.makedirs(tmp_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                while True:
+                    chunk = await file.read(BLOB_STREAM_CHUNK_BYTES)
+                    if not chunk:
+                        break
+                    hasher.update(chunk)
+                    size += len(chunk)
+                    await asyncio.to_thread(f.write, chunk)
+
+            key = hasher.hexdigest()
+            path = self._path(key)
+            if size and not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+            return key, size
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def local_path(self, key: str) -> str:
+        path = self._path(key)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Blob not found: {key}")
+        return path
+
+    async def delete(self, key: str):
+        path = self._path(key)
+        if os.path.exists(path):
+            await asyncio.to_thread(os.remove, path)
+
+
+_blob_store: Optional[BlobStore] = None
+
+
+def get_blob_store() -> BlobStore:
+    """Return the configured blob store (BLOB_STORE=local is the only backend so far)"""
+    global _blob_store
+    if _blob_store is None:
+        if BLOB_STORE_BACKEND == "local":
+            _blob_store = LocalBlobStore(BLOB_STORE_DIR)
+        else:
+            raise ValueError(f"Unknown blob store backend: {BLOB_STORE_BACKEND}")
+    return _blob_store
@@ -1,7 +1,64 @@
+import asyncio
+import functools
 import os
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from backend.metrics import record_cache_lookup, time_stage
+
+# Expanded course views (course + modules) kept per API process. Writes from other
+# processes (`python -m backend.worker` prefetching study materials) only show up
+# once the entry expires, so the TTL bounds how stale a view can be
+COURSE_VIEW_CACHE_TTL = float(os.getenv("COURSE_VIEW_CACHE_TTL", "15"))
+COURSE_VIEW_CACHE_SIZE = int(os.getenv("COURSE_VIEW_CACHE_SIZE", "512"))
+# Document references per get_all call
+FIRESTORE_GET_ALL_CHUNK = 100
+# Firestore rejects write batches with more operations than this
+FIRESTORE_BATCH_LIMIT = 500
+# Characters per course_sources document (Firestore documents max out at 1 MiB)
+SOURCE_CHUNK_CHARS = 100_000
+# Marker document in `migrations` written once the course type backfill has run
+COURSE_TYPES_MIGRATION = "course_types_backfill"
+# Threads running blocking Firestore calls off the event loop
+FIRESTORE_MAX_WORKERS = int(os.getenv("FIRESTORE_MAX_WORKERS", "16"))
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_db_executor() -> ThreadPoolExecutor:
+    """Lazily create the bounded thread pool shared by all Firestore calls"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=FIRESTORE_MAX_WORKERS, thread_name_prefix="firestore")
+    return _executor
+
+
+def shutdown_db_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+async def run_blocking(fn: Callable, *args, **kwargs):
+    """Run a synchronous Firestore call on the DB thread pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_db_executor(), functools.partial(fn, *args, **kwargs))
+
+
+def is_valid_document_id(doc_id: str) -> bool:
+    """Firestore document id rules: no '/', not '.' or '..', not __reserved__, at most 1500 bytes"""
+    return (
+        bool(doc_id)
+        and "/" not in doc_id
+        and doc_id not in (".", "..")
+        and not (doc_id.startswith("__") and doc_id.endswith("__"))
+        and len(doc_id.encode("utf-8")) <= 1500
+    )
 
-from firebase_admin import firestore
-from backend.firebase_config import initialize_firebase
 
 class Database:
     client = None
@@ -11,73 +68,332 @@ class Database:
 db_instance = Database()
 
 
+class CourseViewCache:
+    """
+    Read-through cache of expanded course documents. Entries expire after
+    `ttl` seconds and are dropped as soon as one of their modules is written
+    through this process. A module can appear in several cached courses
+    (courses cloned before clones got their own module copies).
+    """
+
+    def __init__(self, ttl: float = COURSE_VIEW_CACHE_TTL, max_entries: int = COURSE_VIEW_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._module_to_courses: Dict[str, Set[str]] = {}
+
+    def get(self, course_id: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(course_id)
+        if entry is None:
+            record_cache_lookup("course_view", False)
+            return None
+        view, stored_at = entry
+        if time.monotonic() - stored_at > self.ttl:
+            self.invalidate(course_id)
+            record_cache_lookup("course_view", False)
+            return None
+        self._entries.move_to_end(course_id)
+        record_cache_lookup("course_view", True)
+        return view
+
+    def set(self, course_id: str, view: Dict[str, Any]):
+        self.invalidate(course_id)
+        self._entries[course_id] = (view, time.monotonic())
+        self._entries.move_to_end(course_id)
+        for module in view.get("modules", []):
+            self._module_to_courses.setdefault(module["id"], set()).add(course_id)
+        while len(self._entries) > self.max_entries:
+            evicted_id, (evicted_view, _) = self._entries.popitem(last=False)
+            self._forget_modules(evicted_id, evicted_view)
+
+    def invalidate(self, course_id: str):
+        entry = self._entries.pop(course_id, None)
+        if entry is not None:
+            self._forget_modules(course_id, entry[0])
+
+    def invalidate_module(self, module_id: str):
+        for course_id in list(self._module_to_courses.get(module_id, ())):
+            self.invalidate(course_id)
+
+    def _forget_modules(self, course_id: str, view: Dict[str, Any]):
+        for module in view.get("modules", []):
+            course_ids = self._module_to_courses.get(module["id"])
+            if course_ids is not None:
+                course_ids.discard(course_id)
+                if not course_ids:
+                    del self._module_to_courses[module["id"]]
+
+
 class FirestoreDatabase:
     def __init__(self, client):
-        self.courses = FirestoreCollection(client.collection("courses"))
-        self.user_progress = FirestoreCollection(client.collection("user_progress"))
-        self.modules = FirestoreCollection(client.collection("modules"))
+        self.client = client
+        self.courses = FirestoreCollection(client.collection("courses"), client)
+        self.user_progress = FirestoreCollection(client.collection("user_progress"), client)
+        self.modules = FirestoreCollection(client.collection("modules"), client)
+        # SHA-256 of an uploaded PDF -> course generated from it
+        self.course_index = FirestoreCollection(client.collection("course_index"), client)
+        # Extracted document text, once per course, split into "<course_id>:<n>" chunks
+        self.course_sources = FirestoreCollection(client.collection("course_sources"), client)
+        # One document per one-off data migration that has completed
+        self.migrations = FirestoreCollection(client.collection("migrations"), client)
+        self.course_views = CourseViewCache()
 
-    async def update_quiz(self, module_id: str, quiz_data: dict):
-        doc_ref = self.modules.collection_ref.document(module_id)
-        doc = doc_ref.get()
-        if not doc.exists:
-            raise ValueError("Module not found")
+    async def commit_batch(self, writes: List[Tuple["FirestoreCollection", Dict[str, Any]]]):
+        """Write documents across collections atomically in one round-trip"""
+        if len(writes) > FIRESTORE_BATCH_LIMIT:
+            raise ValueError(f"A write batch holds at most {FIRESTORE_BATCH_LIMIT} documents")
+        batch = self.client.batch()
+        for collection, document in writes:
+            batch.set(collection.collection_ref.document(document["id"]), document)
+        with time_stage("db_write"):
+            await run_blocking(batch.commit)
+
+    async def save_course(
+        self,
+        course: Dict[str, Any],
+        modules: List[Dict[str, Any]],
+        index_entry: Optional[Dict[str, Any]] = None,
+        source_text: str = "",
+    ):
+        """Persist a generated course, its source text, modules and course_index entry all-or-nothing"""
+        writes = [
+            (self.course_sources, {"id": f"{course['id']}:{n}", "course_id": course["id"], "text": source_text[start:start + SOURCE_CHUNK_CHARS]})
+            for n, start in enumerate(range(0, len(source_text), SOURCE_CHUNK_CHARS))
+        ]
+        writes.extend((self.modules, module) for module in modules)
+        writes.append((self.courses, course))
+        if index_entry:
+            writes.append((self.course_index, index_entry))
+        await self.commit_batch(writes)
+
+    async def clone_course(self, course: Dict[str, Any], user_id: str) -> str:
+        """
+        Copy a course for another user, modules included: quizzes, flashcards
+        and attempts live on the module documents, so sharing them would let
+        one user's regeneration or scores show up in the other's course. The
+        source text and retrieval index are read-only and stay shared.
+        """
+        clone_id = str(uuid.uuid4())
+        modules = []
+        for module in await self.modules.find_many_by_ids(course.get("modules", [])):
+            copy = {
+                **module,
+                "id": str(uuid.uuid4()),
+                "course_id": clone_id,
+                "source_course_id": module.get("source_course_id", module["course_id"]),
+            }
+            if isinstance(copy.get("quiz"), dict):
+                copy["quiz"] = {k: v for k, v in copy["quiz"].items() if k != "score"}
+                copy["quiz"]["attempts"] = 0
+            modules.append(copy)
+        cloned = {**course, "id": clone_id, "user_id": user_id, "progress": 0, "modules": [m["id"] for m in modules]}
+        await self.save_course(cloned, modules)
+        return clone_id
+
+    async def load_source(self, course_id: str, ranges: List[List[int]]) -> str:
+        """Read only the source chunks covering `ranges` and return those spans"""
+        chunk_numbers = sorted({
+            n for start, end in ranges if end > start
+            for n in range(start // SOURCE_CHUNK_CHARS, (end - 1) // SOURCE_CHUNK_CHARS + 1)
+        })
+        docs = await self.course_sources.find_many_by_ids([f"{course_id}:{n}" for n in chunk_numbers])
+        chunks = {int(doc["id"].rsplit(":", 1)[1]): doc["text"] for doc in docs}
+
+        def span(start: int, end: int) -> str:
+            return "".join(
+                chunks.get(n, "")[max(start - n * SOURCE_CHUNK_CHARS, 0):end - n * SOURCE_CHUNK_CHARS]
+                for n in range(start // SOURCE_CHUNK_CHARS, (end - 1) // SOURCE_CHUNK_CHARS + 1)
+            ).strip()
+
+        return "\n\n".join(span(start, end) for start, end in ranges if end > start)
+
+    async def module_source_text(self, module: Dict[str, Any]) -> str:
+        """Source text a module was written from; legacy modules carry their own copy"""
+        if module.get("source_text"):
+            return module["source_text"]
+        if not module.get("source_ranges"):
+            return ""
+        # Modules of a cloned course read the source text stored with the original
+        return await self.load_source(module.get("source_course_id", module["course_id"]), module["source_ranges"])
+
+    async def backfill_course_types(self) -> Optional[int]:
+        """
+        Tag course documents written before the `type` discriminator existed.
+        Runs once per database: the scan is skipped (returns None) once the
+        migrations marker exists.
+        """
+        if await self.migrations.find_many_by_ids([COURSE_TYPES_MIGRATION]):
+            return None
+        query = self.courses.collection_ref.select(["type", "objectives"])
+        docs = await run_blocking(lambda: [(doc.id, doc.to_dict()) for doc in query.stream()])
+        missing = {doc_id: {"type": "course"} for doc_id, data in docs if "type" not in data and "objectives" in data}
+        if missing:
+            await self.courses.bulk_update(missing)
+        await self.migrations.insert_one({"id": COURSE_TYPES_MIGRATION, "tagged": len(missing), "completed_at": time.time()})
+        return len(missing)
 
-        doc_ref.update({"quiz": quiz_data})
+    async def save_study_materials(self, results: List[Dict[str, Any]]):
+        """Write generated quizzes and flashcards for several modules in one batch"""
+        await self.modules.bulk_update({
+            result["module_id"]: {"quiz": result["quiz"], "flashcards": result["flashcards"]}
+            for result in results
+        })
+        for result in results:
+            self.course_views.invalidate_module(result["module_id"])
+
+    async def update_quiz(self, module_id: str, quiz_data: dict):
+        await self._update_module(module_id, {"quiz": quiz_data})
 
     async def update_flashcards(self, module_id: str, flashcards: list):
+        await self._update_module(module_id, {"flashcards": flashcards})
+
+    async def _update_module(self, module_id: str, fields: dict):
         doc_ref = self.modules.collection_ref.document(module_id)
-        doc = doc_ref.get()
-        if not doc.exists:
-            raise ValueError("Module not found")
 
-        doc_ref.update({"flashcards": flashcards})
+        def update():
+            if not doc_ref.get().exists:
+                raise ValueError("Module not found")
+            doc_ref.update(fields)
+
+        with time_stage("db_write"):
+            await run_blocking(update)
+        self.course_views.invalidate_module(module_id)
+
 
 class FirestoreCollection:
-    def __init__(self, collection_ref):
+    """
+    Mongo-style wrapper over a Firestore collection. The Firestore client is
+    synchronous, so every call runs on the shared DB thread pool and the
+    event loop keeps serving other requests during the round-trip.
+    """
+
+    def __init__(self, collection_ref, client=None):
         self.collection_ref = collection_ref
+        self.client = client
+
+    def _query(self, filter_dict):
+        query = self.collection_ref
+        for key, value in filter_dict.items():
+            query = query.where(key, "==", value)
+        return query
 
     async def insert_one(self, document):
         doc_ref = self.collection_ref.document(document["id"])
-        doc_ref.set(document)
+        with time_stage("db_write"):
+            await run_blocking(doc_ref.set, document)
         return {"inserted_id": document["id"]}
 
+    async def insert_many(self, documents: List[Dict[str, Any]]):
+        """Batched inserts; each batch of FIRESTORE_BATCH_LIMIT documents commits atomically"""
+        batches = []
+        for i in range(0, len(documents), FIRESTORE_BATCH_LIMIT):
+            batch = self.client.batch()
+            for document in documents[i:i + FIRESTORE_BATCH_LIMIT]:
+                batch.set(self.collection_ref.document(document["id"]), document)
+            batches.append(batch)
+        with time_stage("db_write"):
+            await asyncio.gather(*(run_blocking(batch.commit) for batch in batches))
+        return {"inserted_ids": [document["id"] for document in documents]}
+
     async def find_one(self, filter_dict):
-        query = self.collection_ref
-        for key, value in filter_dict.items():
-            query = query.where(key, "==", value)
-        docs = query.limit(1).stream()
-        docs = list(docs)
-        return docs[0].to_dict() if docs else None
+        query = self._query(filter_dict).limit(1)
+        docs = await run_blocking(lambda: [doc.to_dict() for doc in query.stream()])
+        return docs[0] if docs else None
 
-    def find(self, filter_dict):
-        query = self.collection_ref
-        for key, value in filter_dict.items():
-            query = query.where(key, "==", value)
+    async def find_many_by_ids(self, ids: List[str]) -> List[Dict[str, Any]]:
+        """Fetch documents by id with batched get_all calls, run concurrently; keeps `ids` order, skips missing"""
+        if not ids:
+            return []
+
+        def fetch(chunk):
+            refs = [self.collection_ref.document(doc_id) for doc_id in chunk]
+            return [snap.to_dict() for snap in self.client.get_all(refs) if snap.exists]
+
+        chunks = [ids[i:i + FIRESTORE_GET_ALL_CHUNK] for i in range(0, len(ids), FIRESTORE_GET_ALL_CHUNK)]
+        results = await asyncio.gather(*(run_blocking(fetch, chunk) for chunk in chunks))
+        by_id = {doc["id"]: doc for docs in results for doc in docs}
+        return [by_id[doc_id] for doc_id in ids if doc_id in by_id]
+
+    def find(self, filter_dict, fields: Optional[List[str]] = None):
+        """Query by equality filters; `fields` projects documents server-side"""
+        query = self._query(filter_dict)
+        if fields:
+            query = query.select(fields)
         return FirestoreCursor(query)
 
+    async def find_page(
+        self,
+        filter_dict,
+        fields: Optional[List[str]] = None,
+        limit: int = 50,
+        start_after: Optional[str] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        One page of documents in document-id order. Returns (documents,
+        next_cursor); pass next_cursor back as `start_after` for the next
+        page, None means this was the last one.
+        """
+        query = self._query(filter_dict)
+        if fields:
+            query = query.select(list(dict.fromkeys(["id", *fields])))
+        query = query.order_by("__name__")
+        if start_after:
+            query = query.start_after({"__name__": start_after})
+        query = query.limit(limit + 1)
+
+        docs = await run_blocking(lambda: [doc.to_dict() for doc in query.stream()])
+        if len(docs) > limit:
+            return docs[:limit], docs[limit - 1]["id"]
+        return docs, None
+
     async def update_one(self, filter_dict, update_dict):
-        doc = await self.find_one(filter_dict)
-        if not doc:
-            return {"matched_count": 0, "modified_count": 0}
-        doc_ref = self.collection_ref.document(doc["id"])
-        if "$set" in update_dict:
-            doc_ref.update(update_dict["$set"])
-        return {"matched_count": 1, "modified_count": 1}
+        query = self._query(filter_dict).limit(1)
+
+        def update():
+            docs = list(query.stream())
+            if not docs:
+                return {"matched_count": 0, "modified_count": 0}
+            if "$set" in update_dict:
+                docs[0].reference.update(update_dict["$set"])
+            return {"matched_count": 1, "modified_count": 1}
+
+        with time_stage("db_write"):
+            return await run_blocking(update)
+
+    async def bulk_update(self, updates: Dict[str, Dict[str, Any]]):
+        """
+        Apply {doc_id: fields} updates in write batches. A batch fails as a
+        whole if any of its documents does not exist.
+        """
+        items = list(updates.items())
+        batches = []
+        for i in range(0, len(items), FIRESTORE_BATCH_LIMIT):
+            batch = self.client.batch()
+            for doc_id, fields in items[i:i + FIRESTORE_BATCH_LIMIT]:
+                batch.update(self.collection_ref.document(doc_id), fields)
+            batches.append(batch)
+        with time_stage("db_write"):
+            await asyncio.gather(*(run_blocking(batch.commit) for batch in batches))
+        return {"matched_count": len(items), "modified_count": len(items)}
 
     async def create_index(self, index_spec):
         pass  # Firestore auto-indexes
-        
+
+
 class FirestoreCursor:
     def __init__(self, query):
         self.query = query
 
     async def to_list(self, length=None):
-        docs = self.query.limit(length or 100).stream()
-        return [doc.to_dict() for doc in docs]
+        query = self.query.limit(length or 100)
+        return await run_blocking(lambda: [doc.to_dict() for doc in query.stream()])
 
 
 def connect_to_db():
+    # Imported here so loading this module stays cheap; the Firestore client pulls in gRPC
+    from firebase_admin import firestore
+    from backend.firebase_config import initialize_firebase
+
     # Ensure Firebase is initialized first
     initialize_firebase()
     print("✅ Connecting to Firestore")
@@ -88,9 +404,10 @@ def connect_to_db():
 
 
 async def startup_db():
-    return connect_to_db()
+    # Off the event loop: Firebase setup and the Firestore client take a while to build
+    return await asyncio.to_thread(connect_to_db)
 
 
 async def shutdown_db():
     """Cleanup on shutdown"""
-    pass
\ No newline at end of file
+    shutdown_db_executor()
\ No newline at end of file
@@ -1,13 +1,28 @@
 import os
 import json
+import asyncio
+import threading
+from typing import Optional
 import firebase_admin
 from firebase_admin import credentials, auth
 from fastapi import HTTPException, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
+from backend.auth_tokens import FirebaseTokenVerifier
+
+_init_lock = threading.Lock()
+
+
 # Initialize Firebase Admin SDK
 def initialize_firebase():
-    """Initialize Firebase Admin SDK with service account credentials"""
+    """Initialize Firebase Admin SDK with service account credentials (idempotent, thread-safe)"""
+    if firebase_admin._apps:
+        return firebase_admin.get_app()
+    with _init_lock:
+        return _initialize_firebase()
+
+
+def _initialize_firebase():
     if not firebase_admin._apps:
         try:
             # Method 1: Using service account file (recommended for development)
@@ -62,33 +77,63 @@ def initialize_firebase():
 # Security scheme
 security = HTTPBearer()
 
+_token_verifier: Optional[FirebaseTokenVerifier] = None
+
+
+def get_token_verifier() -> Optional[FirebaseTokenVerifier]:
+    """Cached verifier for this app's project; None under the Auth emulator or without a project id"""
+    global _token_verifier
+    if _token_verifier is None:
+        project_id = firebase_admin.get_app().project_id
+        if os.getenv("FIREBASE_AUTH_EMULATOR_HOST") or not project_id:
+            return None
+        _token_verifier = FirebaseTokenVerifier(project_id)
+    return _token_verifier
+
+
+async def shutdown_token_verifier():
+    """Stop the background certificate refresh (called on app shutdown)"""
+    global _token_verifier
+    if _token_verifier is not None:
+        await _token_verifier.aclose()
+        _token_verifier = None
+
+
 async def verify_firebase_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """Verify Firebase ID token - production only"""
-    try:
-        # Ensure Firebase is initialized
-        if not firebase_admin._apps:
+    # Initialized on first use rather than at import
+    if not firebase_admin._apps:
+        try:
+            await asyncio.to_thread(initialize_firebase)
+        except Exception:
             raise HTTPException(
                 status_code=500,
                 detail="Firebase not initialized. Please check server configuration."
             )
-        
-        # Verify the ID token
-        decoded_token = auth.verify_id_token(credentials.credentials)
+
+    try:
+        # Verify the ID token: cached keys and verified tokens, unless running against the emulator
+        verifier = get_token_verifier()
+        if verifier is not None:
+            decoded_token = await verifier.verify(credentials.credentials)
+        else:
+            decoded_token = await asyncio.to_thread(auth.verify_id_token, credentials.credentials)
         return {
             "uid": decoded_token["uid"],
             "email": decoded_token.get("email"),
             "name": decoded_token.get("name"),
             "email_verified": decoded_token.get("email_verified", False)
         }
-    except auth.InvalidIdTokenError:
+    except auth.ExpiredIdTokenError:
+        # Checked first: ExpiredIdTokenError is a subclass of InvalidIdTokenError
         raise HTTPException(
             status_code=401,
-            detail="Invalid authentication token"
+            detail="Authentication token has expired"
         )
-    except auth.ExpiredIdTokenError:
+    except auth.InvalidIdTokenError:
         raise HTTPException(
             status_code=401,
-            detail="Authentication token has expired"
+            detail="Invalid authentication token"
         )
     except Exception as e:
         raise HTTPException(
@@ -99,10 +144,3 @@ async def verify_firebase_token(credentials: HTTPAuthorizationCredentials = Depe
 async def get_current_user(token_data: dict = Depends(verify_firebase_token)):
     """Get current user from verified Firebase token"""
     return token_data
-
-# Initialize Firebase on import
-try:
-    initialize_firebase()
-except Exception as e:
-    print(f"⚠️  Firebase initialization failed on startup: {e}")
-    print("Please ensure Firebase credentials are properly configured.")
\ No newline at end of file
@@ -0,0 +1,354 @@
+# backend/job_queue.py
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from backend.models.course import ProcessingStatus
+
+JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", "./data/jobs.sqlite3")
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_BASE_SECONDS = float(os.getenv("JOB_RETRY_BASE_SECONDS", "10"))
+# How long status change events are kept for stream resumption
+STATUS_EVENT_RETENTION_SECONDS = float(os.getenv("STATUS_EVENT_RETENTION_SECONDS", "3600"))
+
+
+class PermanentJobError(Exception):
+    """Job failure that retrying will not fix (e.g. an image-only PDF)"""
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Autocommit mode; multi-statement updates use explicit BEGIN IMMEDIATE
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+
+class JobQueue:
+    """
+    Durable job queue in SQLite. Workers claim a job with a lease and must
+    heartbeat before it expires; a job whose lease lapses (worker crashed or
+    was restarted) becomes claimable again. Failures are retried with
+    exponential backoff up to max_attempts.
+    """
+
+    def __init__(self, path: str = JOB_QUEUE_PATH):
+        self._conn = _connect(path)
+        self._lock = threading.Lock()
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, kind TEXT NOT NULL, payload TEXT NOT NULL, status TEXT NOT NULL, "
+            "priority INTEGER NOT NULL DEFAULT 0, attempts INTEGER NOT NULL DEFAULT 0, "
+            "max_attempts INTEGER NOT NULL, run_after REAL NOT NULL, lease_owner TEXT, "
+            "lease_expires REAL, last_error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, priority, run_after)")
+
+    def _row_to_job(self, row: sqlite3.Row) -> Dict[str, Any]:
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        return job
+
+    def _enqueue(self, kind: str, payload: Dict[str, Any], job_id: str, max_attempts: int, priority: int) -> bool:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+                if row and row["status"] in ("queued", "running"):
+                    self._conn.execute("COMMIT")
+                    return False
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO jobs (id, kind, payload, status, priority, attempts, max_attempts, "
+                    "run_after, created_at, updated_at) VALUES (?, ?, ?, 'queued', ?, 0, ?, ?, ?, ?)",
+                    (job_id, kind, json.dumps(payload), priority, max_attempts, now, now, now),
+                )
+                self._conn.execute("COMMIT")
+                return True
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _claim(self, worker_id: str, lease_seconds: float) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                while True:
+                    row = self._conn.execute(
+                        "SELECT * FROM jobs WHERE (status = 'queued' AND run_after <= ?) "
+                        "OR (status = 'running' AND lease_expires < ?) "
+                        "ORDER BY priority, run_after LIMIT 1",
+                        (now, now),
+                    ).fetchone()
+                    if row is None:
+                        self._conn.execute("COMMIT")
+                        return None
+                    if row["status"] == "running" and row["attempts"] >= row["max_attempts"]:
+                        # Lease lapsed on the final attempt: the job keeps killing its worker
+                        self._conn.execute(
+                            "UPDATE jobs SET status = 'failed', last_error = ?, updated_at = ? WHERE id = ?",
+                            ("Lease expired on final attempt", now, row["id"]),
+                        )
+                        continue
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'running', lease_owner = ?, lease_expires = ?, "
+                        "attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                        (worker_id, now + lease_seconds, now, row["id"]),
+                    )
+                    claimed = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone()
+                    self._conn.execute("COMMIT")
+                    return self._row_to_job(claimed)
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _heartbeat(self, job_id: str, worker_id: str, lease_seconds: float) -> bool:
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET lease_expires = ?, updated_at = ? "
+                "WHERE id = ? AND lease_owner = ? AND status = 'running'",
+                (now + lease_seconds, now, job_id, worker_id),
+            )
+            return cursor.rowcount == 1
+
+    def _complete(self, job_id: str, worker_id: str):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'completed', lease_owner = NULL, lease_expires = NULL, updated_at = ? "
+                "WHERE id = ? AND lease_owner = ?",
+                (time.time(), job_id, worker_id),
+            )
+
+    def _fail(self, job_id: str, worker_id: str, error: str, permanent: bool) -> bool:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT attempts, max_attempts FROM jobs WHERE id = ? AND lease_owner = ?", (job_id, worker_id)
+            ).fetchone()
+            if row is None:
+                return False  # Lease was lost; whoever holds it now owns the outcome
+            if not permanent and row["attempts"] < row["max_attempts"]:
+                delay = JOB_RETRY_BASE_SECONDS * 2 ** (row["attempts"] - 1)
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'queued', run_after = ?, lease_owner = NULL, lease_expires = NULL, "
+                    "last_error = ?, updated_at = ? WHERE id = ?",
+                    (now + delay, error, now, job_id),
+                )
+                return True
+            self._conn.execute(
+                "UPDATE jobs SET status = 'failed', lease_owner = NULL, lease_expires = NULL, "
+                "last_error = ?, updated_at = ? WHERE id = ?",
+                (error, now, job_id),
+            )
+            return False
+
+    def _get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def _counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+    # -----------------------------
+    # Async API (SQLite calls run in a worker thread)
+    # -----------------------------
+
+    async def enqueue(
+        self,
+        kind: str,
+        payload: Dict[str, Any],
+        job_id: Optional[str] = None,
+        max_attempts: int = JOB_MAX_ATTEMPTS,
+        priority: int = 0,
+    ) -> bool:
+        """Queue a job; returns False if a job with this id is already queued or running"""
+        return await asyncio.to_thread(self._enqueue, kind, payload, job_id or str(uuid.uuid4()), max_attempts, priority)
+
+    async def claim(self, worker_id: str, lease_seconds: float = JOB_LEASE_SECONDS) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self._claim, worker_id, lease_seconds)
+
+    async def heartbeat(self, job_id: str, worker_id: str, lease_seconds: float = JOB_LEASE_SECONDS) -> bool:
+        return await asyncio.to_thread(self._heartbeat, job_id, worker_id, lease_seconds)
+
+    async def complete(self, job_id: str, worker_id: str):
+        await asyncio.to_thread(self._complete, job_id, worker_id)
+
+    async def fail(self, job_id: str, worker_id: str, error: str, permanent: bool = False) -> bool:
+        """Record a failed attempt; returns True if the job was rescheduled"""
+        return await asyncio.to_thread(self._fail, job_id, worker_id, error, permanent)
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self._get, job_id)
+
+    async def counts(self) -> Dict[str, int]:
+        return await asyncio.to_thread(self._counts)
+
+
+class StatusStore:
+    """
+    ProcessingStatus records shared by every API and worker process on the
+    host. Every write also appends to status_events, whose sequence number
+    is the event id used by the progress streams. SQLite calls may wait on
+    another process's write lock, so the public methods run them on a
+    thread; update_soon() serves synchronous callbacks on the event loop.
+    """
+
+    def __init__(self, path: str = JOB_QUEUE_PATH):
+        self._conn = _connect(path)
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._listeners: List[Callable[[], None]] = []
+        # update_soon(): fields waiting to be written, and the task writing them, per status id
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._flushers: Dict[str, asyncio.Task] = {}
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS job_status (id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS status_events ("
+            "seq INTEGER PRIMARY KEY AUTOINCREMENT, id TEXT NOT NULL, data TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS status_events_id ON status_events (id, seq)")
+
+    def add_listener(self, listener: Callable[[], None]):
+        """Called after every local write so in-process streams can wake up immediately"""
+        self._listeners.append(listener)
+
+    async def get(self, status_id: str) -> Optional[ProcessingStatus]:
+        return await asyncio.to_thread(self._get, status_id)
+
+    async def set(self, status: ProcessingStatus):
+        await asyncio.to_thread(self._set, status)
+
+    async def update(self, status_id: str, **fields) -> ProcessingStatus:
+        flusher = self._flushers.get(status_id)
+        if flusher is not None:
+            await asyncio.shield(flusher)  # Queued update_soon() fields are older: write them first
+        return await asyncio.to_thread(self._update, status_id, **fields)
+
+    def update_soon(self, status_id: str, **fields):
+        """
+        update() for synchronous callbacks on the event loop (page progress,
+        streamed previews). Writes happen in order on a thread; fields queued
+        while one is in flight are merged into a single write.
+        """
+        self._pending.setdefault(status_id, {}).update(fields)
+        if status_id not in self._flushers:
+            self._flushers[status_id] = asyncio.ensure_future(self._flush_pending(status_id))
+
+    async def _flush_pending(self, status_id: str):
+        try:
+            while status_id in self._pending:
+                fields = self._pending.pop(status_id)
+                try:
+                    await asyncio.to_thread(self._update, status_id, **fields)
+                except Exception as e:
+                    # Progress is informational; the next write carries the current state anyway
+                    print(f"⚠️  Status update for {status_id} failed: {e}")
+        finally:
+            del self._flushers[status_id]
+
+    def _get(self, status_id: str) -> Optional[ProcessingStatus]:
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM job_status WHERE id = ?", (status_id,)).fetchone()
+        return ProcessingStatus.model_validate_json(row["data"]) if row else None
+
+    def _write_locked(self, status: ProcessingStatus):
+        now = time.time()
+        data = status.model_dump_json()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO job_status (id, data, updated_at) VALUES (?, ?, ?)", (status.id, data, now)
+        )
+        self._conn.execute("INSERT INTO status_events (id, data, created_at) VALUES (?, ?, ?)", (status.id, data, now))
+        self._writes += 1
+        if self._writes % 500 == 0:
+            self._conn.execute("DELETE FROM status_events WHERE created_at < ?", (now - STATUS_EVENT_RETENTION_SECONDS,))
+
+    def _notify(self):
+        for listener in self._listeners:
+            listener()
+
+    def _set(self, status: ProcessingStatus):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._write_locked(status)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        self._notify()
+
+    def _update(self, status_id: str, **fields) -> ProcessingStatus:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT data FROM job_status WHERE id = ?", (status_id,)).fetchone()
+                if row:
+                    status = ProcessingStatus.model_validate_json(row["data"]).model_copy(update=fields)
+                else:
+                    status = ProcessingStatus(**{"id": status_id, "status": "processing", "progress": 0, **fields})
+                self._write_locked(status)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        self._notify()
+        return status
+
+    def latest_event(self, status_id: str) -> Optional[Tuple[int, ProcessingStatus]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT seq, data FROM status_events WHERE id = ? ORDER BY seq DESC LIMIT 1", (status_id,)
+            ).fetchone()
+        return (row["seq"], ProcessingStatus.model_validate_json(row["data"])) if row else None
+
+    def events_since(self, seq: int, status_id: Optional[str] = None, limit: int = 1000) -> List[Tuple[int, ProcessingStatus]]:
+        """Status change events after `seq`, oldest first (all ids, or one id)"""
+        with self._lock:
+            if status_id is None:
+                rows = self._conn.execute(
+                    "SELECT seq, data FROM status_events WHERE seq > ? ORDER BY seq LIMIT ?", (seq, limit)
+                ).fetchall()
+            else:
+                rows = self._conn.execute(
+                    "SELECT seq, data FROM status_events WHERE id = ? AND seq > ? ORDER BY seq LIMIT ?",
+                    (status_id, seq, limit),
+                ).fetchall()
+        return [(row["seq"], ProcessingStatus.model_validate_json(row["data"])) for row in rows]
+
+    def max_seq(self) -> int:
+        with self._lock:
+            row = self._conn.execute("SELECT COALESCE(MAX(seq), 0) AS seq FROM status_events").fetchone()
+        return row["seq"]
+
+
+_job_queue: Optional[JobQueue] = None
+_status_store: Optional[StatusStore] = None
+
+
+def get_job_queue() -> JobQueue:
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = JobQueue()
+    return _job_queue
+
+
+def get_status_store() -> StatusStore:
+    global _status_store
+    if _status_store is None:
+        _status_store = StatusStore()
+    return _status_store
@@ -0,0 +1,163 @@
+# backend/json_extractor.py
+import json
+import re
+from typing import Any, Callable, List, Optional
+
+# Validates a decoded value and returns it normalized; raises ValueError when it does not fit
+Schema = Callable[[Any], Any]
+
+_OPENERS = re.compile(r"[{\[]")
+_STRUCTURAL = re.compile(r'[{}\[\]",]')
+_STRING_SPECIAL = re.compile(r'["\\]')
+_CODE_FENCE = re.compile(r"^\s*```[a-zA-Z]*\s*\n?")
+_STRING_OR_TRAILING_COMMA = re.compile(r'"(?:[^"\\]|\\.)*"|,(\s*[}\]])', re.DOTALL)
+
+
+class JSONExtractionError(ValueError):
+    """No JSON value in the model output satisfied the schema"""
+
+
+def strip_trailing_commas(text: str) -> str:
+    """Drop commas that directly precede a closing bracket, leaving string contents alone"""
+    return _STRING_OR_TRAILING_COMMA.sub(lambda m: m.group(1) if m.group(1) is not None else m.group(0), text)
+
+
+def strip_code_fence(text: str) -> str:
+    """Remove a leading ```json fence, e.g. from a continuation reply"""
+    return _CODE_FENCE.sub("", text, count=1)
+
+
+class IncrementalJSONParser:
+    """
+    Finds the first top-level JSON object or array in model output that
+    satisfies `schema`, reading the text as it streams in. Text is scanned
+    once, jumping between structural characters, and a candidate is only
+    decoded when its outermost bracket closes. Trailing commas and raw
+    newlines inside strings are tolerated. If the output stops inside a
+    value (max_tokens), `truncated` is set and `repair()` closes it.
+    """
+
+    def __init__(self, schema: Optional[Schema] = None):
+        self.schema = schema
+        self.text = ""
+        self.result: Any = None
+        self.done = False
+        self.errors: List[str] = []
+        self._pos = 0
+        self._start = 0
+        # One entry per open container: [closing char, index of opener, index of its last comma]
+        self._stack: List[list] = []
+        self._in_string = False
+        self._escape = False
+
+    @property
+    def truncated(self) -> bool:
+        """The text so far ends inside a JSON value"""
+        return not self.done and bool(self._stack)
+
+    def feed(self, chunk: str):
+        self.text += chunk
+        if not self.done:
+            self._scan()
+
+    def _scan(self):
+        text, stack = self.text, self._stack
+        i, n = self._pos, len(text)
+        while i < n:
+            if self._escape:
+                self._escape = False
+                i += 1
+                continue
+            if self._in_string:
+                match = _STRING_SPECIAL.search(text, i)
+                if match is None:
+                    break
+                i = match.start()
+                if text[i] == "\\":
+                    self._escape = True
+                else:
+                    self._in_string = False
+                i += 1
+                continue
+
+            match = (_STRUCTURAL if stack else _OPENERS).search(text, i)
+            if match is None:
+                break
+            i = match.start()
+            char = text[i]
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                if not stack:
+                    self._start = i
+                stack.append(["}" if char == "{" else "]", i, None])
+            elif char == ",":
+                stack[-1][2] = i
+            else:
+                stack.pop()
+                if not stack and self._accept(text[self._start:i + 1]):
+                    self.done = True
+                    self._pos = i + 1
+                    return
+            i += 1
+        self._pos = n
+
+    def _accept(self, candidate: str) -> bool:
+        try:
+            value = json.loads(candidate, strict=False)
+        except json.JSONDecodeError:
+            try:
+                value = json.loads(strip_trailing_commas(candidate), strict=False)
+            except json.JSONDecodeError as e:
+                self.errors.append(f"invalid JSON: {e}")
+                return False
+        if self.schema is not None:
+            try:
+                value = self.schema(value)
+            except (ValueError, TypeError) as e:
+                self.errors.append(f"schema: {e}".splitlines()[0])
+                return False
+        self.result = value
+        return True
+
+    def repair(self) -> Any:
+        """
+        Close output that was cut off mid-document. Works outwards from the
+        innermost open container: first cut back to its last complete
+        element, then drop the container altogether, until a candidate
+        decodes and satisfies the schema.
+        """
+        if self.done:
+            return self.result
+        if not self._stack:
+            raise JSONExtractionError(self.describe_failure())
+
+        text, stack = self.text, self._stack
+        for level in range(len(stack) - 1, -1, -1):
+            _, opened_at, last_comma = stack[level]
+            if last_comma is not None:
+                closers = "".join(entry[0] for entry in reversed(stack[:level + 1]))
+                if self._accept(text[self._start:last_comma] + closers):
+                    return self.result
+            if level > 0:
+                closers = "".join(entry[0] for entry in reversed(stack[:level]))
+                if self._accept(text[self._start:opened_at] + closers):
+                    return self.result
+        raise JSONExtractionError(self.describe_failure())
+
+    def describe_failure(self) -> str:
+        if not self.errors and not self._stack:
+            return "No JSON object or array found in response"
+        detail = self.errors[-1] if self.errors else "output ended mid-document"
+        return f"No usable JSON in response ({detail})"
+
+
+def extract_json(text: str, schema: Optional[Schema] = None, repair: bool = False) -> Any:
+    """First JSON value in `text` that satisfies `schema`; optionally repair truncated output"""
+    parser = IncrementalJSONParser(schema)
+    parser.feed(text)
+    if parser.done:
+        return parser.result
+    if repair and parser.truncated:
+        return parser.repair()
+    raise JSONExtractionError(parser.describe_failure())
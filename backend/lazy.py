@@ -0,0 +1,88 @@
+# backend/lazy.py
+"""
+Lazily initialized process resources (Firebase app, Firestore client, LLM
+processor). Nothing is built at import time: a resource is created by the
+first caller of get(), concurrent callers share that one initialization,
+and a failed initialization is retried by the next caller. Each resource
+keeps its state for the readiness endpoint.
+"""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Generic, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+IDLE = "idle"            # Not needed yet
+STARTING = "starting"    # First caller is initializing it
+READY = "ready"
+FAILED = "failed"        # Last attempt raised; the next get() tries again
+
+_resources: List["LazyResource"] = []
+
+
+class LazyResource(Generic[T]):
+    def __init__(self, name: str, factory: Callable[[], Awaitable[T]]):
+        self.name = name
+        self._factory = factory
+        self._value: Optional[T] = None
+        self._task: Optional[asyncio.Task] = None
+        self.state = IDLE
+        self.error: Optional[str] = None
+        self.init_seconds: Optional[float] = None
+        _resources.append(self)
+
+    async def _init(self) -> T:
+        self.state = STARTING
+        started = time.perf_counter()
+        try:
+            value = await self._factory()
+        except Exception as e:
+            self.state = FAILED
+            self.error = f"{type(e).__name__}: {e}"
+            self._task = None
+            print(f"❌ {self.name} initialization failed: {e}")
+            raise
+        self.init_seconds = time.perf_counter() - started
+        self._value = value
+        self.state = READY
+        self.error = None
+        print(f"✅ {self.name} ready in {self.init_seconds:.2f}s")
+        return value
+
+    async def get(self) -> T:
+        if self.state == READY:
+            return self._value
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._init())
+        # Shielded: a cancelled caller must not abort the initialization others wait on
+        return await asyncio.shield(self._task)
+
+    def peek(self) -> Optional[T]:
+        """The resource if it has been initialized, without triggering initialization"""
+        return self._value if self.state == READY else None
+
+    def reset(self) -> Optional[T]:
+        """Forget the resource (on shutdown) and return it for cleanup"""
+        value = self.peek()
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+        self._value = self._task = None
+        self.state = IDLE
+        return value
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "init_seconds": round(self.init_seconds, 3) if self.init_seconds is not None else None,
+            "error": self.error,
+        }
+
+
+def readiness() -> Dict[str, Any]:
+    """
+    Ready unless a resource is still starting or its last initialization
+    failed; resources nothing has asked for yet (idle) don't hold it back.
+    """
+    components = {resource.name: resource.status() for resource in _resources}
+    ready = all(status["state"] in (IDLE, READY) for status in components.values())
+    return {"ready": ready, "components": components}
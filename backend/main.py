@@ -1,28 +1,38 @@
 # backend/main.py
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Depends
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Depends, Header, Query, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 import os
 import asyncio
+import json
+import sys
 import uuid
-from typing import Dict, Any, Optional
-import io
+from typing import Dict, Any, List, Optional, Union
 
 from dotenv import load_dotenv
 
-from backend.azure_processor import AzureWhitepaperProcessor
-from backend.models.course import Course, Module, ProcessingStatus
-from backend.database import startup_db
-
-
+# Before the backend imports below: they read their settings at import time
 load_dotenv()
 
-app = FastAPI(title="Whitepaper AI API", version="1.0.0")
+# Only light modules are imported here. Firebase/Firestore, the LLM client
+# stack and the PDF library are imported and built on first use (or by the
+# background warm-up), and the SQLite job queue / status store open at startup,
+# so importing this module stays fast and side-effect free.
+from backend.models.course import CourseListPage, CourseSummary, ProcessingStatus
+from backend.blob_store import get_blob_store
+from backend.database import is_valid_document_id, shutdown_db, startup_db
+from backend.job_queue import get_job_queue, get_status_store
+from backend.lazy import LazyResource, readiness
+from backend.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, JOB_QUEUE_JOBS, CallbackMetric, render as render_metrics, time_stage
+from backend.pdf_extractor import shutdown_executor
+from backend.profiling import ProfileMiddleware
+from backend.rate_limiter import get_rate_limiter
+from backend.static_files import STATIC_DIR, STATIC_PRECOMPRESS, FrontendStaticFiles
+from backend.status_stream import get_status_broadcaster
+from backend.token_budget import get_token_usage
+from backend.worker import JobWorker
 
-# Global database variable
-db = None
-processor = AzureWhitepaperProcessor()
+app = FastAPI(title="Whitepaper AI API", version="1.0.0")
 
 # CORS setup
 app.add_middleware(
@@ -34,22 +44,129 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Per-request sampling profiles for /api routes (only when PROFILE_TOKEN is set)
+app.add_middleware(ProfileMiddleware)
+
+# Course list: page size and the fields a summary carries
+COURSE_LIST_PAGE_SIZE = int(os.getenv("COURSE_LIST_PAGE_SIZE", "50"))
+COURSE_SUMMARY_FIELDS = list(CourseSummary.model_fields)
+
+# Keep-alive comment interval for idle SSE connections
+SSE_PING_SECONDS = 15
+
+# Run jobs inside the API process unless dedicated workers are deployed (python -m backend.worker)
+JOB_EMBEDDED_WORKER = os.getenv("JOB_EMBEDDED_WORKER", "true").lower() == "true"
+embedded_worker: Optional[JobWorker] = None
+
+# Bring up Firestore and the LLM client in the background right after startup
+# (false = on first request; an embedded worker still needs both)
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "true").lower() == "true"
+# Delay between warm-up attempts while a resource can't be initialized
+STARTUP_WARMUP_RETRY_SECONDS = 30
+warmup_task: Optional[asyncio.Task] = None
+
+
+async def _init_firebase():
+    from backend.firebase_config import initialize_firebase
+    return await asyncio.to_thread(initialize_firebase)
+
+
+async def _connect_database():
+    await firebase_app.get()
+    db = await startup_db()
+    if db is None:
+        raise RuntimeError("Failed to connect to database")
+    asyncio.create_task(backfill_course_types(db))
+    return db
+
+
+async def _start_processor():
+    def build():
+        from backend.azure_processor import AzureWhitepaperProcessor
+        return AzureWhitepaperProcessor()
+
+    processor = await asyncio.to_thread(build)
+    await processor.start()
+    return processor
+
+
+firebase_app = LazyResource("firebase", _init_firebase)
+database = LazyResource("database", _connect_database)
+llm_processor = LazyResource("llm_processor", _start_processor)
+
+
+async def get_db():
+    """Firestore wrapper, connected on first use"""
+    try:
+        return await database.get()
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Database unavailable: {str(e)}")
+
 
-# In-memory status tracking (replace Redis later)
-processing_status: Dict[str, ProcessingStatus] = {}
+async def get_processor():
+    """LLM processor, started on first use"""
+    try:
+        return await llm_processor.get()
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"LLM processor unavailable: {str(e)}")
 
 
 @app.on_event("startup")
 async def startup_event():
-    global db
+    # Nothing slow here: the server accepts requests (static files included) right away.
+    # The SQLite job queue / status store (shared by all API and worker processes) opens here.
+    get_status_broadcaster().start()
+    if STATIC_PRECOMPRESS:
+        asyncio.create_task(asyncio.to_thread(frontend.precompress))
+    global warmup_task
+    if STARTUP_WARMUP or JOB_EMBEDDED_WORKER:
+        warmup_task = asyncio.create_task(warm_up())
+
+
+async def warm_up():
+    """Initialize resources ahead of the first request and start the embedded worker; retried until it succeeds"""
+    global embedded_worker
+    while True:
+        try:
+            db, processor = await asyncio.gather(database.get(), llm_processor.get())
+            break
+        except Exception as e:
+            print(f"⚠️  Warm-up failed, retrying in {STARTUP_WARMUP_RETRY_SECONDS}s: {e}")
+            await asyncio.sleep(STARTUP_WARMUP_RETRY_SECONDS)
+
+    if JOB_EMBEDDED_WORKER:
+        from backend.pipeline import build_job_handlers
+        embedded_worker = JobWorker(get_job_queue(), build_job_handlers(db, processor))
+        embedded_worker.start()
+
+
+async def backfill_course_types(db):
     try:
-        db = await startup_db()
-        if db is None:
-            raise RuntimeError("Failed to connect to database")
-        print("✅ Database initialized successfully")
+        tagged = await db.backfill_course_types()
+        if tagged:
+            print(f"🏷️  Tagged {tagged} legacy course documents with type=course")
     except Exception as e:
-        print(f"❌ DB init failed: {e}")
-        raise
+        print(f"⚠️  Course type backfill failed: {e}")
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if warmup_task is not None:
+        warmup_task.cancel()
+    if embedded_worker is not None:
+        await embedded_worker.stop()
+    await get_status_broadcaster().stop()
+    shutdown_executor()
+    processor = llm_processor.reset()
+    if processor is not None:
+        await processor.aclose()
+    # Only if something loaded it (the database connection or an authenticated request)
+    firebase_config = sys.modules.get("backend.firebase_config")
+    if firebase_config is not None:
+        await firebase_config.shutdown_token_verifier()
+    firebase_app.reset()
+    database.reset()
+    await shutdown_db()
 
 
 @app.post("/api/test-upload")
@@ -89,12 +206,16 @@ async def upload_whitepaper(
             detail=f"Only PDF files are supported (received {file.content_type})"
         )
 
-    # Read file content once
-    file_content = await file.read()
-    if len(file_content) == 0:
+    # Hash + store the PDF as it streams in; Firestore only keeps the reference
+    try:
+        with time_stage("upload"):
+            blob_key, size = await get_blob_store().put_stream(file)
+    except Exception as e:
+        print(f"❌ Blob store save error: {e}")
+        raise HTTPException(status_code=500, detail="Failed to store uploaded file")
+    if size == 0:
         raise HTTPException(status_code=400, detail="Empty file uploaded")
 
-    # Store raw PDF in Firestore
     upload_doc = {
         "id": upload_id,
         "user_id": user_id,
@@ -103,208 +224,256 @@ async def upload_whitepaper(
         "type": "pdf",
         "uploaded_at": asyncio.get_event_loop().time(),
         "status": "uploaded",
-        "file_content": file_content
+        "blob_key": blob_key,
+        "size": size,
     }
 
+    db = await get_db()
     try:
-        # Save metadata + file to Firestore
+        # Save metadata to Firestore
         await db.courses.insert_one(upload_doc)
     except Exception as e:
         print(f"❌ Firestore save error: {e}")
         raise HTTPException(status_code=500, detail="Failed to store upload metadata")
 
     # Set initial processing status
-    processing_status[upload_id] = ProcessingStatus(
+    await get_status_store().set(ProcessingStatus(
         id=upload_id,
         status="uploaded",
         progress=0,
         message="File uploaded. Ready to design course.",
-    )
+    ))
 
     return {"id": upload_id, "status": "uploaded", "message": "Upload successful!"}
 
 
 @app.post("/api/design-course/{upload_id}")
-async def design_course(upload_id: str):
-    """Start designing the course from uploaded PDF"""
+async def design_course(upload_id: str, force: bool = False):
+    """Start designing the course from uploaded PDF (force=true skips duplicate reuse)"""
+    from backend.pipeline import JOB_PRIORITY_COURSE, JOB_PROCESS_PDF
+
     # Fetch upload record
+    db = await get_db()
     upload_record = await db.courses.find_one({"id": upload_id})
     if not upload_record or upload_record.get("type") != "pdf":
         raise HTTPException(status_code=404, detail="Uploaded PDF not found")
 
-    # Update status
-    processing_status[upload_id] = ProcessingStatus(
-        id=upload_id, status="processing", progress=10, message="Starting AI analysis..."
-    )
+    # Same PDF already turned into a course? Reuse it instead of calling the LLM again
+    if not force and upload_record.get("blob_key"):
+        course_id = await reuse_existing_course(db, upload_record["blob_key"], upload_record["user_id"])
+        if course_id:
+            await get_status_store().set(ProcessingStatus(
+                id=upload_id,
+                status="completed",
+                progress=100,
+                message=f"Course created! ID: {course_id}",
+                course_id=course_id,
+            ))
+            return {"id": upload_id, "status": "completed", "course_id": course_id, "reused": True}
 
-    # Offload processing
-    asyncio.create_task(process_pdf_background(upload_id))
+    # Queue the job; the upload id doubles as the job id so repeat clicks don't duplicate work
+    queued = await get_job_queue().enqueue(
+        JOB_PROCESS_PDF, {"upload_id": upload_id, "force": force}, job_id=upload_id, priority=JOB_PRIORITY_COURSE
+    )
+    if queued:
+        await get_status_store().set(ProcessingStatus(
+            id=upload_id, status="processing", progress=10, message="Queued for AI analysis..."
+        ))
 
     return {"id": upload_id, "status": "processing"}
 
 
-async def process_pdf_background(upload_id: str):
-    """Background task: Extract text → Generate course → Save modules & quiz placeholders"""
-    try:
-        print(f"🧠 Starting background processing for {upload_id}")
-
-        # Get upload doc
-        upload_doc = await db.courses.find_one({"id": upload_id})
-        if not upload_doc:
-            raise ValueError("Upload not found")
-
-        # Get file content from Firestore
-        file_content = upload_doc.get("file_content")
-        if not file_content:
-            raise ValueError("File content not found in database")
-
-        # Create a file-like object from the stored bytes
-        file_io = io.BytesIO(file_content)
-        
-        # Create a proper UploadFile object
-        from fastapi import UploadFile as FastAPIUploadFile
-        
-        # ✅ FIXED: Removed 'content_type' parameter to avoid error
-        mock_file = FastAPIUploadFile(
-            file=file_io,
-            filename=upload_doc["filename"]
-            # Omit 'content_type' to prevent: "got unexpected keyword argument"
-        )
+async def reuse_existing_course(db, blob_key: str, user_id: str) -> Optional[str]:
+    """Look up a course generated from the same PDF; link it for the same user, clone it otherwise"""
+    entry = await db.course_index.find_one({"id": blob_key})
+    if not entry:
+        return None
 
-        # Extract REAL text from the PDF
-        processing_status[upload_id].message = "Extracting text from PDF..."
-        processing_status[upload_id].progress = 20
-        print("📄 Extracting text from PDF...")
+    course = await db.courses.find_one({"id": entry["course_id"]})
+    if not course:
+        return None  # Stale index entry, regenerate
 
-        extracted_text = await processor.extract_pdf_content(mock_file)
-        
-        # Validate extracted text
-        if not extracted_text or len(extracted_text.strip()) < 100:
-            error_msg = "Extracted text is too short. The PDF may be image-based or corrupted."
-            print(f"❌ {error_msg}")
-            raise ValueError(error_msg)
+    if course.get("user_id") == user_id:
+        return course["id"]
 
-        print(f"✅ Successfully extracted {len(extracted_text)} characters from PDF")
+    return await db.clone_course(course, user_id)
 
-        processing_status[upload_id].progress = 30
-        processing_status[upload_id].message = "Analyzing document structure..."
 
-        # Use Azure AI to generate full course
-        course_data = await processor.process_document(extracted_text, title=upload_doc["title"])
+@app.get("/api/processing/{upload_id}")
+async def get_processing_status(upload_id: str):
+    """Get real-time status of course generation"""
+    status = await get_status_store().get(upload_id)
+    if not status:
+        raise HTTPException(status_code=404, detail="Processing ID not found")
+    return status
 
-        # Assign new ID for course
-        course_id = str(uuid.uuid4())
 
-        # Prepare modules
-        module_docs = []
-        module_ids = []
+@app.get("/api/processing/{upload_id}/events")
+async def stream_processing_status(
+    upload_id: str,
+    last_event_id: Optional[int] = None,
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+):
+    """Server-Sent Events stream of status changes; resumes after Last-Event-ID"""
+    if last_event_id is None and last_event_id_header and last_event_id_header.isdigit():
+        last_event_id = int(last_event_id_header)
+    if last_event_id is None and await get_status_store().get(upload_id) is None:
+        raise HTTPException(status_code=404, detail="Processing ID not found")
 
-        for raw_module in course_data.get("modules", []):
-            mod_id = raw_module["id"]
-            module_ids.append(mod_id)
+    async def event_source():
+        events = get_status_broadcaster().subscribe(upload_id, last_event_id).__aiter__()
+        next_event = asyncio.ensure_future(events.__anext__())
+        try:
+            while True:
+                done, _ = await asyncio.wait({next_event}, timeout=SSE_PING_SECONDS)
+                if not done:
+                    yield ": ping\n\n"
+                    continue
+                try:
+                    seq, status = next_event.result()
+                except StopAsyncIteration:
+                    return
+                yield f"id: {seq}\nevent: status\ndata: {status.model_dump_json()}\n\n"
+                next_event = asyncio.ensure_future(events.__anext__())
+        finally:
+            next_event.cancel()
+            await events.aclose()
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-            full_module = Module(
-                id=mod_id,
-                course_id=course_id,
-                title=raw_module["title"],
-                content=raw_module["content"],
-                source_text=raw_module["source_text"],
-                estimatedTime=raw_module["estimatedTime"],
-                flashcards=[],
-                quiz={
-                    "id": str(uuid.uuid4()),
-                    "questions": [],
-                    "attempts": 0,
-                    "generated_at": asyncio.get_event_loop().time(),
-                },
-                completed=False,
-                timeSpent=0,
-            ).model_dump()
-
-            module_docs.append(full_module)
-
-        # Save all modules
-        for mod in module_docs:
-            await db.modules.insert_one(mod)
-
-        # Create final course document
-        final_course = Course(
-            id=course_id,
-            user_id="demo_user",
-            title=course_data["title"],
-            description=course_data["description"],
-            objectives=course_data["objectives"],
-            modules=module_ids,
-            estimatedTime=course_data["estimatedTime"],
-            difficulty=course_data["difficulty"],
-            createdAt=course_data["createdAt"],
-            progress=0,
-        ).model_dump()
-
-        # Save course
-        await db.courses.insert_one(final_course)
-
-        # Update status to completed
-        processing_status[upload_id].status = "completed"
-        processing_status[upload_id].progress = 100
-        processing_status[upload_id].message = f"Course created! ID: {course_id}"
-        processing_status[upload_id].course_id = course_id
-
-        print(f"✅ Course generation complete: {course_id}")
 
+@app.websocket("/api/processing/{upload_id}/ws")
+async def processing_status_websocket(websocket: WebSocket, upload_id: str, last_event_id: Optional[int] = None):
+    """WebSocket variant of the status stream: sends {"id": event_id, "status": {...}} messages"""
+    await websocket.accept()
+
+    async def send_events():
+        async for seq, status in get_status_broadcaster().subscribe(upload_id, last_event_id):
+            await websocket.send_json({"id": seq, "status": status.model_dump()})
+        await websocket.close()
+
+    async def wait_for_disconnect():
+        # Client messages are ignored; only the disconnect matters
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+
+    # Race the two so a client that goes away is noticed at once, not at the next status send
+    sender = asyncio.ensure_future(send_events())
+    watcher = asyncio.ensure_future(wait_for_disconnect())
+    try:
+        done, _ = await asyncio.wait({sender, watcher}, return_when=asyncio.FIRST_COMPLETED)
+        if sender in done:
+            sender.result()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sender.cancel()
+        watcher.cancel()
+        await asyncio.gather(sender, watcher, return_exceptions=True)
+
+
+# LLM scheduler state, read from the rate limiter when /metrics is scraped
+CallbackMetric(
+    "whitepaper_llm_in_flight", "LLM calls currently in flight", "gauge", [],
+    lambda: {(): get_rate_limiter().in_flight},
+)
+CallbackMetric(
+    "whitepaper_llm_queued", "LLM calls waiting for a slot, by priority class", "gauge", ["priority"],
+    lambda: {(priority,): depth for priority, depth in get_rate_limiter().queue_depth().items()},
+)
+CallbackMetric(
+    "whitepaper_llm_concurrency_limit", "Adaptive LLM concurrency limit", "gauge", [],
+    lambda: {(): get_rate_limiter().concurrency_limit},
+)
+
+
+@app.get("/healthz")
+async def get_health():
+    """Liveness: the process is up and serving"""
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+async def get_readiness():
+    """Readiness and per-resource initialization state; 503 while one is starting or has failed"""
+    report = readiness()
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus text-format metrics for this process"""
+    try:
+        counts = await get_job_queue().counts()
+        JOB_QUEUE_JOBS.clear()
+        for status, count in counts.items():
+            JOB_QUEUE_JOBS.labels(status).set(count)
     except Exception as e:
-        print(f"💥 Error in background processing: {e}")
-        import traceback
-        traceback.print_exc()
-        
-        error_msg = str(e)
-        if "image-based" in error_msg or "scanned" in error_msg:
-            user_msg = "PDF appears to be image-based. Text extraction failed."
-        elif "Empty" in error_msg:
-            user_msg = "Uploaded PDF is empty or corrupted."
-        else:
-            user_msg = f"Processing failed: {str(e)}"
-        
-        processing_status[upload_id].status = "failed"
-        processing_status[upload_id].progress = 0
-        processing_status[upload_id].message = user_msg
-        print(f"❌ Processing failed: {user_msg}")
+        print(f"⚠️  Job queue counts unavailable for metrics: {e}")
+    return PlainTextResponse(render_metrics(), media_type=METRICS_CONTENT_TYPE)
 
 
-@app.get("/api/processing/{upload_id}")
-async def get_processing_status(upload_id: str):
-    """Get real-time status of course generation"""
-    status = processing_status.get(upload_id)
-    if not status:
-        raise HTTPException(status_code=404, detail="Processing ID not found")
-    return status
+@app.get("/api/llm/status")
+async def get_llm_status():
+    """Current LLM queue depth, in-flight calls, adaptive concurrency limit and per-site token usage"""
+    return {**get_rate_limiter().stats(), "token_usage": get_token_usage().stats()}
 
 
 @app.get("/api/courses/{course_id}")
 async def get_course(course_id: str):
     """Retrieve full course with expanded modules"""
+    db = await get_db()
+    cached = db.course_views.get(course_id)
+    if cached is not None:
+        return cached
+
     course = await db.courses.find_one({"id": course_id, "user_id": "demo_user"})
     if not course:
         raise HTTPException(status_code=404, detail="Course not found")
 
-    # Expand modules
-    expanded_modules = []
-    for mod_id in course.get("modules", []):
-        module = await db.modules.find_one({"id": mod_id})
-        if module:
-            module.setdefault("flashcards", [])
-            module.setdefault("quiz", {"questions": []})
-            expanded_modules.append(module)
+    # Expand modules in one batched read instead of one query per module
+    expanded_modules = await db.modules.find_many_by_ids(course.get("modules", []))
+    for module in expanded_modules:
+        module.setdefault("flashcards", [])
+        module.setdefault("quiz", {"questions": []})
 
     course["modules"] = expanded_modules
+    db.course_views.set(course_id, course)
     return course
 
 
-@app.get("/api/courses")
-async def get_user_courses():
-    """List all courses for demo user"""
-    courses = await db.courses.find({"user_id": "demo_user"}).to_list(100)
-    return [c for c in courses if "objectives" in c]
+@app.get("/api/courses", response_model=Union[CourseListPage, List[CourseSummary]])
+async def get_user_courses(limit: Optional[int] = Query(None, ge=1, le=100), cursor: Optional[str] = None):
+    """
+    List course summaries for demo user, one page at a time: {courses, next_cursor}.
+    Requests with neither limit nor cursor (frontend builds from before
+    pagination) get the plain list of every summary.
+    """
+    if cursor is not None and not is_valid_document_id(cursor):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    db = await get_db()
+    query = {"user_id": "demo_user", "type": "course"}
+    if limit is None and cursor is None:
+        courses, next_cursor = [], None
+        while True:
+            page, next_cursor = await db.courses.find_page(
+                query, fields=COURSE_SUMMARY_FIELDS, limit=COURSE_LIST_PAGE_SIZE, start_after=next_cursor
+            )
+            courses.extend(page)
+            if next_cursor is None:
+                return [CourseSummary(**course) for course in courses]
+
+    courses, next_cursor = await db.courses.find_page(
+        query,
+        fields=COURSE_SUMMARY_FIELDS,
+        limit=limit or COURSE_LIST_PAGE_SIZE,
+        start_after=cursor,
+    )
+    return CourseListPage(courses=courses, next_cursor=next_cursor)
 
 
 # -----------------------------
@@ -312,18 +481,63 @@ async def get_user_courses():
 # -----------------------------
 
 
+@app.post("/api/courses/{course_id}/generate-study-materials")
+async def generate_study_materials(course_id: str, force: bool = False):
+    """
+    Generate quizzes and flashcards for every module of a course. Streams one
+    NDJSON line per module as it finishes; modules that already have both are
+    returned as-is unless force=true. The last line summarizes the run.
+    """
+    from backend.study_materials import has_study_materials, iter_study_materials
+
+    db = await get_db()
+    course = await db.courses.find_one({"id": course_id, "user_id": "demo_user"})
+    if not course:
+        raise HTTPException(status_code=404, detail="Course not found")
+
+    modules = await db.modules.find_many_by_ids(course.get("modules", []))
+    existing = [] if force else [m for m in modules if has_study_materials(m)]
+    existing_ids = {m["id"] for m in existing}
+    todo = [m for m in modules if m["id"] not in existing_ids]
+    processor = await get_processor() if todo else None
+
+    async def results():
+        for module in existing:
+            yield json.dumps({"module_id": module["id"], "quiz": module["quiz"], "flashcards": module["flashcards"], "cached": True}) + "\n"
+        generated = failed = 0
+        async for result in iter_study_materials(db, processor, course, todo, refresh=force):
+            if "error" in result:
+                failed += 1
+            else:
+                generated += 1
+            yield json.dumps(result) + "\n"
+        yield json.dumps({"done": True, "generated": generated, "failed": failed, "cached": len(existing)}) + "\n"
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+
 @app.post("/api/courses/{course_id}/modules/{module_id}/generate-quiz")
-async def generate_quiz(course_id: str, module_id: str):
+async def generate_quiz(course_id: str, module_id: str, force: bool = False):
+    db = await get_db()
     module = await db.modules.find_one({"id": module_id})
     if not module:
         raise HTTPException(status_code=404, detail="Module not found")
 
+    from backend.study_materials import has_quiz, is_fallback, module_source_passages
+
+    # Usually already prefetched in the background after course creation
+    if not force and has_quiz(module):
+        return module["quiz"]
+
+    processor = await get_processor()
     try:
-        quiz = await processor.generate_module_quiz(
-            module["title"], module["content"], module.get("source_text", "")
-        )
+        course = await db.courses.find_one({"id": module["course_id"]})
+        source_text = await module_source_passages(db, module, (course or {}).get("retrieval_index"))
+        quiz = await processor.generate_module_quiz(module["title"], module["content"], source_text, refresh=force)
 
-        await db.update_quiz(module_id, quiz)
+        # A placeholder from a failed LLM call is shown but not saved, so the next request retries
+        if not is_fallback(quiz):
+            await db.update_quiz(module_id, quiz)
         return quiz
     except Exception as e:
         print(f"❌ Quiz generation failed: {e}")
@@ -331,17 +545,25 @@ async def generate_quiz(course_id: str, module_id: str):
 
 
 @app.post("/api/courses/{course_id}/modules/{module_id}/generate-flashcards")
-async def generate_flashcards(course_id: str, module_id: str):
+async def generate_flashcards(course_id: str, module_id: str, force: bool = False):
+    db = await get_db()
     module = await db.modules.find_one({"id": module_id})
     if not module:
         raise HTTPException(status_code=404, detail="Module not found")
 
+    from backend.study_materials import has_flashcards, is_fallback, module_source_passages
+
+    if not force and has_flashcards(module):
+        return {"flashcards": module["flashcards"]}
+
+    processor = await get_processor()
     try:
-        flashcards = await processor.generate_module_flashcards(
-            module["title"], module["content"], module.get("source_text", "")
-        )
+        course = await db.courses.find_one({"id": module["course_id"]})
+        source_text = await module_source_passages(db, module, (course or {}).get("retrieval_index"))
+        flashcards = await processor.generate_module_flashcards(module["title"], module["content"], source_text, refresh=force)
 
-        await db.update_flashcards(module_id, flashcards)
+        if not is_fallback(flashcards):
+            await db.update_flashcards(module_id, flashcards)
         return {"flashcards": flashcards}
     except Exception as e:
         print(f"❌ Flashcard generation failed: {e}")
@@ -350,6 +572,7 @@ async def generate_flashcards(course_id: str, module_id: str):
 
 @app.post("/api/courses/{course_id}/modules/{module_id}/quiz")
 async def submit_quiz(course_id: str, module_id: str, payload: dict):
+    db = await get_db()
     module = await db.modules.find_one({"id": module_id})
     if not module or "quiz" not in module:
         raise HTTPException(status_code=404, detail="Quiz not found")
@@ -382,6 +605,7 @@ async def export_course(course_id: str, format: str):
     if format not in ["pdf", "pptx", "notion"]:
         raise HTTPException(status_code=400, detail="Unsupported format")
 
+    db = await get_db()
     course = await db.courses.find_one({"id": course_id, "user_id": "demo_user"})
     if not course:
         raise HTTPException(status_code=404, detail="Course not found")
@@ -393,14 +617,9 @@ async def export_course(course_id: str, format: str):
 # Frontend Routing
 # -----------------------
 
-app.mount("/", StaticFiles(directory="./dist", html=True), name="frontend")
-
-
-@app.get("/{full_path:path}")
-async def serve_spa(full_path: str):
-    if full_path.startswith("api/"):
-        raise HTTPException(status_code=404, detail="API route not found")
-    return FileResponse(os.path.join("./dist", "index.html"))
+# Precompressed variants, immutable caching of hashed assets, ETag/304, index.html for client routes
+frontend = FrontendStaticFiles(directory=STATIC_DIR)
+app.mount("/", frontend, name="frontend")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,240 @@
+# backend/metrics.py
+"""
+In-process metrics rendered in the Prometheus text exposition format
+(GET /metrics). Recording is a dict lookup plus an add, so instrumented
+code paths pay next to nothing; values that other components already keep
+(LLM cache counters, rate limiter state) are read only when scraped.
+
+Every process keeps its own values: /metrics on the API covers the API
+process and its embedded worker, not separate `backend.worker` processes.
+"""
+import bisect
+import math
+import time
+from typing import Callable, Dict, List, Sequence, Tuple
+
+# Pipeline stages range from milliseconds (clean, JSON parse) to minutes (LLM calls)
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+LabelValues = Tuple[str, ...]
+
+_registry: List["_Metric"] = []
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[LabelValues, object] = {}
+        _registry.append(self)
+
+    def labels(self, *values: str):
+        """Child for one combination of label values; bind it once on hot paths"""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            child = self._children.setdefault(tuple(str(v) for v in values), self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        header = f"# HELP {self.name} {self.documentation}\n# TYPE {self.name} {self.kind}\n"
+        return header + "".join(line + "\n" for line in self._samples())
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def dec(self, amount: float = 1):
+        self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+    def _samples(self) -> List[str]:
+        return [
+            f"{self.name}{_label_text(self.labelnames, values)} {_format_value(child.value)}"
+            for values, child in list(self._children.items())
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+    def clear(self):
+        """Drop every child, e.g. before re-setting a gauge whose label sets come and go"""
+        self._children.clear()
+
+
+class _HistogramValue:
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    def time(self) -> "_Timer":
+        return _Timer(self)
+
+
+class _Timer:
+    """Context manager that observes the elapsed wall time; works around awaits too"""
+    __slots__ = ("_target", "_start")
+
+    def __init__(self, target: _HistogramValue):
+        self._target = target
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._target.observe(time.perf_counter() - self._start)
+        return False
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.bounds = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramValue(self.bounds)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def time(self) -> _Timer:
+        return self.labels().time()
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for values, child in list(self._children.items()):
+            cumulative = 0
+            for bound, count in zip(self.bounds + (math.inf,), child.counts):
+                cumulative += count
+                labels = _label_text(self.labelnames + ("le",), values + (_format_value(bound),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _label_text(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class CallbackMetric(_Metric):
+    """Counter or gauge whose samples are read from `collect` at scrape time"""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        kind: str,
+        labelnames: Sequence[str],
+        collect: Callable[[], Dict[LabelValues, float]],
+    ):
+        self.kind = kind
+        self.collect = collect
+        super().__init__(name, documentation, labelnames)
+
+    def _samples(self) -> List[str]:
+        return [
+            f"{self.name}{_label_text(self.labelnames, values)} {_format_value(value)}"
+            for values, value in self.collect().items()
+        ]
+
+
+def render() -> str:
+    """All registered metrics in the Prometheus text format"""
+    parts = []
+    for metric in _registry:
+        try:
+            parts.append(metric.render())
+        except Exception as e:
+            # A broken collector must not take the whole scrape down
+            print(f"⚠️  Metric {metric.name} failed to render: {e}")
+    return "".join(parts)
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# -----------------------------
+# Pipeline metrics
+# -----------------------------
+
+STAGE_SECONDS = Histogram(
+    "whitepaper_stage_duration_seconds",
+    "Time spent per pipeline stage (upload, extract, clean, llm_call, json_parse, db_write, ...)",
+    ["stage"],
+)
+JOB_SECONDS = Histogram("whitepaper_job_duration_seconds", "Job run time by kind", ["kind"])
+JOBS_FINISHED = Counter("whitepaper_jobs_total", "Finished job attempts by kind and outcome", ["kind", "outcome"])
+JOBS_IN_FLIGHT = Gauge("whitepaper_jobs_in_flight", "Jobs currently running in this process", ["kind"])
+JOB_QUEUE_JOBS = Gauge("whitepaper_job_queue_jobs", "Jobs in the durable queue by status", ["status"])
+
+LLM_TOKENS = Counter("whitepaper_llm_tokens_total", "LLM tokens by call site and kind (prompt, completion)", ["site", "kind"])
+LLM_REQUESTS = Counter("whitepaper_llm_requests_total", "LLM calls by call site and outcome", ["site", "outcome"])
+LLM_RETRIES = Counter("whitepaper_llm_retries_total", "LLM attempts that were retried, by call site and reason", ["site", "reason"])
+LLM_RATE_LIMITED = Counter("whitepaper_llm_rate_limited_total", "Rate-limit responses from the LLM endpoint", ["status"])
+
+CACHE_LOOKUPS = Counter("whitepaper_cache_lookups_total", "Cache lookups by cache and result (hit, miss)", ["cache", "result"])
+
+
+def time_stage(stage: str) -> _Timer:
+    return STAGE_SECONDS.labels(stage).time()
+
+
+def record_cache_lookup(cache: str, hit: bool):
+    CACHE_LOOKUPS.labels(cache, "hit" if hit else "miss").inc()
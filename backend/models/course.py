@@ -1,6 +1,6 @@
 # backend/models/course.py
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 import uuid
 
 class Flashcard(BaseModel):
@@ -33,8 +33,10 @@ class Module(BaseModel):
     title: str
     content: str
     course_id: str
-    flashcards: Optional[Flashcard] = None  # Optional with default
-    quiz: Optional[Quiz] = None     # Optional with default
+    source_text: str = ""  # Legacy copy of the source; newer modules use source_ranges
+    source_ranges: List[List[int]] = []  # [start, end) offsets into the course's source document
+    flashcards: List[Dict[str, Any]] = []  # Generated on demand
+    quiz: Optional[Dict[str, Any]] = None     # Placeholder until generated
     completed: bool = False
     timeSpent: int = 0
     estimatedTime: int = 0
@@ -42,6 +44,7 @@ class Module(BaseModel):
 class Course(BaseModel):
     id: str
     user_id: str
+    type: str = "course"  # Discriminator: upload records in the same collection are "pdf"
     title: str
     description: str
     objectives: List[str]
@@ -51,12 +54,31 @@ class Course(BaseModel):
     difficulty: str
     createdAt: str  # ISO 8601 string
     updatedAt: Optional[str] = None
+    retrieval_index: Optional[str] = None  # Blob key of the BM25 index over the source text
+
+class CourseSummary(BaseModel):
+    id: str
+    title: str
+    description: str = ""
+    modules: List[str] = []
+    progress: float = 0.0
+    estimatedTime: int = 0
+    difficulty: str = ""
+    createdAt: Optional[str] = None
+
+class CourseListPage(BaseModel):
+    courses: List[CourseSummary]
+    next_cursor: Optional[str] = None  # Pass back as ?cursor= for the next page
 
 class ProcessingStatus(BaseModel):
     id: str
     status: str  # 'processing', 'completed', 'failed'
     progress: int  # 0-100
     message: Optional[str] = None
+    course_id: Optional[str] = None
+    # Streaming preview while the course is written: {"title", "modules": [{"title", "content", "complete"}]};
+    # content is only set on the last module, cut to its tail
+    preview: Optional[Dict[str, Any]] = None
 
 class UserProgress(BaseModel):
     user_id: str
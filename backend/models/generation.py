@@ -0,0 +1,58 @@
+# backend/models/generation.py
+"""Shapes the LLM is asked to produce; used to validate (and normalize) its JSON output."""
+from pydantic import AliasChoices, BaseModel, ConfigDict, Field
+from typing import Any, List
+
+class SectionOutline(BaseModel):
+    model_config = ConfigDict(extra="allow")
+    topics: List[str] = []
+    key_points: List[str] = []
+    summary: str
+
+class ModuleDraft(BaseModel):
+    model_config = ConfigDict(extra="allow")
+    title: str
+    content: str
+    estimatedTime: int = 900
+    sections: List[int] = []
+
+class CourseDraft(BaseModel):
+    model_config = ConfigDict(extra="allow")
+    title: str
+    description: str = ""
+    difficulty: str = "Intermediate"
+    objectives: List[str] = []
+    modules: List[ModuleDraft] = Field(min_length=1)
+
+class QuestionDraft(BaseModel):
+    type: str = "multiple-choice"
+    question: str
+    options: List[str] = Field(min_length=2)
+    correctAnswer: str = Field(validation_alias=AliasChoices("correctAnswer", "correct_answer", "answer"))
+    explanation: str = ""
+
+class QuizDraft(BaseModel):
+    questions: List[QuestionDraft] = Field(min_length=1)
+
+class FlashcardDraft(BaseModel):
+    question: str = Field(validation_alias=AliasChoices("question", "front"))
+    answer: str = Field(validation_alias=AliasChoices("answer", "back"))
+
+
+def outline_schema(value: Any) -> dict:
+    return SectionOutline.model_validate(value).model_dump()
+
+def course_schema(value: Any) -> dict:
+    return CourseDraft.model_validate(value).model_dump()
+
+def quiz_schema(value: Any) -> dict:
+    if isinstance(value, list):
+        value = {"questions": value}  # Bare list of questions
+    return QuizDraft.model_validate(value).model_dump()
+
+def flashcards_schema(value: Any) -> List[dict]:
+    if isinstance(value, dict):
+        value = value.get("flashcards", value.get("cards"))  # {"flashcards": [...]} wrapper
+    if not isinstance(value, list) or not value:
+        raise ValueError("Expected a non-empty JSON array of flashcards")
+    return [FlashcardDraft.model_validate(card).model_dump() for card in value]
@@ -0,0 +1,134 @@
+# backend/pdf_extractor.py
+import asyncio
+import io
+import mmap
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, AsyncIterator, Callable, Iterator, List, Optional, Union
+
+if TYPE_CHECKING:
+    import PyPDF2
+
+# Concurrency cap for PDF parsing across the whole API process
+PDF_EXTRACT_MAX_WORKERS = int(os.getenv("PDF_EXTRACT_MAX_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Pages handed to a worker in one go (larger = less IPC, coarser progress)
+PDF_EXTRACT_CHUNK_PAGES = int(os.getenv("PDF_EXTRACT_CHUNK_PAGES", "16"))
+
+ProgressCallback = Callable[[int, int], None]
+# Raw PDF bytes, or a path to a PDF on local disk (read zero-copy via mmap)
+PdfSource = Union[bytes, str]
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def get_executor() -> ProcessPoolExecutor:
+    """Lazily create the shared process pool used for page extraction"""
+    global _executor
+    if _executor is None:
+        # Spawned, not forked: by now the process runs gRPC/Firestore and thread-pool threads,
+        # and a child forked from a multithreaded process can deadlock on a lock held at fork time
+        _executor = ProcessPoolExecutor(max_workers=PDF_EXTRACT_MAX_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _executor
+
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+# -----------------------------
+# Worker-side functions (run in child processes)
+# -----------------------------
+
+@contextmanager
+def _open_reader(source: PdfSource) -> Iterator["PyPDF2.PdfReader"]:
+    # Imported on first use, in the pool's worker processes; the API process never needs it
+    import PyPDF2
+
+    if isinstance(source, bytes):
+        yield PyPDF2.PdfReader(io.BytesIO(source))
+        return
+    # Only the path crosses the process boundary; each worker maps the file
+    with open(source, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            yield PyPDF2.PdfReader(mapped)
+        finally:
+            mapped.close()
+
+
+def _count_pages(source: PdfSource) -> int:
+    with _open_reader(source) as reader:
+        return len(reader.pages)
+
+
+def _extract_page_range(source: PdfSource, start: int, stop: int) -> List[str]:
+    with _open_reader(source) as reader:
+        return [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+
+# -----------------------------
+# Async API
+# -----------------------------
+
+async def iter_pdf_pages(
+    source: PdfSource,
+    on_progress: Optional[ProgressCallback] = None,
+    chunk_pages: int = PDF_EXTRACT_CHUNK_PAGES,
+) -> AsyncIterator[str]:
+    """
+    Yield the text of every page in order while chunks of pages are parsed
+    in parallel on the process pool. At most PDF_EXTRACT_MAX_WORKERS chunks
+    are in flight per document, so memory stays bounded on huge files.
+    """
+    loop = asyncio.get_running_loop()
+    executor = get_executor()
+
+    spilled = None
+    if isinstance(source, bytes):
+        # Inline (legacy) uploads go to a temporary file once, so each chunk ships a path, not the whole PDF
+        source = spilled = await asyncio.to_thread(_spill_to_file, source)
+
+    pending: List[asyncio.Future] = []
+    next_range = 0
+    pages_done = 0
+
+    def submit_next():
+        nonlocal next_range
+        start, stop = ranges[next_range]
+        pending.append(loop.run_in_executor(executor, _extract_page_range, source, start, stop))
+        next_range += 1
+
+    try:
+        total_pages = await loop.run_in_executor(executor, _count_pages, source)
+        ranges = [(s, min(s + chunk_pages, total_pages)) for s in range(0, total_pages, chunk_pages)]
+
+        while next_range < len(ranges) and len(pending) < PDF_EXTRACT_MAX_WORKERS:
+            submit_next()
+
+        while pending:
+            pages = await pending.pop(0)
+            if next_range < len(ranges):
+                submit_next()
+            for page_text in pages:
+                pages_done += 1
+                if on_progress:
+                    on_progress(pages_done, total_pages)
+                yield page_text
+    finally:
+        for fut in pending:
+            fut.cancel()
+        if spilled is not None:
+            os.unlink(spilled)
+
+
+def _spill_to_file(data: bytes) -> str:
+    fd, path = tempfile.mkstemp(prefix="pdf-extract-", suffix=".pdf")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    return path
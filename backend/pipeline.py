@@ -0,0 +1,252 @@
+# backend/pipeline.py
+import asyncio
+import traceback
+import uuid
+from typing import Any, Dict
+
+from backend.azure_processor import AzureWhitepaperProcessor
+from backend.blob_store import get_blob_store
+from backend.job_queue import PermanentJobError, get_job_queue, get_status_store
+from backend.models.course import Course, Module
+from backend.retrieval import store_retrieval_index
+from backend.study_materials import PREFETCH_STUDY_MATERIALS, prefetch_study_materials
+from backend.tracing import span
+from backend.worker import JobHandler
+
+JOB_PROCESS_PDF = "process_pdf"
+JOB_PREFETCH_STUDY_MATERIALS = "prefetch_study_materials"
+# Job queue priorities: lower runs first, so new courses are never stuck behind prefetches
+JOB_PRIORITY_COURSE = 0
+JOB_PRIORITY_PREFETCH = 1
+# Preview content kept in status events: the tail of the module being written, as much as the upload page shows
+STATUS_PREVIEW_TAIL_CHARS = 400
+
+
+def failure_message(error: Exception) -> str:
+    error_msg = str(error)
+    if "image-based" in error_msg or "scanned" in error_msg:
+        return "PDF appears to be image-based. Text extraction failed."
+    if "Empty" in error_msg:
+        return "Uploaded PDF is empty or corrupted."
+    return f"Processing failed: {error_msg}"
+
+
+async def process_pdf_background(
+    db, processor: AzureWhitepaperProcessor, upload_id: str, prefetch: bool = PREFETCH_STUDY_MATERIALS, refresh: bool = False
+) -> str:
+    """
+    Background task: Extract text → Generate course → Save modules & quiz placeholders (→ queue prefetch).
+    refresh=True (a forced redesign) regenerates the course instead of reusing a cached LLM reply.
+    """
+    status_store = get_status_store()
+    print(f"🧠 Starting background processing for {upload_id}")
+
+    # Get upload doc
+    with span("pipeline.load_upload", upload_id=upload_id):
+        upload_doc = await db.courses.find_one({"id": upload_id})
+    if not upload_doc:
+        raise PermanentJobError("Upload not found")
+
+    # Resolve the PDF: blob store reference, or inline bytes on legacy uploads
+    if upload_doc.get("blob_key"):
+        pdf_source = get_blob_store().local_path(upload_doc["blob_key"])
+    elif upload_doc.get("file_content"):
+        pdf_source = upload_doc["file_content"]
+    else:
+        raise PermanentJobError("File content not found in database")
+
+    # Extract REAL text from the PDF
+    await status_store.update(upload_id, status="processing", progress=20, message="Extracting text from PDF...")
+    print("📄 Extracting text from PDF...")
+
+    last_progress = 20
+
+    def report_page_progress(pages_done: int, total_pages: int):
+        nonlocal last_progress
+        # Extraction owns the 20-30% band of the overall progress bar
+        progress = 20 + (10 * pages_done) // max(total_pages, 1)
+        if progress != last_progress or pages_done == total_pages:
+            last_progress = progress
+            status_store.update_soon(
+                upload_id,
+                progress=progress,
+                message=f"Extracting text from PDF (page {pages_done}/{total_pages})...",
+            )
+
+    try:
+        with span("pipeline.extract", source="blob" if isinstance(pdf_source, str) else "inline") as extract_span:
+            extracted_text = await processor.extract_pdf_text(pdf_source, on_progress=report_page_progress)
+            extract_span.set(chars=len(extracted_text))
+    except ValueError as e:
+        # Unreadable PDFs will not get better on retry
+        raise PermanentJobError(str(e))
+
+    # Validate extracted text
+    if not extracted_text or len(extracted_text.strip()) < 100:
+        error_msg = "Extracted text is too short. The PDF may be image-based or corrupted."
+        print(f"❌ {error_msg}")
+        raise PermanentJobError(error_msg)
+
+    print(f"✅ Successfully extracted {len(extracted_text)} characters from PDF")
+
+    await status_store.update(upload_id, progress=30, message="Analyzing document structure...")
+
+    def publish_preview(preview: Dict[str, Any]):
+        modules = preview.get("modules", [])
+        if modules:
+            message = f"Writing {modules[-1]['title']}..."
+            # Every write is appended to status_events: keep titles, and only the tail of the last module's text
+            modules = [{**module, "content": ""} for module in modules[:-1]] + [
+                {**modules[-1], "content": modules[-1]["content"][-STATUS_PREVIEW_TAIL_CHARS:]}
+            ]
+            preview = {**preview, "modules": modules}
+        else:
+            message = "Designing course outline..."
+        status_store.update_soon(upload_id, progress=max(40, min(90, 40 + 10 * len(modules))), message=message, preview=preview)
+
+    async def build_index() -> str:
+        with span("pipeline.index", chars=len(extracted_text)):
+            return await store_retrieval_index(extracted_text)
+
+    # Index the source for quiz/flashcard retrieval while the course is being written
+    index_task = asyncio.create_task(build_index())
+
+    # Use Azure AI to generate full course, streaming a preview to status subscribers
+    try:
+        with span("pipeline.generate_course") as generate_span:
+            course_data = await processor.process_document(
+                extracted_text, title=upload_doc["title"], on_preview=publish_preview, refresh=refresh
+            )
+            generate_span.set(modules=len(course_data.get("modules", [])))
+    except BaseException:
+        index_task.cancel()
+        raise
+
+    try:
+        retrieval_index = await index_task
+    except Exception as e:
+        # Prompts fall back to the module's own source span
+        print(f"⚠️  Retrieval index build failed: {e}")
+        retrieval_index = None
+
+    # Assign new ID for course
+    course_id = str(uuid.uuid4())
+
+    # Prepare modules
+    module_docs = []
+    module_ids = []
+
+    for raw_module in course_data.get("modules", []):
+        mod_id = raw_module["id"]
+        module_ids.append(mod_id)
+
+        full_module = Module(
+            id=mod_id,
+            course_id=course_id,
+            title=raw_module["title"],
+            content=raw_module["content"],
+            source_ranges=raw_module["source_ranges"],
+            estimatedTime=raw_module["estimatedTime"],
+            flashcards=[],
+            quiz={
+                "id": str(uuid.uuid4()),
+                "questions": [],
+                "attempts": 0,
+                "generated_at": asyncio.get_event_loop().time(),
+            },
+            completed=False,
+            timeSpent=0,
+        ).model_dump()
+
+        module_docs.append(full_module)
+
+    # Create final course document
+    final_course = Course(
+        id=course_id,
+        user_id="demo_user",
+        title=course_data["title"],
+        description=course_data["description"],
+        objectives=course_data["objectives"],
+        modules=module_ids,
+        estimatedTime=course_data["estimatedTime"],
+        difficulty=course_data["difficulty"],
+        createdAt=course_data["createdAt"],
+        progress=0,
+        retrieval_index=retrieval_index,
+    ).model_dump()
+
+    # Save source text, modules, course and the PDF -> course index entry in one atomic batch,
+    # so a crash cannot leave orphan modules behind
+    index_entry = None
+    if course_data.get("fallback"):
+        print("⚠️  Course generation fell back to a placeholder; not indexing it for reuse")
+    elif upload_doc.get("blob_key"):
+        index_entry = {"id": upload_doc["blob_key"], "course_id": course_id}
+    with span("pipeline.save_course", course_id=course_id, modules=len(module_docs)):
+        await db.save_course(final_course, module_docs, index_entry, source_text=course_data["source_text"])
+
+    # Update status to completed
+    await status_store.update(
+        upload_id,
+        status="completed",
+        progress=100,
+        message=f"Course created! ID: {course_id}",
+        course_id=course_id,
+        preview=None,
+    )
+
+    print(f"✅ Course generation complete: {course_id}")
+
+    if prefetch:
+        try:
+            await get_job_queue().enqueue(
+                JOB_PREFETCH_STUDY_MATERIALS,
+                {"course_id": course_id},
+                job_id=f"prefetch:{course_id}",
+                max_attempts=1,
+                priority=JOB_PRIORITY_PREFETCH,
+            )
+        except Exception as e:
+            # Prefetch is an optimisation; the course itself is done
+            print(f"⚠️  Could not schedule study material prefetch: {e}")
+    return course_id
+
+
+def build_job_handlers(
+    db, processor: AzureWhitepaperProcessor, prefetch: bool = PREFETCH_STUDY_MATERIALS
+) -> Dict[str, JobHandler]:
+    """
+    Job kinds the workers know how to run. prefetch=False leaves study
+    material prefetch out: new courses don't queue it and it isn't run.
+    """
+
+    async def handle_process_pdf(job: Dict[str, Any]):
+        upload_id = job["payload"]["upload_id"]
+        try:
+            await process_pdf_background(db, processor, upload_id, prefetch, job["payload"].get("force", False))
+        except Exception as e:
+            print(f"💥 Error in background processing: {e}")
+            traceback.print_exc()
+
+            final = isinstance(e, PermanentJobError) or job["attempts"] >= job["max_attempts"]
+            if final:
+                user_msg = failure_message(e)
+                await get_status_store().update(upload_id, status="failed", progress=0, message=user_msg)
+                print(f"❌ Processing failed: {user_msg}")
+            else:
+                await get_status_store().update(
+                    upload_id,
+                    status="processing",
+                    message=f"Attempt {job['attempts']} failed, retrying shortly...",
+                )
+            raise
+
+    async def handle_prefetch_study_materials(job: Dict[str, Any]):
+        course_id = job["payload"]["course_id"]
+        prefetched = await prefetch_study_materials(db, processor, course_id)
+        print(f"📚 Prefetched study materials for {prefetched} modules of {course_id}")
+
+    handlers = {JOB_PROCESS_PDF: handle_process_pdf}
+    if prefetch:
+        handlers[JOB_PREFETCH_STUDY_MATERIALS] = handle_prefetch_study_materials
+    return handlers
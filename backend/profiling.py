@@ -0,0 +1,141 @@
+# backend/profiling.py
+"""
+Opt-in sampling profiler for single API requests. With PROFILE_TOKEN set,
+a request to an /api route carrying `X-Profile: <token>` (or
+`?profile=<token>`) is run with a sampler on the event loop thread, and the
+response is replaced by the sampled stacks in folded format, one
+`frame;frame;frame count` line per stack. Feed it to flamegraph.pl or
+drop it into speedscope.
+
+Server-sent event streams never finish, so for them sampling stops once
+the response headers are sent and the stream is closed. The sampler sees
+everything the event loop runs while the request is in flight, including other concurrent requests; work handed to thread or
+process pools shows up as the await that waits for it.
+"""
+import hmac
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Optional
+from urllib.parse import parse_qs
+
+# Profiling is disabled unless a token is configured
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))
+# Innermost frames kept per sample
+PROFILE_MAX_DEPTH = 128
+# Responses that stay open indefinitely; profiled up to their headers only
+UNBOUNDED_CONTENT_TYPES = (b"text/event-stream",)
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Samples one thread's Python stack every `interval` seconds from a background thread"""
+
+    def __init__(self, thread_id: Optional[int] = None, interval: float = PROFILE_INTERVAL):
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None and len(stack) < PROFILE_MAX_DEPTH:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class _HeadersSent(Exception):
+    """Raised into the endpoint to end an unbounded response once its headers are sent"""
+
+
+class ProfileMiddleware:
+    """ASGI middleware; requests without a valid profile token pass straight through"""
+
+    def __init__(self, app, token: str = PROFILE_TOKEN, prefix: str = "/api"):
+        self.app = app
+        self.token = token
+        self.prefix = prefix
+
+    def _requested_token(self, scope) -> Optional[str]:
+        for name, value in scope.get("headers", []):
+            if name == b"x-profile":
+                return value.decode("latin-1")
+        values = parse_qs(scope.get("query_string", b"").decode("latin-1")).get("profile")
+        return values[0] if values else None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.token or not scope["path"].startswith(self.prefix):
+            return await self.app(scope, receive, send)
+        requested = self._requested_token(scope)
+        if requested is None or not hmac.compare_digest(requested, self.token):
+            return await self.app(scope, receive, send)
+
+        status = 500
+        response_bytes = 0
+        unbounded = False
+
+        async def capture(message):
+            # The endpoint's own response (streamed bodies included) is consumed, not sent
+            nonlocal status, response_bytes, unbounded
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                content_type = dict(message.get("headers", [])).get(b"content-type", b"")
+                if content_type.startswith(UNBOUNDED_CONTENT_TYPES):
+                    unbounded = True
+                    raise _HeadersSent()
+            elif message["type"] == "http.response.body":
+                response_bytes += len(message.get("body", b""))
+
+        profiler = SamplingProfiler(interval=PROFILE_INTERVAL)
+        started = time.perf_counter()
+        profiler.start()
+        try:
+            await self.app(scope, receive, capture)
+        except _HeadersSent:
+            pass
+        finally:
+            profiler.stop()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        body = profiler.folded().encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/plain; charset=utf-8"),
+                (b"content-length", str(len(body)).encode()),
+                (b"x-profiled-status", str(status).encode()),
+                (b"x-profiled-bytes", str(response_bytes).encode()),
+                (b"x-profiled-until", b"headers" if unbounded else b"complete"),
+                (b"x-profile-samples", str(profiler.samples).encode()),
+                (b"x-profile-duration-ms", f"{elapsed_ms:.1f}".encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
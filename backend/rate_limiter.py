@@ -0,0 +1,212 @@
+# backend/rate_limiter.py
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "60"))
+LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", "150000"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+# Fraction of the per-minute request/token budget below which optional work backs off
+LLM_PRESSURE_HEADROOM = float(os.getenv("LLM_PRESSURE_HEADROOM", "0.2"))
+
+# Lower value = served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+
+
+class TokenBucket:
+    """Classic token bucket; a rate of 0 disables the limit"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        if self.rate <= 0:
+            return 0.0
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.tokens >= amount else (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float):
+        if self.rate > 0:
+            self.tokens -= min(amount, self.capacity)
+
+    def headroom(self, now: float) -> float:
+        """Fraction of capacity currently available"""
+        if self.rate <= 0:
+            return 1.0
+        self._refill(now)
+        return max(0.0, self.tokens / self.capacity)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After is either delay-seconds or an HTTP date"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class LLMRateLimiter:
+    """
+    Process-wide governor for LLM calls. Requests wait in a priority queue
+    until the requests-per-minute and tokens-per-minute buckets allow them
+    and a concurrency slot is free. The concurrency limit follows AIMD: it
+    grows by 1/limit on success and halves on a 429/503. Retry-After pauses
+    dispatch for everyone, not just the request that saw it.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float = LLM_REQUESTS_PER_MINUTE,
+        tokens_per_minute: float = LLM_TOKENS_PER_MINUTE,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+    ):
+        self.max_concurrency = max_concurrency
+        self.concurrency_limit = float(max_concurrency)
+        self.in_flight = 0
+        self._requests = TokenBucket(requests_per_minute)
+        self._tokens = TokenBucket(tokens_per_minute)
+        self._paused_until = 0.0
+        self._waiters = []  # heap of (priority, seq, tokens, future)
+        self._seq = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.stats_counters = {"dispatched": 0, "rate_limited": 0}
+
+    async def acquire(self, priority: int = PRIORITY_INTERACTIVE, tokens: int = 0):
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), tokens, future))
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()  # Slot was granted just before cancellation
+            raise
+
+    def release(self):
+        self.in_flight -= 1
+        self._dispatch()
+
+    def slot(self, priority: int = PRIORITY_INTERACTIVE, tokens: int = 0) -> "_Slot":
+        """`async with limiter.slot(priority, tokens):` around a single HTTP attempt"""
+        return _Slot(self, priority, tokens)
+
+    def on_success(self, estimated_tokens: int = 0, actual_tokens: Optional[int] = None):
+        self.concurrency_limit = min(self.max_concurrency, self.concurrency_limit + 1.0 / self.concurrency_limit)
+        if actual_tokens is not None:
+            # Charge (or refund) the difference between the estimate and real usage
+            self._tokens.consume(actual_tokens - estimated_tokens)
+        self._dispatch()
+
+    def on_rate_limited(self, retry_after: float):
+        self.stats_counters["rate_limited"] += 1
+        self.concurrency_limit = max(1.0, self.concurrency_limit / 2)
+        self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+
+    def under_pressure(self, headroom: float = LLM_PRESSURE_HEADROOM) -> bool:
+        """
+        True while optional (prefetch) work should stay out of the way: dispatch
+        is paused by a Retry-After, concurrency has not recovered from a 429
+        back-off, or the request or token budget is nearly spent.
+        """
+        now = time.monotonic()
+        return (
+            self._paused_until > now
+            or self.concurrency_limit <= self.max_concurrency / 2
+            or self._requests.headroom(now) < headroom
+            or self._tokens.headroom(now) < headroom
+        )
+
+    def queue_depth(self) -> Dict[str, int]:
+        depth = {"interactive": 0, "background": 0}
+        for priority, _, _, future in self._waiters:
+            if not future.done():
+                depth["interactive" if priority <= PRIORITY_INTERACTIVE else "background"] += 1
+        return depth
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            **self.stats_counters,
+            "queue_depth": self.queue_depth(),
+            "in_flight": self.in_flight,
+            "concurrency_limit": round(self.concurrency_limit, 2),
+            "paused_for": max(0.0, round(self._paused_until - time.monotonic(), 2)),
+            "under_pressure": self.under_pressure(),
+        }
+
+    def _dispatch(self):
+        while self._waiters:
+            priority, _, tokens, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)  # Cancelled while queued
+                continue
+            if self.in_flight >= int(self.concurrency_limit):
+                return  # release() will dispatch again
+
+            now = time.monotonic()
+            wait = max(
+                self._paused_until - now,
+                self._requests.wait_time(1, now),
+                self._tokens.wait_time(tokens, now),
+            )
+            if wait > 0:
+                self._schedule(wait)
+                return
+
+            heapq.heappop(self._waiters)
+            self._requests.consume(1)
+            self._tokens.consume(tokens)
+            self.in_flight += 1
+            self.stats_counters["dispatched"] += 1
+            future.set_result(None)
+
+    def _schedule(self, delay: float):
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = asyncio.get_running_loop().call_later(delay, self._on_timer)
+
+    def _on_timer(self):
+        self._timer = None
+        self._dispatch()
+
+
+class _Slot:
+    def __init__(self, limiter: LLMRateLimiter, priority: int, tokens: int):
+        self.limiter = limiter
+        self.priority = priority
+        self.tokens = tokens
+
+    async def __aenter__(self):
+        await self.limiter.acquire(self.priority, self.tokens)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.limiter.release()
+
+
+_rate_limiter: Optional[LLMRateLimiter] = None
+
+
+def get_rate_limiter() -> LLMRateLimiter:
+    global _rate_limiter
+    if _rate_limiter is None:
+        _rate_limiter = LLMRateLimiter()
+    return _rate_limiter
@@ -0,0 +1,195 @@
+# backend/retrieval.py
+import asyncio
+import io
+import os
+import re
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from backend.blob_store import get_blob_store
+from backend.metrics import record_cache_lookup, time_stage
+from backend.text_chunker import split_sections
+from backend.token_budget import count_tokens
+
+# Passage size the source text is indexed at
+RETRIEVAL_PASSAGE_CHARS = int(os.getenv("RETRIEVAL_PASSAGE_CHARS", "1000"))
+# Passages (and their token budget) put into a quiz/flashcard prompt
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "6"))
+RETRIEVAL_TOKEN_BUDGET = int(os.getenv("RETRIEVAL_TOKEN_BUDGET", "1200"))
+# Loaded indexes kept per process
+RETRIEVAL_CACHE_SIZE = 32
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be been but by can for from has have if in into is it its may more not of on or "
+    "our such than that the their then there these this to was we were which will with".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall(text.lower()) if len(t) > 1 and t not in _STOPWORDS]
+
+
+class RetrievalIndex:
+    """
+    BM25 index over fixed-size passages of a course's source text. Postings
+    are stored column-wise (term -> passages) in flat NumPy arrays, so a
+    query touches only the passages that contain its terms.
+    """
+
+    def __init__(
+        self,
+        text: str,
+        spans: np.ndarray,
+        terms: List[str],
+        indptr: np.ndarray,
+        passage_ids: np.ndarray,
+        term_freqs: np.ndarray,
+        passage_lengths: np.ndarray,
+    ):
+        self.text = text
+        self.spans = spans
+        self.vocab: Dict[str, int] = {term: i for i, term in enumerate(terms)}
+        self.indptr = indptr
+        self.passage_ids = passage_ids
+        self.term_freqs = term_freqs
+        self.passage_lengths = passage_lengths
+
+        num_passages = len(spans)
+        doc_freq = np.diff(indptr).astype(np.float64)
+        self.idf = np.log1p((num_passages - doc_freq + 0.5) / (doc_freq + 0.5))
+        avg_length = passage_lengths.mean() if num_passages else 1.0
+        # Per-passage BM25 length normalisation, precomputed once
+        self._norm = BM25_K1 * (1 - BM25_B + BM25_B * passage_lengths / max(avg_length, 1.0))
+
+    @classmethod
+    def build(cls, text: str, passage_chars: int = RETRIEVAL_PASSAGE_CHARS) -> "RetrievalIndex":
+        spans = np.array(split_sections(text, passage_chars), dtype=np.int64).reshape(-1, 2)
+        vocab: Dict[str, int] = {}
+        term_ids: List[int] = []
+        passage_ids: List[int] = []
+        term_freqs: List[int] = []
+        lengths = np.zeros(len(spans), dtype=np.float64)
+        for passage, (start, end) in enumerate(spans):
+            tokens = tokenize(text[start:end])
+            lengths[passage] = len(tokens)
+            for term, count in Counter(tokens).items():
+                term_ids.append(vocab.setdefault(term, len(vocab)))
+                passage_ids.append(passage)
+                term_freqs.append(count)
+
+        term_array = np.array(term_ids, dtype=np.int64)
+        order = np.argsort(term_array, kind="stable")
+        indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_array, minlength=len(vocab)), out=indptr[1:])
+        return cls(
+            text,
+            spans,
+            list(vocab),
+            indptr,
+            np.array(passage_ids, dtype=np.int32)[order],
+            np.array(term_freqs, dtype=np.float32)[order],
+            lengths,
+        )
+
+    def __len__(self) -> int:
+        return len(self.spans)
+
+    def passage(self, i: int) -> str:
+        start, end = self.spans[i]
+        return self.text[start:end].strip()
+
+    def search(self, query: str, k: int = RETRIEVAL_TOP_K) -> List[Tuple[int, float]]:
+        """Top-k (passage index, BM25 score) for the query"""
+        scores = np.zeros(len(self.spans), dtype=np.float64)
+        for term, weight in Counter(tokenize(query)).items():
+            term_id = self.vocab.get(term)
+            if term_id is None:
+                continue
+            lo, hi = self.indptr[term_id], self.indptr[term_id + 1]
+            ids, tf = self.passage_ids[lo:hi], self.term_freqs[lo:hi]
+            # Each passage appears once per term, so fancy-index += is safe
+            scores[ids] += weight * self.idf[term_id] * tf * (BM25_K1 + 1) / (tf + self._norm[ids])
+        k = min(k, int(np.count_nonzero(scores)))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(i), float(scores[i])) for i in top]
+
+    def top_passages(self, query: str, token_budget: int = RETRIEVAL_TOKEN_BUDGET, k: int = RETRIEVAL_TOP_K) -> List[str]:
+        """Best-matching passages that fit in `token_budget`, returned in document order"""
+        chosen: List[int] = []
+        used = 0
+        for i, _ in self.search(query, k):
+            cost = count_tokens(self.passage(i))
+            if used + cost > token_budget:
+                continue
+            chosen.append(i)
+            used += cost
+        return [self.passage(i) for i in sorted(chosen)]
+
+    def to_bytes(self) -> bytes:
+        buffer = io.BytesIO()
+        np.savez_compressed(
+            buffer,
+            text=np.frombuffer(self.text.encode("utf-8"), dtype=np.uint8),
+            spans=self.spans,
+            terms=np.frombuffer("\n".join(self.vocab).encode("utf-8"), dtype=np.uint8),
+            indptr=self.indptr,
+            passage_ids=self.passage_ids,
+            term_freqs=self.term_freqs,
+            passage_lengths=self.passage_lengths,
+        )
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "RetrievalIndex":
+        with np.load(io.BytesIO(data), allow_pickle=False) as arrays:
+            terms = arrays["terms"].tobytes().decode("utf-8")
+            return cls(
+                arrays["text"].tobytes().decode("utf-8"),
+                arrays["spans"],
+                terms.split("\n") if terms else [],
+                arrays["indptr"],
+                arrays["passage_ids"],
+                arrays["term_freqs"],
+                arrays["passage_lengths"],
+            )
+
+
+async def store_retrieval_index(text: str) -> str:
+    """Build the index off the event loop and save it to the blob store; returns its blob key"""
+    with time_stage("index"):
+        data = await asyncio.to_thread(lambda: RetrievalIndex.build(text).to_bytes())
+        return await get_blob_store().put(data)
+
+
+_loaded: "OrderedDict[str, RetrievalIndex]" = OrderedDict()
+
+
+async def load_retrieval_index(key: str) -> Optional[RetrievalIndex]:
+    """Index for a blob key, from the per-process LRU or the blob store; None if it is gone"""
+    index = _loaded.get(key)
+    record_cache_lookup("retrieval_index", index is not None)
+    if index is not None:
+        _loaded.move_to_end(key)
+        return index
+    store = get_blob_store()
+    if not store.exists(key):
+        return None
+
+    def read() -> RetrievalIndex:
+        with open(store.local_path(key), "rb") as f:
+            return RetrievalIndex.from_bytes(f.read())
+
+    index = await asyncio.to_thread(read)
+    _loaded[key] = index
+    while len(_loaded) > RETRIEVAL_CACHE_SIZE:
+        _loaded.popitem(last=False)
+    return index
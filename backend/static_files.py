@@ -0,0 +1,274 @@
+# backend/static_files.py
+"""
+Serving of the built frontend (dist/).
+
+- Precompressed variants: `file.br` / `file.gz` next to a file are sent
+  instead of it when the client accepts that encoding. They are written by
+  precompress_directory(), at startup (STATIC_PRECOMPRESS) or as a build
+  step: `python -m backend.static_files ./dist`. Brotli needs the optional
+  `brotli` package; gzip variants are always written.
+- Caching: fingerprinted files under assets/ (Vite's `name-<hash>.ext`) are
+  `immutable` for a year; everything else (index.html) is `no-cache` and
+  revalidated with its ETag, answered with 304 when unchanged.
+- Zero-copy: when the ASGI server offers the `http.response.pathsend` or
+  `http.response.zerocopysend` extension, the file is handed to it to send
+  (sendfile) instead of being read through Python.
+- Client-side routes (no file extension, outside /api) fall back to
+  index.html.
+"""
+import asyncio
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import stat
+import sys
+import tempfile
+from typing import Dict, Optional, Tuple
+
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Receive, Scope, Send
+
+STATIC_DIR = "./dist"
+# Write missing/stale .gz/.br variants of dist/ in the background on startup
+STATIC_PRECOMPRESS = os.getenv("STATIC_PRECOMPRESS", "true").lower() == "true"
+
+# Files smaller than this aren't worth a compressed variant
+PRECOMPRESS_MIN_BYTES = 1024
+PRECOMPRESS_EXTENSIONS = frozenset({".js", ".mjs", ".css", ".html", ".svg", ".json", ".map", ".txt", ".xml", ".wasm", ".ico"})
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+# Vite output: assets/<name>-<8 char hash>.<ext>
+_FINGERPRINT_RE = re.compile(r"-[A-Za-z0-9_-]{8}\.[A-Za-z0-9]+$")
+IMMUTABLE_DIR = "assets"
+
+# Preferred first
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+class _FileInfo:
+    """What file_response needs about one file, kept until the file changes"""
+    __slots__ = ("mtime_ns", "variants", "digest", "cache_control", "media_type")
+
+    def __init__(self, mtime_ns: int, variants: Dict[str, Tuple[str, os.stat_result]], digest: str, cache_control: str, media_type: str):
+        self.mtime_ns = mtime_ns
+        self.variants = variants
+        self.digest = digest
+        self.cache_control = cache_control
+        self.media_type = media_type
+
+
+def accepted_encodings(accept_encoding: str) -> set:
+    """Codings an Accept-Encoding header allows (q > 0)"""
+    accepted = set()
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if coding and q > 0:
+            accepted.add(coding)
+    if "*" in accepted:
+        accepted.update(encoding for encoding, _ in ENCODINGS)
+    return accepted
+
+
+def _compress_brotli(data: bytes) -> Optional[bytes]:
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli.compress(data, quality=11)
+
+
+def _write_atomic(path: str, data: bytes, mode: int):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".precompress-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        # mkstemp creates the file 0600; give the variant the original's permissions
+        os.chmod(tmp, mode)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def precompress_directory(directory: str = STATIC_DIR) -> int:
+    """
+    Write .gz (and .br, if brotli is installed) variants of compressible
+    files that lack a current one. A variant that wouldn't be smaller than
+    the original is skipped. Returns the number of variants written.
+    """
+    compressors = [(".gz", lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+    if _compress_brotli(b"") is not None:
+        compressors.append((".br", _compress_brotli))
+    else:
+        print("⚠️  'brotli' package not installed; writing gzip variants only")
+
+    written = 0
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if os.path.splitext(name)[1].lower() not in PRECOMPRESS_EXTENSIONS:
+                continue
+            path = os.path.join(root, name)
+            source = os.stat(path)
+            if source.st_size < PRECOMPRESS_MIN_BYTES:
+                continue
+            data = None
+            for suffix, compress in compressors:
+                try:
+                    if os.stat(path + suffix).st_mtime_ns >= source.st_mtime_ns:
+                        continue  # Up to date
+                except FileNotFoundError:
+                    pass
+                if data is None:
+                    with open(path, "rb") as f:
+                        data = f.read()
+                compressed = compress(data)
+                if len(compressed) < len(data):
+                    _write_atomic(path + suffix, compressed, stat.S_IMODE(source.st_mode))
+                    written += 1
+    return written
+
+
+class StaticFileResponse(FileResponse):
+    """FileResponse that lets the server send the file itself (sendfile) when it supports it"""
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        extensions = scope.get("extensions") or {}
+        zero_copy = "http.response.pathsend" in extensions or "http.response.zerocopysend" in extensions
+        if self.send_header_only or not zero_copy:
+            return await super().__call__(scope, receive, send)
+
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if "http.response.pathsend" in extensions:
+            await send({"type": "http.response.pathsend", "path": os.path.abspath(self.path)})
+        else:
+            with open(self.path, "rb") as file:
+                await send({"type": "http.response.zerocopysend", "file": file, "more_body": False})
+        if self.background is not None:
+            await self.background()
+
+
+class FrontendStaticFiles(StaticFiles):
+    """StaticFiles for the SPA bundle: precompressed variants, cache headers, ETag/304, index.html fallback"""
+
+    def __init__(self, directory: str = STATIC_DIR, **kwargs):
+        super().__init__(directory=directory, html=True, **kwargs)
+        self._real_directory = os.path.realpath(str(directory))
+        self._files: Dict[str, _FileInfo] = {}
+
+    def precompress(self) -> int:
+        """precompress_directory() for this directory, then pick up the new variants"""
+        try:
+            written = precompress_directory(str(self.directory))
+        except Exception as e:
+            print(f"⚠️  Precompressing {self.directory} failed: {e}")
+            return 0
+        self._files.clear()
+        if written:
+            print(f"🗜️  Wrote {written} precompressed static variants")
+        return written
+
+    def _file_info(self, full_path: str, stat_result: os.stat_result) -> _FileInfo:
+        info = self._files.get(full_path)
+        if info is not None and info.mtime_ns == stat_result.st_mtime_ns:
+            return info
+
+        variants = {}
+        for encoding, suffix in ENCODINGS:
+            try:
+                variant_stat = os.stat(full_path + suffix)
+            except OSError:
+                continue
+            if variant_stat.st_mtime_ns >= stat_result.st_mtime_ns:  # Stale variants are ignored
+                variants[encoding] = (full_path + suffix, variant_stat)
+
+        parts = os.path.relpath(full_path, self._real_directory).split(os.sep)
+        immutable = parts[0] == IMMUTABLE_DIR and _FINGERPRINT_RE.search(parts[-1])
+        info = _FileInfo(
+            stat_result.st_mtime_ns,
+            variants,
+            hashlib.md5(f"{stat_result.st_mtime_ns}-{stat_result.st_size}".encode(), usedforsecurity=False).hexdigest(),
+            IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL,
+            mimetypes.guess_type(full_path)[0] or "text/plain",
+        )
+        self._files[full_path] = info
+        return info
+
+    def file_response(
+        self,
+        full_path: str,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        full_path = str(full_path)
+        request_headers = Headers(scope=scope)
+        info = self._file_info(full_path, stat_result)
+        accepted = accepted_encodings(request_headers.get("accept-encoding", "")) if info.variants else set()
+        encoding = next((encoding for encoding, _ in ENCODINGS if encoding in info.variants and encoding in accepted), None)
+
+        # Validators come from the original file; each encoding gets its own ETag
+        headers = {
+            "etag": f'"{info.digest}-{encoding}"' if encoding else f'"{info.digest}"',
+            "cache-control": info.cache_control,
+        }
+        if info.variants:
+            headers["vary"] = "Accept-Encoding"
+        if encoding:
+            headers["content-encoding"] = encoding
+            path, stat_result = info.variants[encoding]
+        else:
+            path = full_path
+
+        response = StaticFileResponse(
+            path,
+            status_code=status_code,
+            headers=headers,
+            media_type=info.media_type,
+            stat_result=stat_result,
+            method=scope["method"],
+        )
+        if status_code == 200 and self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+    def is_not_modified(self, response_headers: Headers, request_headers: Headers) -> bool:
+        # If-None-Match takes precedence and is a list compared weakly (RFC 9110 13.1.2)
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match is not None:
+            etag = response_headers.get("etag", "").removeprefix("W/")
+            tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+            return "*" in tags or etag in tags
+        return super().is_not_modified(response_headers, request_headers)
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        try:
+            return await super().get_response(path, scope)
+        except HTTPException as e:
+            # Client-side routes (no extension, not an API path) load the app shell
+            parts = path.split(os.sep)
+            if e.status_code != 404 or parts[0] == "api" or os.path.splitext(parts[-1])[1]:
+                raise
+        full_path, stat_result = await asyncio.to_thread(self.lookup_path, "index.html")
+        if stat_result is None:
+            raise HTTPException(status_code=404)
+        return self.file_response(full_path, stat_result, scope)
+
+
+if __name__ == "__main__":
+    directory = sys.argv[1] if len(sys.argv) > 1 else STATIC_DIR
+    print(f"{precompress_directory(directory)} variants written in {directory}")
@@ -0,0 +1,123 @@
+# backend/status_stream.py
+import asyncio
+import os
+from typing import AsyncIterator, Dict, Optional, Set, Tuple
+
+from backend.job_queue import StatusStore, get_status_store
+from backend.models.course import ProcessingStatus
+
+# How often the shared status table is checked for writes from other processes
+STATUS_STREAM_POLL_INTERVAL = float(os.getenv("STATUS_STREAM_POLL_INTERVAL", "0.25"))
+STATUS_STREAM_QUEUE_SIZE = 16
+
+TERMINAL_STATUSES = ("completed", "failed")
+
+StatusEvent = Tuple[int, ProcessingStatus]
+
+
+class StatusBroadcaster:
+    """
+    Fans ProcessingStatus changes out to stream subscribers. One poller per
+    process reads new status_events rows and dispatches them to per-upload
+    subscriber queues, so the database cost does not grow with the number
+    of open streams. Local writes wake the poller immediately; writes from
+    other worker processes are picked up within one poll interval.
+    """
+
+    def __init__(self, store: StatusStore):
+        self.store = store
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._last_seq = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        store.add_listener(self._on_local_write)
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._last_seq = self.store.max_seq()
+        self._task = asyncio.create_task(self._poll_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def _on_local_write(self):
+        if self._task is not None and self._subscribers:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def _poll_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=STATUS_STREAM_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if not self._subscribers:
+                # Nobody listening: skip ahead instead of reading events no one needs
+                self._last_seq = await asyncio.to_thread(self.store.max_seq)
+                continue
+            try:
+                events = await asyncio.to_thread(self.store.events_since, self._last_seq)
+            except Exception as e:
+                print(f"❌ Status stream poll failed: {e}")
+                continue
+            for seq, status in events:
+                self._last_seq = seq
+                for queue in self._subscribers.get(status.id, ()):
+                    if queue.full():
+                        queue.get_nowait()  # Slow consumer: statuses are full snapshots, drop the oldest
+                    queue.put_nowait((seq, status))
+
+    async def subscribe(self, status_id: str, last_event_id: Optional[int] = None) -> AsyncIterator[StatusEvent]:
+        """
+        Yield (event_id, status) for one upload until it completes or fails.
+        With last_event_id, missed events are replayed first; otherwise the
+        current status is sent immediately.
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=STATUS_STREAM_QUEUE_SIZE)
+        self._subscribers.setdefault(status_id, set()).add(queue)
+        try:
+            if last_event_id is not None:
+                backlog = await asyncio.to_thread(self.store.events_since, last_event_id, status_id)
+            else:
+                latest = await asyncio.to_thread(self.store.latest_event, status_id)
+                backlog = [latest] if latest else []
+
+            sent_seq = last_event_id or 0
+            for seq, status in backlog:
+                sent_seq = seq
+                yield seq, status
+                if status.status in TERMINAL_STATUSES:
+                    return
+
+            while True:
+                seq, status = await queue.get()
+                if seq <= sent_seq:
+                    continue  # Already delivered from the backlog
+                sent_seq = seq
+                yield seq, status
+                if status.status in TERMINAL_STATUSES:
+                    return
+        finally:
+            subscribers = self._subscribers.get(status_id)
+            if subscribers is not None:
+                subscribers.discard(queue)
+                if not subscribers:
+                    del self._subscribers[status_id]
+
+    def subscriber_count(self) -> int:
+        return sum(len(queues) for queues in self._subscribers.values())
+
+
+_broadcaster: Optional[StatusBroadcaster] = None
+
+
+def get_status_broadcaster() -> StatusBroadcaster:
+    global _broadcaster
+    if _broadcaster is None:
+        _broadcaster = StatusBroadcaster(get_status_store())
+    return _broadcaster
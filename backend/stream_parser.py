@@ -0,0 +1,56 @@
+# backend/stream_parser.py
+import json
+import re
+from typing import Any, Dict, Optional
+
+_STRING_BODY = r'"((?:[^"\\]|\\.)*)'
+_TITLE_RE = re.compile(r'"title"\s*:\s*' + _STRING_BODY + r'"')
+_CONTENT_RE = re.compile(r'"content"\s*:\s*' + _STRING_BODY + r'("?)')
+_MODULES_RE = re.compile(r'"modules"\s*:\s*\[')
+
+
+def _decode_partial_string(body: str) -> str:
+    """Decode a JSON string body that may be cut off mid-escape"""
+    for trim in range(0, 7):
+        try:
+            return json.loads(f'"{body[:len(body) - trim]}"')
+        except json.JSONDecodeError:
+            continue
+    return body
+
+
+def parse_course_preview(text: str) -> Optional[Dict[str, Any]]:
+    """
+    Best-effort preview of a course JSON document that is still streaming in:
+    the course title as soon as its string closes, every module title, and
+    each module's markdown so far (the last one possibly partial).
+    """
+    modules_match = _MODULES_RE.search(text)
+    head = text[:modules_match.start()] if modules_match else text
+    title_match = _TITLE_RE.search(head)
+    preview: Dict[str, Any] = {
+        "title": _decode_partial_string(title_match.group(1)) if title_match else None,
+        "modules": [],
+    }
+    if not modules_match:
+        return preview if preview["title"] else None
+
+    body_start = modules_match.end()
+    modules = []
+    for match in _TITLE_RE.finditer(text, body_start):
+        modules.append({"title": _decode_partial_string(match.group(1)), "content": "", "complete": False, "_pos": match.end()})
+
+    for match in _CONTENT_RE.finditer(text, body_start):
+        # Attach content to the nearest module title before it
+        owner = None
+        for module in modules:
+            if module["_pos"] <= match.start():
+                owner = module
+        if owner is not None:
+            owner["content"] = _decode_partial_string(match.group(1))
+            owner["complete"] = bool(match.group(2))
+
+    for module in modules:
+        del module["_pos"]
+    preview["modules"] = modules
+    return preview
@@ -0,0 +1,160 @@
+# backend/study_materials.py
+import asyncio
+import os
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from backend.azure_processor import AzureWhitepaperProcessor
+from backend.rate_limiter import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, get_rate_limiter
+from backend.retrieval import RETRIEVAL_TOKEN_BUDGET, load_retrieval_index
+from backend.token_budget import truncate_to_tokens
+
+# Modules whose quiz + flashcards are generated at the same time
+STUDY_MATERIALS_CONCURRENCY = int(os.getenv("STUDY_MATERIALS_CONCURRENCY", "5"))
+# Finished modules buffered before their results are written in one batch
+STUDY_MATERIALS_WRITE_BATCH = int(os.getenv("STUDY_MATERIALS_WRITE_BATCH", "5"))
+# Pre-generate study materials in the background once a course is created
+PREFETCH_STUDY_MATERIALS = os.getenv("PREFETCH_STUDY_MATERIALS", "true").lower() == "true"
+PREFETCH_CONCURRENCY = int(os.getenv("PREFETCH_CONCURRENCY", "2"))
+
+
+def is_fallback(materials: Any) -> bool:
+    """
+    True for the placeholder quiz/flashcards the generators return when the
+    LLM call fails. Also recognizes placeholders saved before they were
+    marked: the flashcard's front/back keys, the quiz's fixed options.
+    """
+    if isinstance(materials, dict):
+        questions = materials.get("questions") or []
+        return bool(materials.get("fallback")) or (
+            len(questions) == 1 and questions[0].get("options") == ["Key concepts", "Details", "Applications", "All"]
+        )
+    if isinstance(materials, list):
+        return any(card.get("fallback") or "front" in card for card in materials if isinstance(card, dict))
+    return False
+
+
+def has_quiz(module: Dict[str, Any]) -> bool:
+    quiz = module.get("quiz") or {}
+    return bool(quiz.get("questions")) and not is_fallback(quiz)
+
+
+def has_flashcards(module: Dict[str, Any]) -> bool:
+    return bool(module.get("flashcards")) and not is_fallback(module["flashcards"])
+
+
+def has_study_materials(module: Dict[str, Any]) -> bool:
+    return has_quiz(module) and has_flashcards(module)
+
+
+async def module_source_passages(db, module: Dict[str, Any], index_key: Optional[str]) -> str:
+    """
+    Source excerpts for a module's quiz/flashcard prompts: the passages of the
+    course's retrieval index (`index_key`, the course's retrieval_index) that
+    best match the module, within the token budget. Without an index (older
+    courses) or a match, the module's own source span is used instead.
+    """
+    index = await load_retrieval_index(index_key) if index_key else None
+    passages = index.top_passages(f"{module['title']}\n{module['content']}") if index is not None else []
+    if passages:
+        return "\n\n".join(passages)
+    source_text = await db.module_source_text(module)
+    return truncate_to_tokens(source_text, RETRIEVAL_TOKEN_BUDGET)
+
+
+async def generate_module_materials(
+    db,
+    processor: AzureWhitepaperProcessor,
+    module: Dict[str, Any],
+    index_key: Optional[str],
+    priority: int = PRIORITY_INTERACTIVE,
+    refresh: bool = False,
+) -> Dict[str, Any]:
+    """Quiz and flashcards for one module, both LLM calls in flight together (refresh: bypass the LLM cache)"""
+    source_text = await module_source_passages(db, module, index_key)
+    quiz, flashcards = await asyncio.gather(
+        processor.generate_module_quiz(module["title"], module["content"], source_text, priority=priority, refresh=refresh),
+        processor.generate_module_flashcards(module["title"], module["content"], source_text, priority=priority, refresh=refresh),
+    )
+    if is_fallback(quiz) or is_fallback(flashcards):
+        # Not saved: the module is retried on the next run or on demand (the half that worked is LLM-cached)
+        raise RuntimeError("LLM generation failed; placeholder materials were not saved")
+    return {"module_id": module["id"], "quiz": quiz, "flashcards": flashcards}
+
+
+async def iter_study_materials(
+    db,
+    processor: AzureWhitepaperProcessor,
+    course: Dict[str, Any],
+    modules: List[Dict[str, Any]],
+    priority: int = PRIORITY_INTERACTIVE,
+    concurrency: int = STUDY_MATERIALS_CONCURRENCY,
+    refresh: bool = False,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Generate materials for `modules` of `course` with at most `concurrency` modules in
+    flight, yielding each module's result (or {"module_id", "error"}) as
+    soon as it is ready. Results are persisted in write batches; whatever is
+    still buffered is written when the iterator ends or is closed early.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(module: Dict[str, Any]) -> Dict[str, Any]:
+        async with semaphore:
+            try:
+                return await generate_module_materials(db, processor, module, course.get("retrieval_index"), priority, refresh)
+            except Exception as e:
+                print(f"❌ Study materials failed for module {module['id']}: {e}")
+                return {"module_id": module["id"], "error": str(e)}
+
+    tasks = [asyncio.create_task(run(module)) for module in modules]
+    pending: List[Dict[str, Any]] = []
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            result = await next_done
+            if "error" not in result:
+                pending.append(result)
+                if len(pending) >= STUDY_MATERIALS_WRITE_BATCH:
+                    batch, pending = pending, []
+                    await db.save_study_materials(batch)
+            yield result
+    finally:
+        for task in tasks:
+            task.cancel()
+        if pending:
+            # Shielded so results already produced are kept even if the consumer went away
+            await asyncio.shield(db.save_study_materials(pending))
+
+
+async def prefetch_study_materials(db, processor: AzureWhitepaperProcessor, course_id: str) -> int:
+    """
+    Background pre-generation for a new course: module 1 first, since that is
+    where a learner starts, then the rest. Calls run at background priority
+    so interactive requests overtake them in the rate limiter, and the run
+    stops early under LLM quota pressure; skipped modules are generated on
+    demand instead. Returns the number of modules prefetched.
+    """
+    course = await db.courses.find_one({"id": course_id})
+    if not course:
+        return 0
+    modules = await db.modules.find_many_by_ids(course.get("modules", []))
+    todo = [m for m in modules if not has_study_materials(m)]
+    limiter = get_rate_limiter()
+
+    prefetched = 0
+    for group, concurrency in ((todo[:1], 1), (todo[1:], PREFETCH_CONCURRENCY)):
+        if not group:
+            continue
+        if limiter.under_pressure():
+            print(f"⏭️  Skipping study material prefetch for {course_id}: LLM quota pressure")
+            return prefetched
+        results = iter_study_materials(db, processor, course, group, priority=PRIORITY_BACKGROUND, concurrency=concurrency)
+        try:
+            async for result in results:
+                if "error" not in result:
+                    prefetched += 1
+                if limiter.under_pressure():
+                    print(f"⏭️  Stopping study material prefetch for {course_id}: LLM quota pressure")
+                    return prefetched
+        finally:
+            await results.aclose()
+    return prefetched
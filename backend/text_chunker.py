@@ -0,0 +1,51 @@
+# backend/text_chunker.py
+import re
+from typing import List, Tuple
+
+# Numbered headings such as "1. Introduction", "4 Proof-of-Work", "3.2 Merkle Trees".
+# _clean_text collapses newlines, so headings are found mid-line after a sentence end.
+_HEADING_RE = re.compile(r"(?<=[.!?:)\]])\s+(?=(?:\d{1,2}(?:\.\d{1,2})*\.?|[IVX]{1,4}\.)\s+[A-Z][A-Za-z-]+)")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+def _split_long(text: str, start: int, end: int, max_chars: int) -> List[Tuple[int, int]]:
+    """Split an oversized section on sentence ends, hard-cutting runaway sentences"""
+    spans: List[Tuple[int, int]] = []
+    chunk_start, last_cut = start, None
+    for cut in [m.end() for m in _SENTENCE_RE.finditer(text, start, end)] + [end]:
+        while cut - chunk_start > max_chars:
+            if last_cut and last_cut > chunk_start:
+                spans.append((chunk_start, last_cut))
+                chunk_start, last_cut = last_cut, None
+            else:
+                spans.append((chunk_start, chunk_start + max_chars))
+                chunk_start += max_chars
+        last_cut = cut
+    if chunk_start < end:
+        spans.append((chunk_start, end))
+    return spans
+
+
+def split_sections(text: str, max_chars: int = 8000) -> List[Tuple[int, int]]:
+    """
+    Split text into chunks of at most `max_chars`, cutting at numbered section
+    headings where possible and at sentence ends otherwise. Returns (start, end)
+    offsets into `text`; adjacent small sections are packed together.
+    """
+    boundaries = [0] + [m.start() for m in _HEADING_RE.finditer(text)] + [len(text)]
+    sections = [(boundaries[i], boundaries[i + 1]) for i in range(len(boundaries) - 1) if boundaries[i] < boundaries[i + 1]]
+
+    spans: List[Tuple[int, int]] = []
+    for start, end in sections:
+        if end - start > max_chars:
+            spans.extend(_split_long(text, start, end, max_chars))
+            continue
+        if spans and end - spans[-1][0] <= max_chars:
+            spans[-1] = (spans[-1][0], end)
+        else:
+            spans.append((start, end))
+    return spans
+
+
+def chunk_text(text: str, max_chars: int = 8000) -> List[str]:
+    return [text[start:end].strip() for start, end in split_sections(text, max_chars)]
@@ -0,0 +1,195 @@
+# backend/token_budget.py
+import math
+import os
+import re
+import threading
+from typing import Any, Dict, List, Optional
+
+from backend.metrics import LLM_TOKENS
+
+# tiktoken encoding used for counting when the package (and its encoding file) is available
+LLM_TOKENIZER_ENCODING = os.getenv("LLM_TOKENIZER_ENCODING", "o200k_base")
+# Where tiktoken keeps encoding files; filled at build time by `python -m backend.token_budget`
+# so startup does not download them
+TIKTOKEN_CACHE_DIR = os.environ.setdefault("TIKTOKEN_CACHE_DIR", "./data/tiktoken")
+
+# Chat format overhead per message and per request (OpenAI cookbook figures)
+MESSAGE_OVERHEAD_TOKENS = 4
+REQUEST_OVERHEAD_TOKENS = 3
+# Average for English prose; used to turn "N words" instructions into token budgets
+TOKENS_PER_WORD = 1.4
+# Completion budgets carry this much headroom over the estimate
+COMPLETION_HEADROOM = 1.25
+
+# Approximate BPE: letter runs, digit triples, punctuation runs, whitespace runs
+_PIECE_RE = re.compile(r"[^\W\d_]+|\d{1,3}|[^\w\s]+|_+|\s+")
+
+_encoding: Any = None
+_encoding_checked = False
+_encoding_lock = threading.Lock()
+
+
+def load_tokenizer():
+    """
+    The tiktoken encoding, or None when tiktoken is not installed or its
+    encoding file cannot be loaded (it is downloaded into TIKTOKEN_CACHE_DIR
+    when not preloaded, so call this off the event loop at startup).
+    """
+    global _encoding, _encoding_checked
+    if _encoding_checked:
+        return _encoding
+    with _encoding_lock:
+        if not _encoding_checked:
+            try:
+                import tiktoken
+                _encoding = tiktoken.get_encoding(LLM_TOKENIZER_ENCODING)
+            except Exception as e:
+                print(
+                    f"❌ tiktoken encoding {LLM_TOKENIZER_ENCODING!r} unavailable ({type(e).__name__}: {e}); "
+                    f"token budgets and prompt truncation fall back to APPROXIMATE counts. "
+                    f"Install requirements.txt and run `python -m backend.token_budget` at build time."
+                )
+            _encoding_checked = True
+    return _encoding
+
+
+def _piece_tokens(piece: str) -> int:
+    first = piece[0]
+    if first.isspace():
+        return 0 if piece == " " else 1  # A single space merges into the next word
+    if first.isalpha():
+        return math.ceil(len(piece) / 6) if piece.isascii() else len(piece)
+    if first.isdigit():
+        return 1
+    return math.ceil(len(piece) / 2)
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    encoding = load_tokenizer()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return sum(_piece_tokens(m.group()) for m in _PIECE_RE.finditer(text))
+
+
+def count_message_tokens(messages: List[Dict[str, str]]) -> int:
+    return REQUEST_OVERHEAD_TOKENS + sum(MESSAGE_OVERHEAD_TOKENS + count_tokens(m["content"]) for m in messages)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Longest prefix of `text` that fits in `max_tokens`"""
+    if max_tokens <= 0:
+        return ""
+    encoding = load_tokenizer()
+    if encoding is not None:
+        tokens = encoding.encode(text, disallowed_special=())
+        return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+    used = 0
+    for match in _PIECE_RE.finditer(text):
+        used += _piece_tokens(match.group())
+        if used > max_tokens:
+            return text[:match.start()]
+    return text
+
+
+def chars_for_tokens(text: str, tokens: int, sample_chars: int = 20000) -> int:
+    """Characters of `text` that make up roughly `tokens` tokens, measured on a sample"""
+    sample = text[:sample_chars]
+    sample_tokens = count_tokens(sample)
+    if not sample_tokens:
+        return tokens * 4
+    return max(1, int(tokens * len(sample) / sample_tokens))
+
+
+def words_to_tokens(words: int) -> int:
+    return int(words * TOKENS_PER_WORD)
+
+
+class PromptBudget:
+    """
+    Token budget for assembling one prompt: the fixed parts are charged up
+    front, then each variable part is truncated to its share of what is left.
+    """
+
+    def __init__(self, total_tokens: int, *fixed_parts: str):
+        self.total = total_tokens
+        self.remaining = total_tokens - sum(count_tokens(part) for part in fixed_parts)
+
+    def fit(self, text: str, share: float = 1.0) -> str:
+        """Truncate `text` to `share` of the remaining budget and charge what it uses"""
+        fitted = truncate_to_tokens(text, int(max(self.remaining, 0) * share))
+        self.remaining -= count_tokens(fitted)
+        return fitted
+
+
+# Expected completion sizes for the JSON each prompt asks for
+QUIZ_TOKENS_PER_QUESTION = 110  # question, four options, answer and a one-line explanation
+FLASHCARD_TOKENS = 60
+JSON_ENVELOPE_TOKENS = 30
+COURSE_HEADER_TOKENS = 250  # title, description, difficulty, objectives
+COURSE_MODULE_OVERHEAD_TOKENS = 40  # per-module keys, title, estimatedTime, sections
+
+
+def quiz_max_tokens(num_questions: int) -> int:
+    return int((JSON_ENVELOPE_TOKENS + num_questions * QUIZ_TOKENS_PER_QUESTION) * COMPLETION_HEADROOM)
+
+
+def flashcards_max_tokens(num_flashcards: int) -> int:
+    return int((JSON_ENVELOPE_TOKENS + num_flashcards * FLASHCARD_TOKENS) * COMPLETION_HEADROOM)
+
+
+def course_max_tokens(max_modules: int, words_per_module: int) -> int:
+    per_module = words_to_tokens(words_per_module) + COURSE_MODULE_OVERHEAD_TOKENS
+    return int((COURSE_HEADER_TOKENS + max_modules * per_module) * COMPLETION_HEADROOM)
+
+
+class TokenUsage:
+    """Predicted vs actual token counts per call site, for tuning the budgets above"""
+
+    def __init__(self):
+        self._sites: Dict[str, Dict[str, int]] = {}
+
+    def record(
+        self,
+        site: str,
+        predicted_prompt: int,
+        max_tokens: int,
+        actual_prompt: Optional[int],
+        completion: Optional[int],
+    ):
+        totals = self._sites.setdefault(site, {
+            "calls": 0, "predicted_prompt_tokens": 0, "actual_prompt_tokens": 0,
+            "completion_tokens": 0, "max_tokens": 0, "hit_max_tokens": 0,
+        })
+        totals["calls"] += 1
+        totals["predicted_prompt_tokens"] += predicted_prompt
+        totals["actual_prompt_tokens"] += actual_prompt or 0
+        totals["completion_tokens"] += completion or 0
+        totals["max_tokens"] += max_tokens
+        if completion is not None and completion >= max_tokens:
+            totals["hit_max_tokens"] += 1
+        LLM_TOKENS.labels(site, "prompt").inc(actual_prompt if actual_prompt is not None else predicted_prompt)
+        LLM_TOKENS.labels(site, "completion").inc(completion or 0)
+        actual = f"{actual_prompt}" if actual_prompt is not None else "n/a"
+        print(f"🔢 {site}: prompt {predicted_prompt} predicted / {actual} actual, completion {completion} of {max_tokens} max")
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {site: dict(totals) for site, totals in self._sites.items()}
+
+
+_token_usage: Optional[TokenUsage] = None
+
+
+def get_token_usage() -> TokenUsage:
+    global _token_usage
+    if _token_usage is None:
+        _token_usage = TokenUsage()
+    return _token_usage
+
+
+if __name__ == "__main__":
+    # Build step: fetch the encoding into TIKTOKEN_CACHE_DIR, failing the build if it is unavailable
+    if load_tokenizer() is None:
+        raise SystemExit(1)
+    print(f"✅ tiktoken encoding {LLM_TOKENIZER_ENCODING!r} cached in {TIKTOKEN_CACHE_DIR}")
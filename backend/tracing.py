@@ -0,0 +1,215 @@
+# backend/tracing.py
+"""
+Span tracing for course generation. A span times one unit of work (a job,
+a pipeline stage, an LLM attempt) and carries attributes such as attempt
+number, HTTP status and byte counts. Spans nest through a context
+variable, so tasks started inside a span (gather, create_task) report as
+its children and a whole job shares one trace_id.
+
+Finished spans are appended to TRACE_PATH as JSON lines, with field names
+following the OpenTelemetry span model:
+
+    {"trace_id", "span_id", "parent_span_id", "name", "start_time_unix_nano",
+     "end_time_unix_nano", "duration_ms", "status", "error", "attributes"}
+
+Spans are buffered and reach the file within TRACE_FLUSH_INTERVAL.
+To reconstruct a job: grep its trace_id and sort by start_time_unix_nano.
+"""
+import asyncio
+import atexit
+import json
+import os
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, single-process development only
+    fcntl = None
+
+TRACE_ENABLED = os.getenv("TRACE_ENABLED", "true").lower() == "true"
+TRACE_PATH = os.getenv("TRACE_PATH", "./data/traces.jsonl")
+# The file is rotated to TRACE_PATH + ".1" once it grows past this size
+TRACE_MAX_BYTES = int(os.getenv("TRACE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Buffered spans are appended at least this often (and at exit)
+TRACE_FLUSH_INTERVAL = float(os.getenv("TRACE_FLUSH_INTERVAL", "1.0"))
+# Buffered bytes that trigger an early flush
+TRACE_BUFFER_BYTES = 256 * 1024
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+class JsonlSpanSink:
+    """
+    JSONL file shared by the API and worker processes. write() only buffers
+    the line; a background thread appends the buffer in one write. Appends
+    and rotation happen under an flock on TRACE_PATH + ".lock", and a
+    process reopens the file when another one has rotated it (new inode),
+    so no process keeps appending to the rotated generation.
+    """
+
+    def __init__(self, path: str = TRACE_PATH, max_bytes: int = TRACE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._buffer: List[bytes] = []
+        self._buffered = 0
+        self._lock = threading.Lock()        # Guards the buffer
+        self._io_lock = threading.Lock()     # One flush at a time in this process
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._fd: Optional[int] = None
+        self._inode: Optional[int] = None
+        self._lock_fd: Optional[int] = None
+
+    def write(self, record: Dict[str, Any]):
+        line = (json.dumps(record, default=str, ensure_ascii=False) + "\n").encode("utf-8")
+        with self._lock:
+            self._buffer.append(line)
+            self._buffered += len(line)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="trace-sink", daemon=True)
+                self._thread.start()
+            if self._buffered >= TRACE_BUFFER_BYTES:
+                self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(TRACE_FLUSH_INTERVAL)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"⚠️  Could not write spans to {self.path}: {e}")
+
+    def flush(self):
+        """Append buffered spans to the file now"""
+        with self._lock:
+            lines, self._buffer, self._buffered = self._buffer, [], 0
+        if not lines:
+            return
+        with self._io_lock:
+            if self._lock_fd is None:
+                if os.path.dirname(self.path):
+                    os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                self._lock_fd = os.open(self.path + ".lock", os.O_WRONLY | os.O_CREAT, 0o644)
+            if fcntl is not None:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+            try:
+                self._open_current()
+                os.write(self._fd, b"".join(lines))
+                if os.fstat(self._fd).st_size > self.max_bytes:
+                    os.replace(self.path, self.path + ".1")
+                    self._open_current()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _open_current(self):
+        """(Re)open TRACE_PATH unless the open descriptor still refers to it"""
+        try:
+            if self._fd is not None and os.stat(self.path).st_ino == self._inode:
+                return
+        except FileNotFoundError:
+            pass
+        if self._fd is not None:
+            os.close(self._fd)
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self._inode = os.fstat(self._fd).st_ino
+
+    def close(self):
+        self.flush()
+        with self._io_lock:
+            for fd in (self._fd, self._lock_fd):
+                if fd is not None:
+                    os.close(fd)
+            self._fd = self._lock_fd = self._inode = None
+
+
+_sink: Optional[JsonlSpanSink] = None
+
+
+def get_span_sink() -> JsonlSpanSink:
+    global _sink
+    if _sink is None:
+        _sink = JsonlSpanSink()
+        atexit.register(_sink.close)
+    return _sink
+
+
+class Span:
+    """Context manager around one unit of work; usable across awaits"""
+    __slots__ = ("name", "attributes", "trace_id", "span_id", "parent_span_id", "status", "error", "_token", "_start_ns", "_t0")
+
+    def __init__(self, name: str, attributes: Dict[str, Any]):
+        parent = _current_span.get()
+        self.name = name
+        self.attributes = attributes
+        self.trace_id = parent.trace_id if parent is not None else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_span_id = parent.span_id if parent is not None else None
+        self.status = "ok"
+        self.error: Optional[str] = None
+
+    def set(self, **attributes: Any):
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        self._token = _current_span.set(self)
+        self._start_ns = time.time_ns()
+        self._t0 = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration_ns = time.perf_counter_ns() - self._t0
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            self.status = "cancelled" if issubclass(exc_type, asyncio.CancelledError) else "error"
+            self.error = f"{exc_type.__name__}: {exc}"
+        try:
+            get_span_sink().write({
+                "trace_id": self.trace_id,
+                "span_id": self.span_id,
+                "parent_span_id": self.parent_span_id,
+                "name": self.name,
+                "start_time_unix_nano": self._start_ns,
+                "end_time_unix_nano": self._start_ns + duration_ns,
+                "duration_ms": round(duration_ns / 1e6, 3),
+                "status": self.status,
+                "error": self.error,
+                "attributes": self.attributes,
+            })
+        except Exception as e:
+            # Tracing must never fail the work it observes
+            print(f"⚠️  Could not write span {self.name}: {e}")
+        return False
+
+
+class _NoopSpan:
+    trace_id = None
+
+    def set(self, **attributes: Any):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def span(name: str, **attributes: Any):
+    """Open a child of the current span (or a new trace); a no-op when TRACE_ENABLED=false"""
+    if not TRACE_ENABLED:
+        return _NOOP_SPAN
+    return Span(name, attributes)
+
+
+def current_trace_id() -> Optional[str]:
+    current = _current_span.get()
+    return current.trace_id if current is not None else None
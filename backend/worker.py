@@ -0,0 +1,173 @@
+# backend/worker.py
+"""
+Job workers for course generation.
+
+By default the API process runs an embedded worker. For separate worker
+processes set JOB_EMBEDDED_WORKER=false on the API and run:
+
+    python -m backend.worker --processes 2 --concurrency 2
+
+Separate workers don't prefetch study materials. The LLM rate limiter
+(priorities, quota pressure) lives in each process, so prefetch running
+in a worker could not yield to interactive requests in the API; those
+modules get their quizzes and flashcards generated on first open instead.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import socket
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List
+
+from dotenv import load_dotenv
+
+# Before the backend imports below: they read their settings at import time
+load_dotenv()
+
+from backend.job_queue import JOB_LEASE_SECONDS, JobQueue, PermanentJobError, get_job_queue
+from backend.metrics import JOB_SECONDS, JOBS_FINISHED, JOBS_IN_FLIGHT
+from backend.tracing import span
+
+JOB_WORKER_CONCURRENCY = int(os.getenv("JOB_WORKER_CONCURRENCY", "2"))
+JOB_WORKER_PROCESSES = int(os.getenv("JOB_WORKER_PROCESSES", "1"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+
+JobHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class JobWorker:
+    """Claims jobs from the queue and runs up to `concurrency` of them at a time"""
+
+    def __init__(self, queue: JobQueue, handlers: Dict[str, JobHandler], concurrency: int = JOB_WORKER_CONCURRENCY):
+        self.queue = queue
+        self.handlers = handlers
+        self.concurrency = concurrency
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._tasks: List[asyncio.Task] = []
+        self._stopping = asyncio.Event()
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._slot_loop(i)) for i in range(self.concurrency)]
+        print(f"👷 Job worker {self.worker_id} started with {self.concurrency} slots")
+
+    async def stop(self):
+        self._stopping.set()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def run_forever(self):
+        self.start()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _slot_loop(self, slot: int):
+        while not self._stopping.is_set():
+            try:
+                job = await self.queue.claim(self.worker_id)
+            except Exception as e:
+                print(f"❌ Job claim failed: {e}")
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run_job(job)
+
+    async def _heartbeat(self, job_id: str, work: asyncio.Future) -> bool:
+        """Renew the lease while `work` runs. A lost lease means another worker reclaimed the job: cancel `work`"""
+        while True:
+            await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+            if not await self.queue.heartbeat(job_id, self.worker_id):
+                print(f"⚠️  Lost lease on job {job_id}; cancelling it here")
+                work.cancel()
+                return True
+
+    async def _run_job(self, job: Dict[str, Any]):
+        handler = self.handlers.get(job["kind"])
+        heartbeat = None
+        in_flight = JOBS_IN_FLIGHT.labels(job["kind"])
+        in_flight.inc()
+        started = time.perf_counter()
+        outcome = "cancelled"
+        try:
+            if handler is None:
+                raise PermanentJobError(f"No handler for job kind '{job['kind']}'")
+            print(f"▶️  Job {job['id']} ({job['kind']}) attempt {job['attempts']}/{job['max_attempts']}")
+            with span("job", job_id=job["id"], kind=job["kind"], attempt=job["attempts"], worker=self.worker_id) as job_span:
+                work = asyncio.ensure_future(handler(job))
+                heartbeat = asyncio.create_task(self._heartbeat(job["id"], work))
+                try:
+                    await work
+                except asyncio.CancelledError:
+                    if not (heartbeat.done() and not heartbeat.cancelled() and heartbeat.exception() is None):
+                        raise
+                    # The job's new owner decides its outcome: neither complete nor fail it from here
+                    job_span.set(lease_lost=True)
+                    outcome = "lease_lost"
+                    return
+            await self.queue.complete(job["id"], self.worker_id)
+            outcome = "completed"
+        except asyncio.CancelledError:
+            # Shutting down: leave the lease to expire so another worker picks the job up
+            raise
+        except Exception as e:
+            retried = await self.queue.fail(job["id"], self.worker_id, str(e), permanent=isinstance(e, PermanentJobError))
+            outcome = "retrying" if retried else "failed"
+            print(f"❌ Job {job['id']} failed ({'retrying' if retried else 'giving up'}): {e}")
+        finally:
+            if heartbeat is not None:
+                heartbeat.cancel()
+            in_flight.dec()
+            JOB_SECONDS.labels(job["kind"]).observe(time.perf_counter() - started)
+            JOBS_FINISHED.labels(job["kind"], outcome).inc()
+
+
+async def _serve(concurrency: int):
+    from backend.azure_processor import AzureWhitepaperProcessor
+    from backend.database import connect_to_db, shutdown_db
+    from backend.pipeline import build_job_handlers
+
+    db = connect_to_db()
+    processor = AzureWhitepaperProcessor()
+    await processor.start()
+    worker = JobWorker(get_job_queue(), build_job_handlers(db, processor, prefetch=False), concurrency)
+    try:
+        await worker.run_forever()
+    finally:
+        await processor.aclose()
+        await shutdown_db()
+
+
+def _run_process(concurrency: int):
+    asyncio.run(_serve(concurrency))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run course generation job workers")
+    parser.add_argument("--processes", type=int, default=JOB_WORKER_PROCESSES)
+    parser.add_argument("--concurrency", type=int, default=JOB_WORKER_CONCURRENCY)
+    args = parser.parse_args()
+
+    if args.processes <= 1:
+        _run_process(args.concurrency)
+        return
+
+    ctx = multiprocessing.get_context("spawn")
+    processes = [ctx.Process(target=_run_process, args=(args.concurrency,)) for _ in range(args.processes)]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Per-request cost of Firebase ID-token verification: what
+firebase_admin.auth.verify_id_token does on every call (parse Google's
+certificates, check the RS256 signature and claims; the certificate
+response itself comes from its HTTP cache) vs FirebaseTokenVerifier, with
+keys parsed once and verified tokens cached until they expire.
+
+Tokens are signed with a locally generated key; certificates are served
+by in-process stubs, so no network access is needed.
+
+    python -m benchmarks.bench_auth_token_verify --requests 2000 --users 50
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import time
+
+import httpx
+import jwt
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+
+PROJECT_ID = "bench-project"
+KID = "bench-key"
+
+
+def make_signing_key():
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "securetoken.system.gserviceaccount.com")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    return key, cert.public_bytes(serialization.Encoding.PEM).decode()
+
+
+def make_token(key, uid: str) -> str:
+    now = int(time.time())
+    claims = {
+        "iss": f"https://securetoken.google.com/{PROJECT_ID}",
+        "aud": PROJECT_ID,
+        "auth_time": now,
+        "user_id": uid,
+        "sub": uid,
+        "iat": now,
+        "exp": now + 3600,
+        "email": f"{uid}@example.com",
+    }
+    return jwt.encode(claims, key, algorithm="RS256", headers={"kid": KID})
+
+
+class CachedCertRequest:
+    """google-auth transport returning the certificates, as firebase_admin's cache-control session does on a hit"""
+
+    def __init__(self, certs: dict):
+        self.body = json.dumps(certs).encode()
+
+    def __call__(self, url, method="GET", body=None, headers=None, timeout=None, **kwargs):
+        return _Response(self.body)
+
+
+class _Response:
+    status = 200
+    headers = {}
+
+    def __init__(self, data: bytes):
+        self.data = data
+
+
+def per_call_us(elapsed: float, calls: int) -> float:
+    return elapsed / calls * 1e6
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=50, help="Distinct tokens; requests cycle through them")
+    args = parser.parse_args()
+
+    import google.oauth2.id_token
+    from backend.auth_tokens import ID_TOKEN_CERT_URL, FirebaseTokenVerifier, PublicKeyCache
+
+    key, cert_pem = make_signing_key()
+    certs = {KID: cert_pem}
+    tokens = [make_token(key, f"user-{i}") for i in range(args.users)]
+    requests = [tokens[i % len(tokens)] for i in range(args.requests)]
+
+    # Before: the verification firebase_admin performs on every request
+    cert_request = CachedCertRequest(certs)
+    start = time.perf_counter()
+    for token in requests:
+        google.oauth2.id_token.verify_token(token, request=cert_request, audience=PROJECT_ID, certs_url=ID_TOKEN_CERT_URL)
+    before = time.perf_counter() - start
+
+    # After: keys fetched once from a stub endpoint, verified tokens cached
+    cert_client = httpx.AsyncClient(transport=httpx.MockTransport(
+        lambda request: httpx.Response(200, json=certs, headers={"Cache-Control": "public, max-age=21600"})
+    ))
+    verifier = FirebaseTokenVerifier(PROJECT_ID, keys=PublicKeyCache(client=cert_client))
+    await verifier.verify(tokens[0])  # Initial key fetch, as the first request after startup would
+    verifier.cache = type(verifier.cache)()
+
+    start = time.perf_counter()
+    for token in tokens:
+        await verifier.verify(token)
+    misses = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for token in requests:
+        await verifier.verify(token)
+    after = time.perf_counter() - start
+    await verifier.aclose()
+    await cert_client.aclose()
+
+    print(f"{args.requests} requests over {args.users} tokens (RS256, 2048-bit)")
+    print(f"verify_id_token path        {per_call_us(before, args.requests):8.1f} us/request")
+    print(f"cached keys, token miss     {per_call_us(misses, len(tokens)):8.1f} us/request")
+    print(f"cached keys, token hit      {per_call_us(after, args.requests):8.1f} us/request")
+    print(f"speedup (steady state): {before / after:.0f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
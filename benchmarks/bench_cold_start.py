@@ -0,0 +1,136 @@
+"""
+Cold start of the API process: each run is a fresh interpreter that
+imports backend.main, runs the startup hook and serves its first request
+(GET /healthz), as a new container would. Also timed, after that first
+request: importing what backend.main now defers to first use (Firebase /
+Firestore, the LLM processor stack, the PDF library), i.e. what every
+process used to pay up front.
+
+No credentials or network are needed: warm-up and the embedded worker are
+off, so nothing is initialized. Use --json to record results per release.
+
+    python -m benchmarks.bench_cold_start --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+CHILD = r"""
+import asyncio, json, time
+
+t0 = time.perf_counter()
+import backend.main as main
+imported = time.perf_counter()
+
+
+async def first_request(path):
+    messages = []
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"",
+        "root_path": "", "headers": [(b"host", b"bench")], "client": ("127.0.0.1", 0), "server": ("bench", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await main.app(scope, receive, send)
+    return messages[0]["status"]
+
+
+async def run():
+    await main.startup_event()
+    started = time.perf_counter()
+    status = await first_request("/healthz")
+    served = time.perf_counter()
+    await main.shutdown_event()
+    return started, status, served
+
+
+started, status, served = asyncio.run(run())
+assert status == 200, status
+
+d0 = time.perf_counter()
+import backend.pipeline, backend.study_materials, backend.firebase_config, firebase_admin.firestore, PyPDF2
+deferred = time.perf_counter() - d0
+
+print(json.dumps({
+    "import_s": imported - t0,
+    "startup_s": started - imported,
+    "first_request_s": served - t0,
+    "deferred_imports_s": deferred,
+}))
+"""
+
+
+def child_env(data_dir: str) -> dict:
+    return {
+        **os.environ,
+        "STARTUP_WARMUP": "false",
+        "JOB_EMBEDDED_WORKER": "false",
+        "TRACE_ENABLED": "false",
+        "JOB_QUEUE_PATH": os.path.join(data_dir, "jobs.sqlite3"),
+    }
+
+
+def run_child(env: dict, *flags: str) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, *flags, "-c", CHILD], env=env, capture_output=True, text=True, check=True)
+
+
+def slowest_imports(importtime_log: str, limit: int):
+    """Direct imports of backend.main by cumulative time, from `python -X importtime`"""
+    # Children are listed before their parent: collect depth-1 rows until the depth-0 row closing them
+    rows = []
+    for line in importtime_log.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        if not cumulative.strip().isdigit():
+            continue  # Header line
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1:
+            rows.append((int(cumulative), name.strip()))
+        elif depth == 0:
+            if name.strip() == "backend.main":
+                return sorted(rows, reverse=True)[:limit]
+            rows = []
+    return []
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=8, help="Slowest imports of backend.main to list")
+    parser.add_argument("--json", action="store_true", help="Print one JSON summary line only")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        env = child_env(data_dir)
+        run_child(env)  # Prime bytecode caches so every measured run starts alike
+        runs = [json.loads(run_child(env).stdout.strip().splitlines()[-1]) for _ in range(args.runs)]
+        importtime = run_child(env, "-X", "importtime").stderr
+
+    summary = {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+    if args.json:
+        print(json.dumps({"runs": args.runs, **{key: round(value, 4) for key, value in summary.items()}}))
+        return
+
+    print(f"{args.runs} fresh processes, median")
+    print(f"import backend.main         {summary['import_s'] * 1000:8.1f} ms")
+    print(f"startup hook                {summary['startup_s'] * 1000:8.1f} ms")
+    print(f"first request served        {summary['first_request_s'] * 1000:8.1f} ms after process start")
+    print(f"deferred to first use       {summary['deferred_imports_s'] * 1000:8.1f} ms of imports")
+    print("slowest imports of backend.main (cumulative):")
+    for micros, name in slowest_imports(importtime, args.top):
+        print(f"  {micros / 1000:8.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
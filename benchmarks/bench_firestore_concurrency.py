@@ -0,0 +1,141 @@
+"""
+Concurrent request throughput through the database layer: Firestore calls
+made inline on the event loop (the old behaviour) vs FirestoreCollection,
+which runs them on the bounded DB thread pool.
+
+Runs against an in-process stub collection whose calls sleep --rtt-ms to
+stand in for the network round-trip. Each simulated request does one
+find_one and one insert_one. A ticker task records how long the event loop
+goes without being able to run anything else.
+
+    python -m benchmarks.bench_firestore_concurrency --requests 100 --rtt-ms 20
+"""
+import argparse
+import asyncio
+import time
+
+
+class StubSnapshot:
+    def __init__(self, ref, data):
+        self.reference = ref
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class StubDocument:
+    def __init__(self, collection, doc_id):
+        self.collection = collection
+        self.id = doc_id
+
+    def set(self, data):
+        time.sleep(self.collection.rtt)
+        self.collection.docs[self.id] = dict(data)
+
+    def update(self, data):
+        time.sleep(self.collection.rtt)
+        self.collection.docs[self.id].update(data)
+
+
+class StubQuery:
+    def __init__(self, collection, filters=()):
+        self.collection = collection
+        self.filters = filters
+
+    def where(self, field, op, value):
+        return StubQuery(self.collection, self.filters + ((field, value),))
+
+    def limit(self, count):
+        return self
+
+    def stream(self):
+        time.sleep(self.collection.rtt)
+        for doc_id, data in list(self.collection.docs.items()):
+            if all(data.get(field) == value for field, value in self.filters):
+                yield StubSnapshot(StubDocument(self.collection, doc_id), data)
+
+
+class StubCollection(StubQuery):
+    def __init__(self, rtt: float):
+        self.rtt = rtt
+        self.docs = {}
+        super().__init__(self)
+
+    def document(self, doc_id):
+        return StubDocument(self, doc_id)
+
+
+class InlineCollection:
+    """The previous layer: async signatures around blocking client calls"""
+
+    def __init__(self, collection_ref):
+        self.collection_ref = collection_ref
+
+    async def insert_one(self, document):
+        self.collection_ref.document(document["id"]).set(document)
+        return {"inserted_id": document["id"]}
+
+    async def find_one(self, filter_dict):
+        query = self.collection_ref
+        for key, value in filter_dict.items():
+            query = query.where(key, "==", value)
+        docs = list(query.limit(1).stream())
+        return docs[0].to_dict() if docs else None
+
+
+async def simulated_request(collection, i: int):
+    await collection.find_one({"id": f"doc-{i % 10}"})
+    await collection.insert_one({"id": f"req-{i}", "value": i})
+
+
+async def run(collection, requests: int):
+    max_stall = 0.0
+    stop = asyncio.Event()
+
+    async def ticker():
+        nonlocal max_stall
+        last = time.perf_counter()
+        while not stop.is_set():
+            await asyncio.sleep(0.001)
+            now = time.perf_counter()
+            max_stall = max(max_stall, now - last)
+            last = now
+
+    tick = asyncio.create_task(ticker())
+    await asyncio.sleep(0.01)
+    start = time.perf_counter()
+    await asyncio.gather(*(simulated_request(collection, i) for i in range(requests)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await tick
+    return elapsed, max_stall
+
+
+def report(name: str, requests: int, elapsed: float, max_stall: float):
+    print(f"{name:<18} wall {elapsed * 1000:8.1f} ms   {requests / elapsed:8.1f} req/s   max loop stall {max_stall * 1000:7.1f} ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--rtt-ms", type=float, default=20.0)
+    args = parser.parse_args()
+
+    from backend.database import FIRESTORE_MAX_WORKERS, FirestoreCollection, shutdown_db_executor
+
+    rtt = args.rtt_ms / 1000
+    inline = await run(InlineCollection(StubCollection(rtt)), args.requests)
+    try:
+        pooled = await run(FirestoreCollection(StubCollection(rtt)), args.requests)
+    finally:
+        shutdown_db_executor()
+
+    print(f"{args.requests} concurrent requests, 2 calls each, simulated RTT {args.rtt_ms:.0f} ms, {FIRESTORE_MAX_WORKERS} DB threads")
+    report("inline (blocking)", args.requests, *inline)
+    report("DB thread pool", args.requests, *pooled)
+    print(f"speedup (wall): {inline[0] / pooled[0]:.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,114 @@
+"""
+Per-call latency of LLM requests: a fresh httpx.AsyncClient per call (the
+old behaviour) vs the processor's shared keep-alive pool.
+
+Runs against a local stub of the chat-completions endpoint. The stub sleeps
+--handshake-ms on every *new* connection to stand in for the TCP+TLS
+handshake to the real endpoint.
+
+    python -m benchmarks.bench_llm_http_pool --calls 200 --handshake-ms 30
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+STUB_RESPONSE = json.dumps({"choices": [{"message": {"content": "{\"ok\": true}"}}]}).encode()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(STUB_RESPONSE)))
+        self.end_headers()
+        self.wfile.write(STUB_RESPONSE)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    handshake_delay = 0.0
+
+    def get_request(self):
+        request = super().get_request()
+        time.sleep(self.handshake_delay)  # Simulated handshake cost for new connections
+        return request
+
+
+def start_stub(handshake_ms: float) -> StubServer:
+    server = StubServer(("127.0.0.1", 0), StubHandler)
+    server.handshake_delay = handshake_ms / 1000
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def bench_client_per_call(url: str, payload: dict, calls: int) -> list:
+    latencies = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        async with httpx.AsyncClient(timeout=180.0) as client:
+            response = await client.post(url, json=payload)
+            response.json()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+async def bench_pooled(processor, payload: dict, calls: int) -> list:
+    latencies = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        await processor._post_chat_completion(payload)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def report(name: str, latencies: list):
+    ms = sorted(l * 1000 for l in latencies)
+    p95 = ms[int(len(ms) * 0.95) - 1]
+    print(f"{name:<22} mean {statistics.mean(ms):7.2f} ms   p50 {statistics.median(ms):7.2f} ms   p95 {p95:7.2f} ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--handshake-ms", type=float, default=30.0)
+    args = parser.parse_args()
+
+    server = start_stub(args.handshake_ms)
+    endpoint = f"http://127.0.0.1:{server.server_address[1]}"
+    os.environ.update({"AZURE_AI_TOKEN": "stub", "AZURE_AI_ENDPOINT": endpoint, "LLM_CACHE_ENABLED": "false"})
+
+    from backend.azure_processor import AzureWhitepaperProcessor
+
+    processor = AzureWhitepaperProcessor()
+    await processor.start()
+    payload = {"model": "stub", "messages": [{"role": "user", "content": "hi"}], "max_tokens": 10, "temperature": 0.3}
+
+    try:
+        fresh = await bench_client_per_call(f"{endpoint}/chat/completions", payload, args.calls)
+        pooled = await bench_pooled(processor, payload, args.calls)
+    finally:
+        await processor.aclose()
+        server.shutdown()
+
+    print(f"{args.calls} calls, simulated handshake {args.handshake_ms:.0f} ms")
+    report("client per call", fresh)
+    report("shared pool", pooled)
+    print(f"speedup (mean): {statistics.mean(fresh) / statistics.mean(pooled):.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,109 @@
+"""
+Serving the built frontend: the previous StaticFiles(html=True) mount vs
+FrontendStaticFiles (precompressed variants, immutable hashed assets,
+ETag/304), called directly as ASGI apps on a temporary copy of dist/.
+
+A page load fetches index.html plus every file under assets/, with a
+browser's Accept-Encoding. On a repeat visit the browser revalidates
+what it has no fresh copy of: before, every file (there was no
+Cache-Control); after, only index.html, since hashed assets are
+immutable. Bytes are response body bytes, as the server would send them.
+
+    python -m benchmarks.bench_static_serving --loads 300 --dist ./dist
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+
+from starlette.staticfiles import StaticFiles
+
+ACCEPT_ENCODING = b"gzip, deflate, br"
+
+
+async def fetch(app, path: str, headers=()):
+    status, size, response_headers = 0, 0, {}
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+        "headers": [(b"accept-encoding", ACCEPT_ENCODING), *headers], "client": ("127.0.0.1", 0), "server": ("bench", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status, size, response_headers
+        if message["type"] == "http.response.start":
+            status = message["status"]
+            response_headers = dict(message["headers"])
+        elif message["type"] == "http.response.body":
+            size += len(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return status, size, response_headers
+
+
+async def page_load(app, paths, validators=None):
+    """One page load; with `validators` ({path: etag}) only those paths are requested, conditionally"""
+    sent = requests = 0
+    etags = {}
+    for path in paths:
+        if validators is not None and path not in validators:
+            continue
+        headers = [(b"if-none-match", validators[path])] if validators is not None else []
+        _, size, response_headers = await fetch(app, path, headers)
+        sent += size
+        requests += 1
+        etags[path] = response_headers.get(b"etag")
+        if validators is None and b"immutable" in response_headers.get(b"cache-control", b""):
+            etags.pop(path)  # Served from the browser cache next time
+    return sent, requests, etags
+
+
+async def measure(name: str, app, paths, loads: int):
+    _, _, validators = await page_load(app, paths)
+    results = {}
+    for visit, kwargs in (("first visit", {}), ("repeat visit", {"validators": validators})):
+        started = time.perf_counter()
+        for _ in range(loads):
+            sent, requests, _ = await page_load(app, paths, **kwargs)
+        elapsed = time.perf_counter() - started
+        results[visit] = (sent, requests)
+        print(
+            f"{name:<8} {visit:<13} {sent / 1024:9.1f} KiB/load  {requests} requests/load  "
+            f"{loads / elapsed:7.0f} loads/s  {loads * requests / elapsed:7.0f} req/s"
+        )
+    return results
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--loads", type=int, default=300)
+    parser.add_argument("--dist", default="./dist")
+    args = parser.parse_args()
+
+    from backend.static_files import FrontendStaticFiles
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dist = os.path.join(tmp, "dist")
+        shutil.copytree(args.dist, dist, ignore=shutil.ignore_patterns("*.gz", "*.br"))
+        paths = ["/"] + sorted(
+            "/" + os.path.relpath(os.path.join(root, name), dist).replace(os.sep, "/")
+            for root, _, files in os.walk(os.path.join(dist, "assets"))
+            for name in files
+        )
+
+        before = await measure("before", StaticFiles(directory=dist, html=True), paths, args.loads)
+        frontend = FrontendStaticFiles(directory=dist)
+        frontend.precompress()
+        after = await measure("after", frontend, paths, args.loads)
+
+    print(f"first visit: {before['first visit'][0] / after['first visit'][0]:.1f}x fewer bytes")
+    print(f"repeat visit: {before['repeat visit'][1]} -> {after['repeat visit'][1]} requests (all 304)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -12,6 +12,11 @@ export interface ProcessingStatus {
   status: 'processing' | 'completed' | 'failed'
   progress: number
   message?: string
+  course_id?: string
+  preview?: {
+    title?: string
+    modules: { title: string; content: string; complete: boolean }[]
+  } | null
 }
 
 /**
@@ -46,11 +51,14 @@ export const uploadWhitepaper = async (data: UploadRequest): Promise<{ id: strin
 }
 
 /**
- * Start course design process
+ * Start course design process (force regenerates even if this PDF was seen before)
  */
-export const designCourse = async (uploadId: string): Promise<{ id: string; status: string }> => {
+export const designCourse = async (
+  uploadId: string,
+  force = false
+): Promise<{ id: string; status: string; course_id?: string; reused?: boolean }> => {
   try {
-    const response = await apiClient.post(`/api/design-course/${uploadId}`)
+    const response = await apiClient.post(`/api/design-course/${uploadId}`, null, { params: { force } })
     return response.data
   } catch (error: any) {
     console.error('Design course failed:', error.response?.data || error.message)
@@ -71,6 +79,35 @@ export const getProcessingStatus = async (id: string): Promise<ProcessingStatus>
   }
 }
 
+/**
+ * Subscribe to processing status pushes (Server-Sent Events).
+ * EventSource reconnects on its own and resumes from the last event id.
+ * Returns an unsubscribe function.
+ */
+export const subscribeProcessingStatus = (
+  id: string,
+  onStatus: (status: ProcessingStatus) => void,
+  onError?: (error: Event) => void
+): (() => void) => {
+  const baseUrl = (apiClient.defaults.baseURL || '').replace(/\/$/, '')
+  const source = new EventSource(`${baseUrl}/api/processing/${id}/events`)
+
+  source.addEventListener('status', (event) => {
+    const status: ProcessingStatus = JSON.parse((event as MessageEvent).data)
+    onStatus(status)
+    if (status.status === 'completed' || status.status === 'failed') {
+      source.close()
+    }
+  })
+  source.onerror = (error) => {
+    if (source.readyState === EventSource.CLOSED) {
+      onError?.(error)
+    }
+  }
+
+  return () => source.close()
+}
+
 /**
  * Get course by ID
  */
@@ -85,18 +122,76 @@ export const getCourse = async (id: string) => {
 }
 
 /**
- * Get all courses for current user
+ * Get all course summaries for current user, following page cursors
  */
 export const getUserCourses = async () => {
   try {
-    const response = await apiClient.get('/api/courses')
-    return response.data
+    const courses: any[] = []
+    let cursor: string | null = null
+    do {
+      const response: { data: { courses: any[]; next_cursor: string | null } } = await apiClient.get('/api/courses', {
+        // A limit (or cursor) selects the paged {courses, next_cursor} response
+        params: { limit: 50, ...(cursor ? { cursor } : {}) }
+      })
+      courses.push(...response.data.courses)
+      cursor = response.data.next_cursor
+    } while (cursor)
+    return courses
   } catch (error: any) {
     console.error('Failed to load user courses:', error.response?.data || error.message)
     throw error
   }
 }
 
+export interface StudyMaterialsResult {
+  module_id: string
+  quiz?: any
+  flashcards?: any[]
+  cached?: boolean
+  error?: string
+}
+
+/**
+ * Generate quizzes and flashcards for every module of a course.
+ * onModule is called for each module as soon as its materials are ready.
+ */
+export const generateStudyMaterials = async (
+  courseId: string,
+  onModule: (result: StudyMaterialsResult) => void,
+  force = false
+): Promise<{ generated: number; failed: number; cached: number }> => {
+  const baseUrl = (apiClient.defaults.baseURL || '').replace(/\/$/, '')
+  const response = await fetch(
+    `${baseUrl}/api/courses/${courseId}/generate-study-materials${force ? '?force=true' : ''}`,
+    { method: 'POST' }
+  )
+  if (!response.ok || !response.body) {
+    throw new Error(`Study material generation failed (${response.status})`)
+  }
+
+  const reader = response.body.getReader()
+  const decoder = new TextDecoder()
+  let buffered = ''
+  let summary = { generated: 0, failed: 0, cached: 0 }
+  for (;;) {
+    const { done, value } = await reader.read()
+    buffered += decoder.decode(value, { stream: !done })
+    const lines = buffered.split('\n')
+    buffered = lines.pop() || ''
+    for (const line of lines) {
+      if (!line.trim()) continue
+      const message = JSON.parse(line)
+      if (message.done) {
+        summary = message
+      } else {
+        onModule(message)
+      }
+    }
+    if (done) break
+  }
+  return summary
+}
+
 /**
  * Update module progress
  */
@@ -1,7 +1,7 @@
 import React, { useState, useEffect } from 'react'
 import { useNavigate } from 'react-router-dom'
 import UploadComponent from '../components/UploadComponent'
-import { getProcessingStatus } from '../api/courses'
+import { getProcessingStatus, subscribeProcessingStatus, ProcessingStatus } from '../api/courses'
 import { CheckCircleIcon, ExclamationCircleIcon } from '@heroicons/react/24/outline'
 
 const UploadPage: React.FC = () => {
@@ -9,23 +9,32 @@ const UploadPage: React.FC = () => {
   const [status, setStatus] = useState<'idle' | 'processing' | 'completed' | 'failed'>('idle')
   const [progress, setProgress] = useState(0)
   const [message, setMessage] = useState('')
+  const [preview, setPreview] = useState<ProcessingStatus['preview']>(null)
   const navigate = useNavigate()
 
   useEffect(() => {
     if (!processingId) return
 
+    let interval: ReturnType<typeof setInterval> | undefined
+
+    const applyStatus = (statusData: ProcessingStatus) => {
+      setStatus(statusData.status)
+      setProgress(statusData.progress)
+      setMessage(statusData.message || '')
+      setPreview(statusData.preview || null)
+
+      if (statusData.status === 'completed') {
+        setTimeout(() => {
+          navigate(`/course/${processingId}`)
+        }, 2000)
+      }
+    }
+
     const checkStatus = async () => {
       try {
         const statusData = await getProcessingStatus(processingId)
-        setStatus(statusData.status)
-        setProgress(statusData.progress)
-        setMessage(statusData.message || '')
-
-        if (statusData.status === 'completed') {
-          setTimeout(() => {
-            navigate(`/course/${processingId}`)
-          }, 2000)
-        }
+        applyStatus(statusData)
+        if (statusData.status !== 'processing') clearInterval(interval)
       } catch (error) {
         console.error('Failed to check status:', error)
         setStatus('failed')
@@ -33,10 +42,18 @@ const UploadPage: React.FC = () => {
       }
     }
 
-    const interval = setInterval(checkStatus, 2000)
-    checkStatus() // Initial check
+    // Status is pushed over SSE; fall back to polling if the stream can't be opened
+    const unsubscribe = subscribeProcessingStatus(processingId, applyStatus, () => {
+      if (!interval) {
+        interval = setInterval(checkStatus, 2000)
+        checkStatus()
+      }
+    })
 
-    return () => clearInterval(interval)
+    return () => {
+      unsubscribe()
+      clearInterval(interval)
+    }
   }, [processingId, navigate])
 
   const handleUploadSuccess = (uploadId: string) => {
@@ -66,6 +83,25 @@ const UploadPage: React.FC = () => {
             {message && (
               <p className="text-sm text-gray-600 mt-2">{message}</p>
             )}
+            {preview && (
+              <div className="text-left mt-6">
+                {preview.title && (
+                  <h3 className="text-lg font-semibold text-gray-900 mb-2">{preview.title}</h3>
+                )}
+                <ul className="space-y-1">
+                  {preview.modules.map((module, index) => (
+                    <li key={index} className="text-sm text-gray-700">
+                      {module.complete ? '✓' : '…'} {module.title}
+                    </li>
+                  ))}
+                </ul>
+                {preview.modules.length > 0 && !preview.modules[preview.modules.length - 1].complete && (
+                  <p className="text-xs text-gray-500 mt-3 whitespace-pre-wrap line-clamp-4">
+                    {preview.modules[preview.modules.length - 1].content.slice(-400)}
+                  </p>
+                )}
+              </div>
+            )}
           </div>
         </div>
       </div>
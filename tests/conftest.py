@@ -0,0 +1,4 @@
+import os
+
+# Before any backend import: settings are read at import time
+os.environ.setdefault("TRACE_ENABLED", "false")
@@ -0,0 +1,69 @@
+import asyncio
+import json
+
+import pytest
+
+from backend import azure_processor
+from backend.azure_processor import AzureWhitepaperProcessor
+from backend.json_extractor import JSONExtractionError
+from backend.models.generation import course_schema
+
+COURSE = json.dumps({"title": "T", "modules": [{"title": f"M{i}", "content": "c" * 200} for i in range(4)]})
+CUT = COURSE.index('"M2"') + 50
+MESSAGES = [{"role": "user", "content": "make a course"}]
+
+
+@pytest.fixture
+def processor(monkeypatch):
+    monkeypatch.setenv("AZURE_AI_TOKEN", "test")
+    monkeypatch.setenv("AZURE_AI_ENDPOINT", "http://llm.invalid/")
+    processor = AzureWhitepaperProcessor()
+    processor.llm_cache = None
+    return processor
+
+
+def script(processor, monkeypatch, replies):
+    """Answer successive LLM calls with `replies`, streaming the first one in two chunks"""
+    calls = []
+
+    async def call(messages, max_tokens=4000, priority=0, on_text=None, label=None):
+        calls.append(messages)
+        reply = replies[min(len(calls), len(replies)) - 1]
+        if on_text:
+            on_text(reply[:len(reply) // 2])
+            on_text(reply)
+        return reply
+
+    monkeypatch.setattr(processor, "_call_azure_openai", call)
+    return calls
+
+
+def test_complete_reply(processor, monkeypatch):
+    calls = script(processor, monkeypatch, [COURSE])
+    seen = []
+    result = asyncio.run(processor._call_json(MESSAGES, course_schema, 100, on_text=seen.append))
+    assert len(result["modules"]) == 4 and len(calls) == 1 and seen[-1] == COURSE
+
+
+def test_truncated_reply_is_continued(processor, monkeypatch):
+    calls = script(processor, monkeypatch, [COURSE[:CUT], "```json\n" + COURSE[CUT:]])
+    result = asyncio.run(processor._call_json(MESSAGES, course_schema, 100, on_text=lambda text: None))
+    assert [m["title"] for m in result["modules"]] == ["M0", "M1", "M2", "M3"]
+    # The follow-up replays the partial reply and asks only for the rest
+    assert len(calls) == 2
+    assert calls[1][-2] == {"role": "assistant", "content": COURSE[:CUT]}
+    assert calls[1][-1]["role"] == "user"
+
+
+def test_reply_that_never_finishes_is_repaired(processor, monkeypatch):
+    monkeypatch.setattr(azure_processor, "LLM_JSON_MAX_CONTINUATIONS", 2)
+    calls = script(processor, monkeypatch, [COURSE[:CUT], ""])
+    result = asyncio.run(processor._call_json(MESSAGES, course_schema, 100))
+    assert [m["title"] for m in result["modules"]] == ["M0", "M1"]
+    assert len(calls) == 3  # The reply plus two follow-ups
+
+
+def test_reply_without_usable_json_raises(processor, monkeypatch):
+    script(processor, monkeypatch, ['{"title": "T", "modules": []}'])
+    with pytest.raises(JSONExtractionError, match="schema"):
+        asyncio.run(processor._call_json(MESSAGES, course_schema, 100))
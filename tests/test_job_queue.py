@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+
+from backend import job_queue, worker
+from backend.job_queue import JobQueue, PermanentJobError
+from backend.worker import JobWorker
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    # Failed attempts are claimable again right away
+    monkeypatch.setattr(job_queue, "JOB_RETRY_BASE_SECONDS", 0)
+    return JobQueue(str(tmp_path / "jobs.sqlite3"))
+
+
+def test_claim_takes_highest_priority_job_once(queue):
+    queue._enqueue("kind", {"n": 1}, "background", 3, 1)
+    queue._enqueue("kind", {"n": 2}, "course", 3, 0)
+    assert not queue._enqueue("kind", {"n": 3}, "course", 3, 0)  # Already queued
+
+    job = queue._claim("w1", 60)
+    assert job["id"] == "course" and job["payload"] == {"n": 2}
+    assert job["status"] == "running" and job["lease_owner"] == "w1" and job["attempts"] == 1
+    assert queue._claim("w2", 60)["id"] == "background"
+    assert queue._claim("w3", 60) is None
+
+
+def test_expired_lease_is_reclaimed_and_old_owner_heartbeat_fails(queue):
+    queue._enqueue("kind", {}, "job", 3, 0)
+    assert queue._claim("w1", -1)["id"] == "job"  # Lease already expired
+
+    reclaimed = queue._claim("w2", 60)
+    assert reclaimed["lease_owner"] == "w2" and reclaimed["attempts"] == 2
+    assert not queue._heartbeat("job", "w1", 60)
+    assert queue._heartbeat("job", "w2", 60)
+
+    # The old owner can no longer decide the outcome
+    queue._complete("job", "w1")
+    assert not queue._fail("job", "w1", "late", permanent=False)
+    assert queue._get("job")["status"] == "running"
+    queue._complete("job", "w2")
+    assert queue._get("job")["status"] == "completed"
+
+
+def test_failures_retry_until_max_attempts(queue):
+    queue._enqueue("kind", {}, "job", 2, 0)
+    queue._claim("w1", 60)
+    assert queue._fail("job", "w1", "boom", permanent=False)
+    assert queue._get("job")["status"] == "queued"
+
+    assert queue._claim("w1", 60)["attempts"] == 2
+    assert not queue._fail("job", "w1", "boom again", permanent=False)
+    job = queue._get("job")
+    assert job["status"] == "failed" and job["last_error"] == "boom again"
+    assert queue._claim("w1", 60) is None
+
+
+def test_permanent_failure_is_not_retried(queue):
+    queue._enqueue("kind", {}, "job", 3, 0)
+    queue._claim("w1", 60)
+    assert not queue._fail("job", "w1", "bad pdf", permanent=True)
+    assert queue._get("job")["status"] == "failed"
+
+
+def test_lease_expiring_on_final_attempt_fails_job(queue):
+    queue._enqueue("kind", {}, "job", 1, 0)
+    queue._claim("w1", -1)
+    assert queue._claim("w2", 60) is None
+    assert queue._get("job")["status"] == "failed"
+
+
+def test_worker_cancels_handler_when_lease_is_lost(queue, monkeypatch):
+    monkeypatch.setattr(worker, "JOB_LEASE_SECONDS", 0.03)
+    started, cancelled = asyncio.Event(), []
+
+    async def handler(job):
+        started.set()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(job["id"])
+            raise
+
+    async def run():
+        await queue.enqueue("kind", {}, job_id="job")
+        job_worker = JobWorker(queue, {"kind": handler}, concurrency=1)
+        job = await queue.claim(job_worker.worker_id)
+        run_job = asyncio.create_task(job_worker._run_job(job))
+        await started.wait()
+        queue._conn.execute("UPDATE jobs SET lease_owner = 'other' WHERE id = 'job'")  # Reclaimed elsewhere
+        await asyncio.wait_for(run_job, timeout=2)
+
+    asyncio.run(run())
+    assert cancelled == ["job"]
+    job = queue._get("job")
+    assert job["status"] == "running" and job["lease_owner"] == "other"
+
+
+def test_worker_fails_job_with_handler_error(queue):
+    async def handler(job):
+        raise PermanentJobError("unreadable")
+
+    async def run():
+        await queue.enqueue("kind", {}, job_id="job")
+        job_worker = JobWorker(queue, {"kind": handler}, concurrency=1)
+        await job_worker._run_job(await queue.claim(job_worker.worker_id))
+
+    asyncio.run(run())
+    assert queue._get("job")["status"] == "failed"
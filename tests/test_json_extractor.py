@@ -0,0 +1,76 @@
+import json
+
+import pytest
+
+from backend.json_extractor import IncrementalJSONParser, JSONExtractionError, extract_json, strip_code_fence
+from backend.models.generation import course_schema, flashcards_schema
+from backend.stream_parser import parse_course_preview
+
+COURSE = json.dumps({"title": "Bitcoin", "modules": [{"title": f"M{i}", "content": "c" * 50} for i in range(3)]})
+
+
+def test_finds_first_value_matching_schema_in_chatty_output():
+    text = 'Sure! {"note": "not a course"} Here it is:\n```json\n' + COURSE + "\n```"
+    assert [m["title"] for m in extract_json(text, course_schema)["modules"]] == ["M0", "M1", "M2"]
+
+
+def test_tolerates_trailing_commas_and_raw_newlines_in_strings():
+    text = '[{"question": "Q1", "answer": "line one\nline two",}, {"front": "Q2", "back": "A2"},]'
+    assert extract_json(text, flashcards_schema) == [
+        {"question": "Q1", "answer": "line one\nline two"},
+        {"question": "Q2", "answer": "A2"},
+    ]
+
+
+def test_result_is_the_same_however_the_stream_is_split():
+    for size in (1, 7, 64):
+        parser = IncrementalJSONParser(course_schema)
+        for i in range(0, len(COURSE), size):
+            parser.feed(COURSE[i:i + size])
+        assert parser.done and not parser.truncated
+        assert parser.result == course_schema(json.loads(COURSE))
+
+
+def test_truncated_reply_is_completed_by_continuation():
+    cut = COURSE.index('"M1"') + 10
+    parser = IncrementalJSONParser(course_schema)
+    parser.feed(COURSE[:cut])
+    assert parser.truncated and not parser.done
+
+    parser.feed(strip_code_fence("```json\n" + COURSE[cut:]))
+    assert parser.done and len(parser.result["modules"]) == 3
+
+
+def test_repair_drops_the_unfinished_element():
+    cut = COURSE.index('"M2"') + 10  # Inside the last module
+    parser = IncrementalJSONParser(course_schema)
+    parser.feed(COURSE[:cut])
+    assert [m["title"] for m in parser.repair()["modules"]] == ["M0", "M1"]
+
+
+def test_repair_needs_a_result_that_satisfies_the_schema():
+    cut = COURSE.index('"M0"') + 10  # No complete module yet
+    with pytest.raises(JSONExtractionError):
+        extract_json(COURSE[:cut], course_schema, repair=True)
+    with pytest.raises(JSONExtractionError):
+        extract_json(COURSE[:cut], course_schema)
+
+
+def test_no_json_at_all():
+    with pytest.raises(JSONExtractionError, match="No JSON object or array"):
+        extract_json("I cannot help with that.", course_schema, repair=True)
+
+
+def test_course_preview_while_streaming():
+    assert parse_course_preview('{"tit') is None
+    cut = COURSE.index('"M1"') + len('"M1", "content": "') + 5
+    preview = parse_course_preview(COURSE[:cut])
+    assert preview["title"] == "Bitcoin"
+    assert [(m["title"], m["complete"]) for m in preview["modules"]] == [("M0", True), ("M1", False)]
+    assert preview["modules"][1]["content"] == "ccccc"
+
+
+def test_course_preview_decodes_escape_cut_in_half():
+    preview = parse_course_preview('{"title": "A \\"quoted\\" course", "modules": [{"title": "M0", "content": "caf\\u00e')
+    assert preview["title"] == 'A "quoted" course'
+    assert preview["modules"][0]["content"] == "caf"
@@ -0,0 +1,76 @@
+import asyncio
+
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+
+from backend.profiling import ProfileMiddleware
+
+TOKEN = "secret"
+
+
+def build_app():
+    app = FastAPI()
+    app.add_middleware(ProfileMiddleware, token=TOKEN)
+    ticks = []
+
+    @app.get("/api/plain")
+    async def plain():
+        await asyncio.sleep(0.02)
+        return {"ok": True}
+
+    @app.get("/api/events")
+    async def events():
+        async def stream():
+            while True:
+                ticks.append(True)
+                yield "data: tick\n\n"
+                await asyncio.sleep(0.01)
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    return app, ticks
+
+
+def get(app, path, headers=(), query=b""):
+    """Run one GET through the ASGI app; returns (status, headers, body)"""
+    messages = []
+
+    async def receive():
+        await asyncio.sleep(10)  # The client never disconnects
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "", "query_string": query,
+        "headers": [(name.lower().encode(), value.encode()) for name, value in headers],
+        "client": ("test", 1), "server": ("test", 80),
+    }
+    asyncio.run(asyncio.wait_for(app(scope, receive, send), timeout=5))
+    start = messages[0]
+    body = b"".join(m.get("body", b"") for m in messages[1:])
+    return start["status"], {k.decode(): v.decode() for k, v in start["headers"]}, body.decode()
+
+
+def test_request_without_token_is_untouched():
+    app, _ = build_app()
+    status, headers, body = get(app, "/api/plain")
+    assert status == 200 and body == '{"ok":true}' and "x-profile-samples" not in headers
+
+
+def test_profiled_request_returns_folded_stacks():
+    app, _ = build_app()
+    _, headers, body = get(app, "/api/plain", headers=[("X-Profile", TOKEN)])
+    assert headers["x-profiled-status"] == "200" and headers["x-profiled-until"] == "complete"
+    assert int(headers["x-profile-samples"]) > 0
+    assert body.splitlines()[0].rsplit(" ", 1)[1].isdigit()
+
+
+def test_event_stream_is_profiled_until_headers_and_closed():
+    app, ticks = build_app()
+    # Returns (within get's timeout) although the stream itself never ends
+    _, headers, _ = get(app, "/api/events", query=f"profile={TOKEN}".encode())
+    assert headers["x-profiled-status"] == "200" and headers["x-profiled-until"] == "headers"
+    assert len(ticks) <= 1